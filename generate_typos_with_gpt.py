@@ -4,24 +4,28 @@ GPT-4o-mini를 사용해서 한국어 문장에 오타를 생성하는 스크립
 """
 import json
 import os
-from openai import OpenAI
-from typing import List, Dict
-import time
+import sys
+from typing import List, Dict, Optional
 from tqdm import tqdm
 
-def initialize_client():
-    """Initialize OpenAI client with API key from environment variable"""
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from llm.dedup import (add_dedup_arguments, batched_calls_saved, dedup_summary, group_duplicates, in_input_order,
+                       match_records, pair_key)
+from llm.executor import LLMExecutor, add_executor_arguments, executor_from_args, parse_json_response
+
+def check_api_key():
+    """Exit with a hint if OPENAI_API_KEY is not set"""
+    if not os.getenv("OPENAI_API_KEY"):
         print("⚠️  Please set OPENAI_API_KEY environment variable")
         print("   export OPENAI_API_KEY='your-api-key-here'")
         exit(1)
 
-    client = OpenAI(api_key=api_key)
-    return client
+def generate_typos_batch(executor: LLMExecutor, entries: List[Dict]) -> List[Dict]:
+    """GPT를 사용해서 오타 생성"""
+
+    batch_text = json.dumps(entries, ensure_ascii=False, indent=2)
 
-def generate_typos_batch(client, entries: List[Dict], batch_size: int = 5) -> List[Dict]:
-    """한국어 문장에 오타를 생성해주세요.
+    prompt = f"""한국어 문장에 오타를 생성해주세요.
 
 오타 생성 규칙:
 1. 교체(Substitution): ㅐ↔ㅔ, ㄹ↔ㄴ 등 자모나 발음이 비슷한 것끼리 교체
@@ -60,40 +64,32 @@ def generate_typos_batch(client, entries: List[Dict], batch_size: int = 5) -> Li
 JSON 배열 형식으로만 응답해주세요."""
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        result_text = executor.complete(
+            [
                 {"role": "system", "content": "당신은 한국어 오타를 생성하는 전문가입니다. 각 오타 유형별로 명확하고 구분 가능한 오타를 만들어주세요."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
-            max_tokens=4000
+            max_tokens=4000,
+            tag="batch"
         )
 
         # 응답 파싱
-        result_text = response.choices[0].message.content.strip()
-
-        # JSON 추출
-        if result_text.startswith("```json"):
-            result_text = result_text[7:]
-        if result_text.startswith("```"):
-            result_text = result_text[3:]
-        if result_text.endswith("```"):
-            result_text = result_text[:-3]
-
-        result = json.loads(result_text)
-        return result
+        return parse_json_response(result_text)
 
     except json.JSONDecodeError as e:
         print(f"❌ JSON parsing error: {e}")
-        print(f"Response: {result_text[:200]}...")
+        print(f"Response: {result_text.strip()[:200]}...")
         return []
     except Exception as e:
         print(f"❌ API error: {e}")
         return []
 
-def process_dataset(input_file: str, output_file: str, batch_size: int = 5):
+def process_dataset(input_file: str, output_file: str, batch_size: int = 5,
+                    executor: Optional[LLMExecutor] = None,
+                    dedup: bool = True):
     """데이터셋 처리 및 오타 생성"""
+    executor = executor or LLMExecutor(concurrency=1)
 
     print(f"📚 Loading {input_file}...")
     with open(input_file, 'r', encoding='utf-8') as f:
@@ -112,29 +108,45 @@ def process_dataset(input_file: str, output_file: str, batch_size: int = 5):
 
     print(f"📊 Total entries to process: {len(simple_data)}")
 
-    # OpenAI 클라이언트 초기화
-    client = initialize_client()
+    # 거의 같은 질문은 한 번만 요청하고 결과를 중복 항목에 복사
+    total_entries = len(simple_data)
+    members = [[idx] for idx in range(total_entries)]
+    if dedup:
+        groups = group_duplicates(simple_data)
+        members = list(groups.values())
+        simple_data = [simple_data[rep] for rep in groups]
+        calls_saved = batched_calls_saved(total_entries, len(simple_data), batch_size)
+        print(f"🧹 {dedup_summary(total_entries, len(simple_data), calls_saved)}")
 
-    # 배치 처리
-    all_results = []
+    check_api_key()
+
+    # 배치 처리 (결과는 [입력 위치, 플랫 항목 리스트]로 모았다가 입력 순서대로 정렬)
+    positioned = []
     error_types = ['substitution', 'deletion', 'insertion', 'transposition', 'spacing']
 
     print(f"🔄 Processing in batches of {batch_size}...")
 
-    for i in tqdm(range(0, len(simple_data), batch_size), desc="Processing batches"):
-        batch = simple_data[i:i+batch_size]
+    # GPT로 오타 생성 (--max-workers개 배치를 동시에 요청, 결과는 배치 순서대로)
+    batches = (range(i, min(i + batch_size, len(simple_data))) for i in range(0, len(simple_data), batch_size))
+    def worker(batch):
+        return generate_typos_batch(executor, [simple_data[idx] for idx in batch])
 
-        # GPT로 오타 생성
-        batch_results = generate_typos_batch(client, batch, batch_size)
+    for batch, future in tqdm(executor.map(worker, batches),
+                              total=(len(simple_data) + batch_size - 1) // batch_size, desc="Processing batches"):
+        # 응답 항목을 입력 문장에 정렬 (en/ko_original로 매칭)
+        batch_results = [entry_group for entry_group in future.result() if isinstance(entry_group, dict)]
+        matched = match_records([simple_data[idx] for idx in batch], batch_results, pair_key,
+                                lambda group: pair_key({"en": group.get("en", ""), "ko": group.get("ko_original", "")}))
 
         # 결과를 플랫 형식으로 변환
-        for entry_group in batch_results:
+        for idx, entry_group in zip(batch, matched):
+            if entry_group is None:
+                continue
             en_query = entry_group.get("en", "")
             ko_original = entry_group.get("ko_original", "")
             error_type = entry_group.get("error_type", "")
-
-            for variant in entry_group.get("variants", []):
-                flat_entry = {
+            flat_entries = [
+                {
                     "en": en_query,
                     "ko_original": ko_original,
                     "ko_typo": variant["text"],
@@ -142,13 +154,18 @@ def process_dataset(input_file: str, output_file: str, batch_size: int = 5):
                     "num_errors": variant["num_errors"],
                     "applied_errors": [error_type] * variant["num_errors"] if variant["num_errors"] > 0 else []
                 }
-                all_results.append(flat_entry)
+                for variant in entry_group.get("variants", [])
+            ]
+
+            # 중복 입력마다 같은 변형을 한 벌씩, 각 입력의 위치에 추가
+            positioned.extend((pos, flat_entries) for pos in members[idx])
 
-        # Rate limiting
-        if i + batch_size < len(simple_data):
-            time.sleep(1)
+    all_results = [flat_entry for flat_entries in in_input_order(positioned) for flat_entry in flat_entries]
 
     print(f"\n✅ Generated {len(all_results)} entries")
+    executor.close()
+    for line in executor.summaries():
+        print(line)
 
     # 결과 저장
     print(f"💾 Saving to {output_file}...")
@@ -157,7 +174,7 @@ def process_dataset(input_file: str, output_file: str, batch_size: int = 5):
 
     # 통계 출력
     print("\n📊 Statistics:")
-    print(f"  Original entries: {len(simple_data)}")
+    print(f"  Original entries: {total_entries}")
     print(f"  Generated entries: {len(all_results)}")
 
     # 각 오타 유형별 샘플 출력
@@ -197,8 +214,12 @@ if __name__ == "__main__":
     parser.add_argument("--batch-size", type=int, default=3, help="Batch size for API calls")
     parser.add_argument("--test", action="store_true", help="Test with small sample first")
     parser.add_argument("--sample-size", type=int, default=5, help="Sample size for testing")
+    parser.add_argument("--max-workers", type=int, default=1, help="Batches requested in parallel")
+    add_dedup_arguments(parser)
+    add_executor_arguments(parser)
 
     args = parser.parse_args()
+    executor = executor_from_args(args, "typo-gpt-basic", concurrency=args.max_workers)
 
     if args.test:
         # 테스트 모드
@@ -209,7 +230,9 @@ if __name__ == "__main__":
         count = process_dataset(
             sample_file,
             "mkqa_typo_sample_output.json",
-            batch_size=2
+            batch_size=2,
+            executor=executor,
+            dedup=not args.no_dedup
         )
         print(f"\n✅ Test complete! Generated {count} entries")
         print("Check 'mkqa_typo_sample_output.json' for results")
@@ -218,7 +241,9 @@ if __name__ == "__main__":
         count = process_dataset(
             args.input,
             args.output,
-            batch_size=args.batch_size
+            batch_size=args.batch_size,
+            executor=executor,
+            dedup=not args.no_dedup
         )
         print(f"\n✅ Complete! Generated {count} entries")
         print(f"Output saved to: {args.output}")
\ No newline at end of file
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fused refine + code-switching stage: one GPT request per batch returns the refined Korean and Case2-4 for every
+pair, written in the same formats as refine_korean_with_gpt.py followed by make_code_switching_gpt.py.
+"""
+
+import json
+import os
+import sys
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, os.path.join(SRC_DIR, "refine"))
+from llm.batch_jobs import (add_batch_arguments, build_batch_request, parse_range_id,
+                            read_batch_results, write_batch_requests)
+from llm.chat import TruncatedResponse
+from llm.checkpoint import add_checkpoint_arguments, checkpoint_path_for
+from llm.dedup import add_dedup_arguments, batched_calls_saved, dedup_summary, group_duplicates
+from llm.executor import LLMExecutor, add_executor_arguments, executor_from_args
+from llm.packing import DEFAULT_BUDGET_SHARE, DEFAULT_MAX_BATCH_ITEMS, add_packing_arguments, batch_spans
+from llm.rate_limit import estimate_text_tokens
+from llm.work_queue import add_queue_arguments
+from utils.json_stream import salvage_json_array
+from make_code_switching_gpt import (GENERATED_CASES, MULTI_CASE_EXAMPLES, SYSTEM_PROMPT, CaseValidator,
+                                     build_result, extract_valid_cases, generate_code_switched_text,
+                                     repair_invalid_cases, resolve_output_path, save_results, validate_case)
+from refine_korean_with_gpt import REFINE_MAX_TOKENS, load_refine_data, refine_item_tokens, save_refinement
+
+FUSED_MAX_TOKENS = 4000
+
+# The last example's Korean is cut off, to show that the cases are built from the refined sentence
+TRUNCATED_EXAMPLE_KO = "그리스 신들의 목록을"
+
+def create_fused_prompt(items: List[Tuple[int, Dict]]) -> str:
+    """Create one prompt asking for the refined Korean and the three code-switched cases of each pair."""
+    example_input = [{"id": i, "en": en, "ko": ko} for i, (ko, en, _) in enumerate(MULTI_CASE_EXAMPLES)]
+    example_input[-1]["ko"] = TRUNCATED_EXAMPLE_KO
+    example_output = [{"id": i, "ko": ko, **cases} for i, (ko, _, cases) in enumerate(MULTI_CASE_EXAMPLES)]
+    batch_input = [{"id": idx, "en": entry["en"], "ko": entry["ko"]} for idx, entry in items]
+
+    return f"""For each English-Korean question pair below, first refine the Korean translation:
+1. Complete a Korean sentence that is cut off, based on what is already there.
+2. Rewrite awkward Korean so that it reads naturally.
+3. Replace any English in the Korean with Korean.
+4. If the Korean cannot be understood at all, set "ko" to null.
+
+Then generate three code-switched versions of the question from the refined Korean and the English.
+- Case2: Korean sentence with keyword-level English switching. Replace 1-2 key nouns or verbs with English while keeping Korean sentence structure and particles.
+- Case3: Mixed structure sentence. Use English sentence structure for the main clause but keep Korean nouns/phrases.
+- Case4: English sentence with keyword-level Korean switching. Use English sentence structure but keep 1-2 Korean key terms.
+
+Return a JSON array with one object per input pair, in input order, with keys "id", "ko", "Case2", "Case3" and "Case4". Leave out the cases when "ko" is null.
+
+Example input:
+{json.dumps(example_input, ensure_ascii=False)}
+Example output:
+{json.dumps(example_output, ensure_ascii=False)}
+
+Pairs:
+{json.dumps(batch_input, ensure_ascii=False)}
+Output: """
+
+def build_fused_messages(items: List[Tuple[int, Dict]]) -> List[Dict[str, str]]:
+    """Build the chat messages for one fused batch of (id, en/ko pair) items."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT + " Respond with a JSON array only."},
+        {"role": "user", "content": create_fused_prompt(items)}
+    ]
+
+def parse_fused_response(text: str, ids: List[int]) -> Dict[int, Dict]:
+    """Map each answered id to {"ko": refined Korean or None, "cases": its valid generated cases}.
+
+    Complete items are salvaged from a truncated or malformed response; unknown ids are ignored.
+    """
+    wanted = set(ids)
+    answers = {}
+    for item in salvage_json_array(text):
+        if not isinstance(item, dict) or item.get("id") not in wanted or "ko" not in item:
+            continue
+        ko = item["ko"]
+        if ko is None:
+            answers[item["id"]] = {"ko": None, "cases": {}}
+        elif isinstance(ko, str) and ko.strip():
+            answers[item["id"]] = {"ko": ko.strip(), "cases": extract_valid_cases(item)}
+    return answers
+
+def is_complete(answer: Dict) -> bool:
+    """A discarded pair, or a refined one with every case"""
+    return answer["ko"] is None or len(answer["cases"]) == len(GENERATED_CASES)
+
+def fused_item_tokens(item: Tuple[int, Dict]) -> int:
+    """Estimated answer tokens for an (id, entry) item: the refined sentence plus three mixed-script cases"""
+    case_tokens = max(estimate_text_tokens(item[1]["ko"]), estimate_text_tokens(item[1]["en"]))
+    return refine_item_tokens(item) + 3 * case_tokens + 30
+
+def process_fused_batch(executor: LLMExecutor, items: List[Tuple[int, Dict]]) -> Optional[Dict[int, Dict]]:
+    """Refine and code-switch a batch in one request; returns None if the API call fails."""
+    try:
+        content = executor.complete(
+            build_fused_messages(items),
+            temperature=0.3,
+            max_tokens=FUSED_MAX_TOKENS,
+            tag="fused",
+            allow_truncated=False
+        )
+    except TruncatedResponse as e:
+        # Keep the items that were finished; the rest are retried in smaller batches
+        print(f"Response truncated at max_tokens for a fused batch of {len(items)} items")
+        content = e.content
+    except Exception as e:
+        print(f"Error generating fused batch: {e}")
+        return None
+
+    answers = parse_fused_response(content, [idx for idx, _ in items])
+    if len(answers) < len(items):
+        print(f"Fused response covered {len(answers)} of {len(items)} items")
+    return answers
+
+def fuse_with_bisection(executor: LLMExecutor, items: List[Tuple[int, Dict]]) -> Dict[int, Dict]:
+    """Run a fused batch, retrying missing or incomplete items in recursively halved sub-batches."""
+    answers = process_fused_batch(executor, items)
+    if answers is None:
+        return {}
+
+    incomplete = [(idx, entry) for idx, entry in items if idx not in answers or not is_complete(answers[idx])]
+    if not incomplete or len(items) == 1:
+        return answers
+
+    mid = (len(incomplete) + 1) // 2
+    for half in (incomplete[:mid], incomplete[mid:]):
+        if half:
+            retried = fuse_with_bisection(executor, half)
+            # A partial answer is only replaced by a better one
+            answers.update((idx, answer) for idx, answer in retried.items()
+                           if idx not in answers or is_complete(answer))
+    return answers
+
+def finish_cases(answer: Dict, en_text: str, executor: LLMExecutor,
+                 validator: Optional[CaseValidator] = None) -> Dict[str, str]:
+    """Generate the cases a fused answer left out one by one, then repair the invalid ones."""
+    generated = dict(answer["cases"])
+    for case_name in GENERATED_CASES:
+        if case_name not in generated:
+            generated[case_name] = generate_code_switched_text(answer["ko"], en_text, case_name, executor)
+    return repair_invalid_cases(answer["ko"], en_text, generated, executor, validator)
+
+def assemble_outputs(data: List[Dict], rep_of: Dict[int, int], answers: Dict[int, Dict]):
+    """Build both stages' outputs in input order, copying each representative's answer to its duplicates.
+
+    Returns the refined pairs, discarded and unanswered entries, and code-switched records whose ids are
+    positions in the refined pairs, as if make_code_switching_gpt.py had been run on them.
+    """
+    refined_data = []
+    failed_entries = []
+    unrefined_entries = []
+    results = []
+
+    for idx, entry in enumerate(data):
+        answer = answers.get(rep_of[idx])
+        if answer is None:
+            unrefined_entries.append(entry)
+        elif answer["ko"] is None:
+            failed_entries.append(entry)
+        else:
+            cases = {case_name: answer["cases"].get(case_name, "") for case_name in GENERATED_CASES}
+            results.append(build_result(len(refined_data), answer["ko"], entry["en"], cases))
+            refined_data.append({"en": entry["en"], "ko": answer["ko"]})
+
+    return refined_data, failed_entries, unrefined_entries, results
+
+def group_fused_inputs(data: List[Dict], dedup: bool = True,
+                       batch_size: int = 10) -> Tuple[List[Tuple[int, Dict]], Dict[int, int]]:
+    """Items to send (first of each group of near-identical pairs) and each input's representative."""
+    if not dedup:
+        return list(enumerate(data)), {idx: idx for idx in range(len(data))}
+
+    groups = group_duplicates(data)
+    print(dedup_summary(len(data), len(groups), batched_calls_saved(len(data), len(groups), batch_size)))
+    rep_of = {idx: rep for rep, members in groups.items() for idx in members}
+    return [(rep, data[rep]) for rep in groups], rep_of
+
+def round_trip_summary(items: List[Tuple[int, Dict]], fused_calls: int, batch_size: int, token_budget: int,
+                       max_batch_items: int) -> str:
+    """Fused requests against the refine batches and per-case requests of the two-stage pipeline"""
+    refine_budget = int(REFINE_MAX_TOKENS * DEFAULT_BUDGET_SHARE) if token_budget > 0 else 0
+    refine_calls = len(batch_spans(items, batch_size, refine_item_tokens, refine_budget, max_batch_items))
+    code_switch_calls = len(items) * len(GENERATED_CASES)
+    return (f"{fused_calls} fused requests replace {refine_calls} refine batches and {code_switch_calls} "
+            f"code-switching requests")
+
+def save_outputs(refined_data: List[Dict], failed_entries: List[Dict], unrefined_entries: List[Dict],
+                 results: List[Dict], refined_output: str, output_file: str):
+    """Write the refine-stage files and the code-switched data"""
+    save_refinement(refined_data, failed_entries, refined_output, unrefined_entries)
+    save_results(results, output_file)
+
+def export_fused_batch(data: List[Dict], batch_file: str, batch_size: int = 10, dedup: bool = True,
+                       token_budget: int = 0, max_batch_items: int = DEFAULT_MAX_BATCH_ITEMS,
+                       model: str = "gpt-4o-mini") -> int:
+    """Write one batch request per fused batch instead of calling the API."""
+    items, _ = group_fused_inputs(data, dedup, batch_size)
+    spans = batch_spans(items, batch_size, fused_item_tokens, token_budget, max_batch_items)
+    print(round_trip_summary(items, len(spans), batch_size, token_budget, max_batch_items))
+
+    requests = (
+        build_batch_request(f"fused-{items[start][0]}-{items[end - 1][0]}", build_fused_messages(items[start:end]),
+                            model, 0.3, FUSED_MAX_TOKENS)
+        for start, end in spans
+    )
+    return write_batch_requests(batch_file, requests)
+
+def import_fused_batch(data: List[Dict], batch_file: str, dedup: bool = True):
+    """Merge fused batch results into both stages' outputs; cases without a usable result are left empty."""
+    items, rep_of = group_fused_inputs(data, dedup)
+    sent = dict(items)
+    answers = {}
+    failed_requests = 0
+
+    for custom_id, content in read_batch_results(batch_file).items():
+        span = parse_range_id(custom_id, "fused")
+        if span is None:
+            continue
+        if content is None:
+            failed_requests += 1
+            continue
+        answers.update(parse_fused_response(content, [idx for idx in range(span[0], span[1] + 1) if idx in sent]))
+
+    incomplete = sum(1 for answer in answers.values() if not is_complete(answer))
+    print(f"Imported answers for {len(answers)} of {len(items)} pairs ({failed_requests} failed requests, "
+          f"{incomplete} with missing cases)")
+    return assemble_outputs(data, rep_of, answers)
+
+def process_fused_data(data: List[Dict], executor: LLMExecutor, checkpoint_file: str, batch_size: int = 10,
+                       resume: bool = False, dedup: bool = True, token_budget: int = 0,
+                       max_batch_items: int = DEFAULT_MAX_BATCH_ITEMS,
+                       validator: Optional[CaseValidator] = None):
+    """Refine and code-switch every pair with one request per batch; returns assemble_outputs' lists."""
+    items, rep_of = group_fused_inputs(data, dedup, batch_size)
+    spans = batch_spans(items, batch_size, fused_item_tokens, token_budget, max_batch_items)
+    print(round_trip_summary(items, len(spans), batch_size, token_budget, max_batch_items))
+
+    def fused_worker(batch, start):
+        try:
+            answers = fuse_with_bisection(executor, batch)
+        except Exception as e:
+            print(f"Error processing fused batch at id {batch[0][0]}: {e}")
+            answers = {}
+
+        records = []
+        for idx, entry in batch:
+            if idx not in answers:
+                continue
+            answer = answers[idx]
+            if answer["ko"] is not None:
+                answer = {"ko": answer["ko"], "cases": finish_cases(answer, entry["en"], executor, validator)}
+            records.append({"id": idx, **answer})
+        return {"answers": records}
+
+    # Finished batches are appended to a checkpoint log; --resume skips them
+    records = executor.run_batches(items, spans, fused_worker, checkpoint_file, resume=resume,
+                                   meta={"batch_size": batch_size, "dedup": dedup, "token_budget": token_budget,
+                                         "max_batch_items": max_batch_items},
+                                   desc="Refining and code-switching")
+
+    answers = {answer["id"]: answer for record in records for answer in record["answers"]}
+    return assemble_outputs(data, rep_of, answers)
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Refine MKQA Korean translations and generate code-switched data in one GPT pass",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--input", type=str, default="mkqa_short.json",
+                        help="Input JSON file with en/ko pairs (or MKQA query/queries records)")
+    parser.add_argument("--output", type=str, default="code_switched_data.json",
+                        help="Path to the code-switched output JSON file")
+    parser.add_argument("--refined-output", type=str, default="mkqa_refined.json",
+                        help="Path to the refined en/ko output JSON file, as written by refine_korean_with_gpt.py")
+    parser.add_argument("--model", type=str, default="gpt-4o-mini", choices=["gpt-4o-mini", "gpt-4", "gpt-3.5-turbo"],
+                        help="OpenAI model to use for generation")
+    parser.add_argument("--batch-size", type=int, default=10,
+                        help="Pairs per request unless --token-budget is given")
+    parser.add_argument("--threads", type=int, default=5,
+                        help="Number of threads for parallel processing")
+    parser.add_argument("--max-regenerations", type=int, default=2,
+                        help="Regenerate a case that fails the script-ratio/structure check up to N times on its own")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="Keep every generated case without validating it")
+
+    add_checkpoint_arguments(parser)
+    add_queue_arguments(parser)
+    add_batch_arguments(parser)
+    add_dedup_arguments(parser)
+    add_packing_arguments(parser, FUSED_MAX_TOKENS)
+    add_executor_arguments(parser)
+
+    return parser.parse_args()
+
+def main():
+    """Refine and code-switch the input pairs, or export/import them as a batch job."""
+    args = parse_arguments()
+
+    if not os.path.exists(args.input):
+        print(f"Error: Input file '{args.input}' does not exist.")
+        return
+
+    data = load_refine_data(args.input)
+    if data is None:
+        return
+    print(f"Loaded {len(data)} question pairs")
+
+    # Offline batch-job modes never call the API
+    if args.export_batch:
+        count = export_fused_batch(data, args.export_batch, batch_size=args.batch_size, dedup=not args.no_dedup,
+                                   token_budget=args.token_budget, max_batch_items=args.max_batch_items,
+                                   model=args.model)
+        print(f"Wrote {count} batch requests for {len(data)} items to {args.export_batch}")
+        return
+
+    if args.import_batch:
+        outputs = import_fused_batch(data, args.import_batch, dedup=not args.no_dedup)
+        results = outputs[3]
+        invalid = sum(1 for result in results for case_name in GENERATED_CASES
+                      if result['code_switched_versions'][case_name]
+                      and not validate_case(case_name, result['code_switched_versions'][case_name],
+                                            result['original_ko'], result['original_en']))
+        print(f"{invalid} imported cases fail validation")
+        save_outputs(*outputs, args.refined_output, args.output)
+        return
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("Error: OPENAI_API_KEY environment variable is not set.")
+        print("Please set it using: export OPENAI_API_KEY='your-api-key'")
+        return
+
+    checkpoint_file = args.checkpoint or checkpoint_path_for(resolve_output_path(args.output))
+    print(f"Configuration:")
+    print(f"  Input file: {args.input}")
+    print(f"  Output files: {args.refined_output} (refined), {args.output} (code-switched)")
+    print(f"  Model: {args.model}")
+    if args.token_budget > 0:
+        print(f"  Batches: up to ~{args.token_budget} output tokens / {args.max_batch_items} pairs")
+    else:
+        print(f"  Batches: {args.batch_size} pairs")
+    print(f"  Threads: {args.threads}")
+    print(f"  Checkpoint: {checkpoint_file}")
+    print(f"  Validation: {'disabled' if args.no_validate else f'up to {args.max_regenerations} regenerations per case'}")
+    print()
+
+    executor = executor_from_args(args, "fused", concurrency=args.threads, model=args.model)
+    validator = None if args.no_validate else CaseValidator(args.max_regenerations)
+
+    try:
+        outputs = process_fused_data(data, executor, checkpoint_file, batch_size=args.batch_size,
+                                     resume=args.resume, dedup=not args.no_dedup, token_budget=args.token_budget,
+                                     max_batch_items=args.max_batch_items, validator=validator)
+    finally:
+        executor.close()
+
+    refined_data, failed_entries, unrefined_entries, results = outputs
+    print(f"Refined {len(refined_data)} pairs, discarded {len(failed_entries)}, "
+          f"{len(unrefined_entries)} without an answer")
+    for line in executor.summaries():
+        print(line)
+    if validator is not None:
+        print(validator.summary())
+
+    print("\nSaving results...")
+    save_outputs(*outputs, args.refined_output, args.output)
+
+    # Print sample results
+    print("\n" + "="*60)
+    print("Sample results:")
+    print("="*60)
+    for i, sample in enumerate(results[:3]):
+        print(f"\nExample {i+1}:")
+        print(f"  Refined Korean:   {sample['original_ko']}")
+        print(f"  Original English: {sample['original_en']}")
+        print("  Code-switched versions:")
+        for case_name, text in sample['code_switched_versions'].items():
+            print(f"    [{case_name}]: {text}")
+
+if __name__ == "__main__":
+    main()
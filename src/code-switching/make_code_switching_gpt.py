@@ -3,26 +3,32 @@
 
 import json
 import os
-from typing import List, Dict, Tuple
-from openai import OpenAI
-from tqdm import tqdm
-import random
-import time
+import re
+import sys
+from typing import Iterator, List, Dict, Tuple, Optional, Set
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
 import threading
 
-# Initialize OpenAI client
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm.checkpoint import (CheckpointWriter, add_checkpoint_arguments, checkpoint_path_for,
+                            compact_checkpoint, load_checkpoint)
+from llm.batch_jobs import (add_batch_arguments, build_batch_request, parse_range_id,
+                            read_batch_results, write_batch_requests)
+from llm.dedup import add_dedup_arguments, batched_calls_saved, dedup_summary, group_duplicates
+from llm.executor import LLMExecutor, add_executor_arguments, executor_from_args, parse_json_response
+from llm.near_dup import MinHashIndex, add_reuse_arguments, entity_replacements, pair_text, substitute
+from llm.work_queue import add_queue_arguments
 
 def load_mkqa_data(file_path: str) -> List[Dict[str, str]]:
     """Load MKQA data from JSON file."""
     with open(file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def create_code_switching_prompt(ko_text: str, en_text: str, case_type: str) -> str:
+# A (ko, en, cases) pair answered earlier, shown as one more few-shot example
+Example = Tuple[str, str, Dict[str, str]]
+
+def create_code_switching_prompt(ko_text: str, en_text: str, case_type: str, example: Optional[Example] = None) -> str:
     """Create a prompt for GPT to generate code-switched text based on specific case type with few-shot examples."""
 
     case_prompts = {
@@ -90,59 +96,503 @@ English original: {en_text}
 Output: """
     }
 
-    return case_prompts[case_type]
-
-def generate_code_switched_text(ko_text: str, en_text: str, case_type: str,
-                               model: str = "gpt-4o-mini") -> str:
+    prompt = case_prompts[case_type]
+    if example is not None:
+        # The near duplicate goes last, right before the question it resembles
+        ex_ko, ex_en, ex_cases = example
+        prompt = prompt.replace("\n\nNow generate:", f"\n\nKorean original: {ex_ko}\nEnglish original: {ex_en}\n"
+                                f"Output: {ex_cases[case_type]}\n\nNow generate:", 1)
+    return prompt
+
+SYSTEM_PROMPT = "You are a Korean-English bilingual speaker who naturally code-switches between languages. Follow the pattern shown in the examples exactly. Always maintain the original meaning while creating natural-sounding mixed sentences. Only output the final result without any additional explanation."
+
+def build_code_switching_messages(ko_text: str, en_text: str, case_type: str,
+                                  example: Optional[Example] = None) -> List[Dict[str, str]]:
+    """Build the chat messages for a single code-switching case."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": create_code_switching_prompt(ko_text, en_text, case_type, example)}
+    ]
+
+def generate_code_switched_text(ko_text: str, en_text: str, case_type: str, executor: LLMExecutor,
+                                temperature: float = 0.3, tag: Optional[str] = None,
+                                example: Optional[Example] = None) -> str:
     """Generate code-switched text using GPT with few-shot prompting."""
 
-    prompt = create_code_switching_prompt(ko_text, en_text, case_type)
+    try:
+        content = executor.complete(
+            build_code_switching_messages(ko_text, en_text, case_type, example),
+            temperature=temperature,  # Lower temperature for more consistent pattern following
+            max_tokens=200,
+            tag=tag or case_type
+        )
+
+        return content.strip()
+
+    except Exception as e:
+        print(f"Error generating code-switched text: {e}")
+        return ""
+
+async def agenerate_code_switched_text(ko_text: str, en_text: str, case_type: str, executor: LLMExecutor,
+                                       temperature: float = 0.3, tag: Optional[str] = None,
+                                       example: Optional[Example] = None) -> str:
+    """Async version of generate_code_switched_text."""
 
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a Korean-English bilingual speaker who naturally code-switches between languages. Follow the pattern shown in the examples exactly. Always maintain the original meaning while creating natural-sounding mixed sentences. Only output the final result without any additional explanation."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,  # Lower temperature for more consistent pattern following
-            max_tokens=200
+        content = await executor.acomplete(
+            build_code_switching_messages(ko_text, en_text, case_type, example),
+            temperature=temperature,
+            max_tokens=200,
+            tag=tag or case_type
         )
 
-        return response.choices[0].message.content.strip()
+        return content.strip()
 
     except Exception as e:
         print(f"Error generating code-switched text: {e}")
         return ""
 
+# Cases produced by GPT; Case1 and Case5 are the original sentences
+GENERATED_CASES = ["Case2", "Case3", "Case4"]
+
+MULTI_CASE_EXAMPLES = [
+    ("미국의 수도는 어디인가?", "What is the capital of the United States?",
+     {"Case2": "미국의 capital은 어디인가?",
+      "Case3": "What is 미국의 수도?",
+      "Case4": "What is the 수도 of the United States?"}),
+    ("홍콩은 도시인가요, 나라인가요", "Is Hong Kong a city or a country?",
+     {"Case2": "홍콩은 city인가요, country인가요",
+      "Case3": "Is 홍콩 a 도시 or 나라?",
+      "Case4": "Is Hong Kong a 도시 or a country?"}),
+    ("그리스 신들의 목록을 주세요.", "Give me a list of the Greek gods.",
+     {"Case2": "Greek 신들의 목록을 주세요.",
+      "Case3": "Give me a list of 그리스 신들.",
+      "Case4": "Give me a list of the 신들."}),
+]
+
+def create_multi_case_prompt(ko_text: str, en_text: str, example: Optional[Example] = None) -> str:
+    """Create a single prompt asking for Case2, Case3 and Case4 as one JSON object."""
+    examples = "\n\n".join(
+        f"Korean original: {ko}\nEnglish original: {en}\nOutput: "
+        f"{json.dumps({case_name: cases[case_name] for case_name in GENERATED_CASES}, ensure_ascii=False)}"
+        for ko, en, cases in MULTI_CASE_EXAMPLES + ([example] if example is not None else [])
+    )
 
-def save_results(results: List[Dict], output_file: str):
-    """Save results to JSON file."""
+    return f"""Generate three code-switched versions of the question and return them as a JSON object with keys "Case2", "Case3" and "Case4".
+- Case2: Korean sentence with keyword-level English switching. Replace 1-2 key nouns or verbs with English while keeping Korean sentence structure and particles.
+- Case3: Mixed structure sentence. Use English sentence structure for the main clause but keep Korean nouns/phrases.
+- Case4: English sentence with keyword-level Korean switching. Use English sentence structure but keep 1-2 Korean key terms.
+
+Examples:
+{examples}
+
+Now generate:
+Korean original: {ko_text}
+English original: {en_text}
+Output: """
+
+def build_multi_case_messages(ko_text: str, en_text: str, example: Optional[Example] = None) -> List[Dict[str, str]]:
+    """Build the chat messages for the single-call multi-case request."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT + " Respond with a JSON object only."},
+        {"role": "user", "content": create_multi_case_prompt(ko_text, en_text, example)}
+    ]
+
+def load_json_object(text: str) -> Dict:
+    """Parse a JSON object from a model response, tolerating markdown fences; returns {} on failure."""
+    try:
+        parsed = parse_json_response(text)
+    except json.JSONDecodeError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+def extract_valid_cases(parsed: Dict) -> Dict[str, str]:
+    """Keep only the generated cases that are non-empty strings."""
+    if not isinstance(parsed, dict):
+        return {}
+    return {
+        case_name: parsed[case_name].strip()
+        for case_name in GENERATED_CASES
+        if isinstance(parsed.get(case_name), str) and parsed[case_name].strip()
+    }
+
+def parse_multi_case_response(text: str) -> Dict[str, str]:
+    """Extract the valid cases from a multi-case JSON response; invalid or missing cases are dropped."""
+    return extract_valid_cases(load_json_object(text))
+
+def create_multi_item_prompt(items: List[Tuple[int, Dict[str, str]]]) -> str:
+    """Create one prompt covering several (ko, en) pairs, tagged by id."""
+    example_input = [
+        {"id": str(i), "ko": ko, "en": en} for i, (ko, en, _) in enumerate(MULTI_CASE_EXAMPLES)
+    ]
+    example_output = {str(i): cases for i, (_, _, cases) in enumerate(MULTI_CASE_EXAMPLES)}
+    batch_input = [{"id": str(idx), "ko": item['ko'], "en": item['en']} for idx, item in items]
+
+    return f"""For each question pair below, generate three code-switched versions.
+- Case2: Korean sentence with keyword-level English switching. Replace 1-2 key nouns or verbs with English while keeping Korean sentence structure and particles.
+- Case3: Mixed structure sentence. Use English sentence structure for the main clause but keep Korean nouns/phrases.
+- Case4: English sentence with keyword-level Korean switching. Use English sentence structure but keep 1-2 Korean key terms.
+
+Return a JSON object that maps every input id to an object with keys "Case2", "Case3" and "Case4".
+
+Example input:
+{json.dumps(example_input, ensure_ascii=False)}
+Example output:
+{json.dumps(example_output, ensure_ascii=False)}
+
+Input:
+{json.dumps(batch_input, ensure_ascii=False)}
+Output: """
+
+def build_multi_item_messages(items: List[Tuple[int, Dict[str, str]]]) -> List[Dict[str, str]]:
+    """Build the chat messages for a multi-item request."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT + " Respond with a JSON object only."},
+        {"role": "user", "content": create_multi_item_prompt(items)}
+    ]
+
+def parse_multi_item_response(text: str, ids: List[int]) -> Dict[int, Dict[str, str]]:
+    """Return the ids whose cases all came back valid, keyed by id."""
+    parsed = load_json_object(text)
+    complete = {}
+    for idx in ids:
+        cases = extract_valid_cases(parsed.get(str(idx)))
+        if len(cases) == len(GENERATED_CASES):
+            complete[idx] = cases
+    return complete
+
+def generate_all_cases(ko_text: str, en_text: str, executor: LLMExecutor,
+                       example: Optional[Example] = None) -> Dict[str, str]:
+    """Generate all GPT cases in one structured request, falling back per case when a field is unusable."""
+    try:
+        content = executor.complete(
+            build_multi_case_messages(ko_text, en_text, example),
+            temperature=0.3,
+            max_tokens=400,
+            response_format={"type": "json_object"},
+            tag="all"
+        )
+        generated = parse_multi_case_response(content)
+    except Exception as e:
+        print(f"Error generating code-switched cases: {e}")
+        generated = {}
+
+    for case_name in GENERATED_CASES:
+        if case_name not in generated:
+            generated[case_name] = generate_code_switched_text(ko_text, en_text, case_name, executor,
+                                                               example=example)
+
+    return generated
+
+async def agenerate_all_cases(ko_text: str, en_text: str, executor: LLMExecutor,
+                              example: Optional[Example] = None) -> Dict[str, str]:
+    """Async version of generate_all_cases."""
+    try:
+        content = await executor.acomplete(
+            build_multi_case_messages(ko_text, en_text, example),
+            temperature=0.3,
+            max_tokens=400,
+            response_format={"type": "json_object"},
+            tag="all"
+        )
+        generated = parse_multi_case_response(content)
+    except Exception as e:
+        print(f"Error generating code-switched cases: {e}")
+        generated = {}
+
+    missing = [case_name for case_name in GENERATED_CASES if case_name not in generated]
+    fallbacks = await asyncio.gather(*[
+        agenerate_code_switched_text(ko_text, en_text, case_name, executor, example=example) for case_name in missing
+    ])
+    generated.update(zip(missing, fallbacks))
+
+    return generated
+
+def resolve_output_path(output_file: str) -> str:
+    """Resolve an output file name the same way save_results does."""
     # If output_file already contains a path, use it as is
     # Otherwise, use current directory
     if os.path.dirname(output_file):
-        output_path = output_file
-    else:
-        output_path = os.path.join(os.path.dirname(__file__) or '.', output_file)
+        return output_file
+    return os.path.join(os.path.dirname(__file__) or '.', output_file)
+
+def save_results(results: List[Dict], output_file: str):
+    """Save results to JSON file."""
+    output_path = resolve_output_path(output_file)
 
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(results, f, ensure_ascii=False, indent=2)
     print(f"Saved {len(results)} items to {output_path}")
 
+def export_batch_requests(data: List[Dict[str, str]], batch_file: str, model: str = "gpt-4o-mini",
+                          single_call: bool = False, items_per_request: int = 1,
+                          skip_ids: Optional[Set[int]] = None) -> int:
+    """Write every request an online run would send to a batch-request JSONL file."""
+    skip_ids = skip_ids or set()
+    indexed_data = [(idx, item) for idx, item in enumerate(data) if idx not in skip_ids]
+
+    def requests():
+        if items_per_request > 1:
+            for i in range(0, len(indexed_data), items_per_request):
+                unit = indexed_data[i:i + items_per_request]
+                yield build_batch_request(f"cs-items-{unit[0][0]}-{unit[-1][0]}", build_multi_item_messages(unit),
+                                          model, 0.3, 150 * len(unit) + 100, {"type": "json_object"})
+        elif single_call:
+            for idx, item in indexed_data:
+                yield build_batch_request(f"cs-{idx}-all", build_multi_case_messages(item['ko'], item['en']),
+                                          model, 0.3, 400, {"type": "json_object"})
+        else:
+            for idx, item in indexed_data:
+                for case_name in GENERATED_CASES:
+                    yield build_batch_request(f"cs-{idx}-{case_name}",
+                                              build_code_switching_messages(item['ko'], item['en'], case_name),
+                                              model, 0.3, 200)
+
+    return write_batch_requests(batch_file, requests())
+
+def import_batch_results(data: List[Dict[str, str]], batch_file: str,
+                         skip_ids: Optional[Set[int]] = None) -> Tuple[List[Dict], int]:
+    """Merge a batch-results JSONL file into output records; returns the records and the number of missing cases."""
+    skip_ids = skip_ids or set()
+    generated = {idx: {} for idx in range(len(data))}
+
+    for custom_id, content in read_batch_results(batch_file).items():
+        if content is None:
+            continue
+        span = parse_range_id(custom_id, "cs-items")
+        if span is not None:
+            ids = [idx for idx in range(span[0], span[1] + 1) if idx < len(data)]
+            for idx, cases in parse_multi_item_response(content, ids).items():
+                generated[idx].update(cases)
+            continue
+        match = re.fullmatch(r"cs-(\d+)-(all|Case\d)", custom_id)
+        if not match or int(match.group(1)) >= len(data):
+            continue
+        idx, case_name = int(match.group(1)), match.group(2)
+        if case_name == "all":
+            generated[idx].update(parse_multi_case_response(content))
+        elif case_name in GENERATED_CASES and content.strip():
+            generated[idx][case_name] = content.strip()
+
+    # Cases without a usable result are left empty, as in the online error path
+    missing = 0
+    results = []
+    for idx, item in enumerate(data):
+        if idx in skip_ids:
+            continue
+        for case_name in GENERATED_CASES:
+            if case_name not in generated[idx]:
+                generated[idx][case_name] = ""
+                missing += 1
+        results.append(build_result(idx, item['ko'], item['en'], generated[idx]))
+
+    return results, missing
+
+def fan_out_results(results: List[Dict], groups: Dict[int, List[int]], data: List[Dict[str, str]]) -> List[Dict]:
+    """Copy each representative's generated cases to every duplicate grouped with it."""
+    fanned = []
+    for result in results:
+        for idx in groups.get(result['id'], [result['id']]):
+            if idx == result['id']:
+                fanned.append(result)
+            else:
+                fanned.append(build_result(idx, data[idx]['ko'], data[idx]['en'], result['code_switched_versions']))
+    return sorted(fanned, key=lambda result: result['id'])
+
+# Each Hangul syllable carries roughly as much content as 2-3 Latin letters
+HANGUL_WEIGHT = 2.5
+
+# Expected weighted English share of each generated case
+CASE_ENGLISH_RANGES = {
+    "Case2": (0.05, 0.6),   # Korean sentence with 1-2 English keywords
+    "Case3": (0.15, 0.9),   # English frame around Korean nouns/phrases
+    "Case4": (0.4, 0.95),   # English sentence with 1-2 Korean key terms
+}
+
+def script_counts(text: str) -> Tuple[int, int]:
+    """Count Hangul and Latin letters in the text."""
+    hangul = sum(1 for c in text if '\uac00' <= c <= '\ud7a3' or '\u3131' <= c <= '\u318e')
+    latin = sum(1 for c in text if c.isascii() and c.isalpha())
+    return hangul, latin
+
+def english_share(text: str) -> float:
+    """Share of Latin script in the text, weighting each Hangul syllable by HANGUL_WEIGHT."""
+    hangul, latin = script_counts(text)
+    total = latin + HANGUL_WEIGHT * hangul
+    return latin / total if total else 0.0
+
 def validate_code_switching_ratio(text: str, target_range: Tuple[float, float]) -> bool:
     """Validate if the generated text meets the target English ratio."""
-    # Simple word-based validation
-    words = text.split()
-    english_words = sum(1 for word in words if all(ord(c) < 128 for c in word))
-    total_words = len(words)
-
-    if total_words == 0:
+    if script_counts(text) == (0, 0):
         return False
 
-    english_ratio = english_words / total_words
     min_ratio, max_ratio = target_range
+    return min_ratio <= english_share(text) <= max_ratio
 
-    return min_ratio <= english_ratio <= max_ratio
+def validate_case(case_name: str, text: str, ko_text: str, en_text: str) -> bool:
+    """Check a generated case's script mix and sentence frame."""
+    text = text.strip()
+    if not text or "\n" in text or text.lower().startswith(("output:", "case")):
+        return False
+    if text in (ko_text.strip(), en_text.strip()):
+        return False
+
+    hangul, latin = script_counts(text)
+    if not hangul or not latin:
+        return False
+    if not validate_code_switching_ratio(text, CASE_ENGLISH_RANGES[case_name]):
+        return False
+
+    # Words that carry letters, ignoring numbers and punctuation
+    words = [word for word in text.split() if script_counts(word) != (0, 0)]
+    if case_name == "Case2":
+        # Korean predicate and particles close the sentence
+        return script_counts(words[-1])[0] > 0
+    # English main clause opens the sentence
+    first_hangul, first_latin = script_counts(words[0])
+    return first_latin >= first_hangul
+
+class CaseValidator:
+    """Validate generated cases and count failures and repairs across workers."""
+
+    def __init__(self, max_regenerations: int = 2):
+        self.max_regenerations = max_regenerations
+        self.checked = 0
+        self.failed = 0
+        self.repaired = 0
+        self._lock = threading.Lock()
+
+    def invalid_cases(self, ko_text: str, en_text: str, generated: Dict[str, str]) -> List[str]:
+        """Return the generated cases that fail validation."""
+        invalid = [case_name for case_name in GENERATED_CASES
+                   if not validate_case(case_name, generated.get(case_name, ""), ko_text, en_text)]
+        with self._lock:
+            self.checked += len(GENERATED_CASES)
+            self.failed += len(invalid)
+        return invalid
+
+    def record_repair(self):
+        with self._lock:
+            self.repaired += 1
+
+    def summary(self) -> str:
+        return (f"Validation: {self.failed} of {self.checked} cases failed, {self.repaired} fixed by "
+                f"regeneration, {self.failed - self.repaired} still invalid")
+
+DEFAULT_REUSE_SOURCE = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..",
+                                                    "data", "outputs", "code_switched_data_fin.json"))
+
+class CaseReuse:
+    """MinHash index of answered pairs, shared by all workers, for few-shot reuse and entity swaps."""
+
+    def __init__(self, threshold: float, entity_swap: bool = False):
+        self.index = MinHashIndex(threshold=threshold)
+        self.entity_swap = entity_swap
+        self.lookups = 0
+        self.near = 0
+        self.swapped = 0
+        self._lock = threading.Lock()
+
+    def add(self, ko_text: str, en_text: str, generated: Dict[str, str]):
+        """Index a pair whose generated cases all pass validation; failed answers are never reused."""
+        if all(validate_case(case_name, generated.get(case_name, ""), ko_text, en_text)
+               for case_name in GENERATED_CASES):
+            with self._lock:
+                self.index.add(pair_text(ko_text, en_text), (ko_text, en_text, dict(generated)))
+
+    def load(self, path: str) -> int:
+        """Index the records of an earlier code-switching output; returns how many were usable."""
+        before = len(self.index)
+        for record in load_mkqa_data(path):
+            self.add(record['original_ko'], record['original_en'], record['code_switched_versions'])
+        return len(self.index) - before
+
+    def lookup(self, ko_text: str, en_text: str) -> Tuple[Optional[Dict[str, str]], Optional[Example]]:
+        """Find the nearest answered pair; returns (swapped cases, None) when an entity swap fills every case
+        with valid text, otherwise (None, the neighbour as a few-shot example, or None if there is none)."""
+        with self._lock:
+            self.lookups += 1
+            hit = self.index.nearest(pair_text(ko_text, en_text))
+            if hit is not None:
+                self.near += 1
+        if hit is None:
+            return None, None
+
+        example = hit[1]
+        if self.entity_swap:
+            replacements = entity_replacements(example[0], example[1], ko_text, en_text)
+            if replacements is not None:
+                swapped = {case_name: substitute(example[2][case_name], replacements) for case_name in GENERATED_CASES}
+                if all(text and validate_case(case_name, text, ko_text, en_text)
+                       for case_name, text in swapped.items()):
+                    with self._lock:
+                        self.swapped += 1
+                    return swapped, None
+        return None, example
+
+    def summary(self) -> str:
+        swap = f", {self.swapped} filled by entity swap without GPT" if self.entity_swap else ""
+        return (f"Reuse: {self.near} of {self.lookups} inputs had a near duplicate "
+                f"(>= {self.index.threshold:.2f} similarity){swap}; index holds {len(self.index)} pairs")
+
+def reuse_from_args(args) -> Optional[CaseReuse]:
+    """Build the near-duplicate index from --reuse-source files, or None without --reuse."""
+    if not args.reuse:
+        return None
+    reuse = CaseReuse(args.reuse_threshold, entity_swap=args.entity_swap)
+    for path in args.reuse_source:
+        if os.path.exists(path):
+            print(f"Reuse index: {reuse.load(path)} pairs from {path}")
+        else:
+            print(f"Reuse source {path} not found, skipping")
+    return reuse
+
+def regeneration_temperature(attempt: int) -> float:
+    """Sample more freely on each regeneration so the retry is not the cached bad answer."""
+    return min(1.0, 0.3 + 0.3 * attempt)
+
+def repair_invalid_cases(ko_text: str, en_text: str, generated: Dict[str, str], executor: LLMExecutor,
+                         validator: Optional[CaseValidator] = None) -> Dict[str, str]:
+    """Regenerate only the cases that fail validation, up to validator.max_regenerations times each."""
+    if validator is None:
+        return generated
+
+    generated = dict(generated)
+    for case_name in validator.invalid_cases(ko_text, en_text, generated):
+        for attempt in range(1, validator.max_regenerations + 1):
+            text = generate_code_switched_text(ko_text, en_text, case_name, executor,
+                                               temperature=regeneration_temperature(attempt),
+                                               tag=f"{case_name}-regen")
+            if validate_case(case_name, text, ko_text, en_text):
+                generated[case_name] = text
+                validator.record_repair()
+                break
+            # Keep the first non-empty answer if nothing passes
+            generated[case_name] = generated.get(case_name) or text
+
+    return generated
+
+async def arepair_invalid_cases(ko_text: str, en_text: str, generated: Dict[str, str], executor: LLMExecutor,
+                                validator: Optional[CaseValidator] = None) -> Dict[str, str]:
+    """Async version of repair_invalid_cases; failing cases are regenerated concurrently."""
+    if validator is None:
+        return generated
+
+    async def repair(case_name):
+        text = generated.get(case_name, "")
+        for attempt in range(1, validator.max_regenerations + 1):
+            candidate = await agenerate_code_switched_text(ko_text, en_text, case_name, executor,
+                                                           temperature=regeneration_temperature(attempt),
+                                                           tag=f"{case_name}-regen")
+            if validate_case(case_name, candidate, ko_text, en_text):
+                validator.record_repair()
+                return candidate
+            text = text or candidate
+        return text
+
+    invalid = validator.invalid_cases(ko_text, en_text, generated)
+    repaired = await asyncio.gather(*[repair(case_name) for case_name in invalid])
+    return {**generated, **dict(zip(invalid, repaired))}
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -173,18 +623,11 @@ def parse_arguments():
         help="OpenAI model to use for generation"
     )
 
-    parser.add_argument(
-        "--delay",
-        type=float,
-        default=0.1,
-        help="Delay between API calls in seconds (to avoid rate limiting)"
-    )
-
     parser.add_argument(
         "--save-interval",
         type=int,
         default=10,
-        help="Save intermediate results every N items"
+        help="Flush the checkpoint log every N results"
     )
 
     parser.add_argument(
@@ -194,8 +637,69 @@ def parse_arguments():
         help="Number of threads for parallel processing"
     )
 
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Use the asyncio engine instead of threads (ignores --threads)"
+    )
+
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=200,
+        help="Maximum concurrent API requests in --async mode"
+    )
+
+    parser.add_argument(
+        "--single-call",
+        action="store_true",
+        help="Request Case2, Case3 and Case4 as one JSON object per item, falling back per case"
+    )
+
+    parser.add_argument(
+        "--items-per-request",
+        type=int,
+        default=1,
+        help="Pack K (ko, en) pairs into one id-tagged request; missing or malformed items are retried individually"
+    )
+
+    parser.add_argument(
+        "--max-regenerations",
+        type=int,
+        default=2,
+        help="Regenerate a case that fails the script-ratio/structure check up to N times on its own"
+    )
+
+    parser.add_argument(
+        "--no-validate",
+        action="store_true",
+        help="Keep every generated case without validating it"
+    )
+
+    add_checkpoint_arguments(parser)
+    add_queue_arguments(parser)
+    add_batch_arguments(parser)
+    add_dedup_arguments(parser)
+    add_reuse_arguments(parser, DEFAULT_REUSE_SOURCE)
+    add_executor_arguments(parser)
+
     return parser.parse_args()
 
+def group_inputs(data: List[Dict[str, str]], args) -> Tuple[Dict[int, List[int]], Set[int]]:
+    """Group near-identical pairs unless --no-dedup; returns the groups and the ids that need no request."""
+    if args.no_dedup:
+        return {idx: [idx] for idx in range(len(data))}, set()
+
+    groups = group_duplicates(data)
+    duplicate_ids = {idx for rep, members in groups.items() for idx in members if idx != rep}
+    if args.items_per_request > 1:
+        calls_saved = batched_calls_saved(len(data), len(groups), args.items_per_request)
+    else:
+        calls_saved = len(duplicate_ids) * (1 if args.single_call else len(GENERATED_CASES))
+    print(dedup_summary(len(data), len(groups), calls_saved))
+    return groups, duplicate_ids
+
 def main():
     """Main function to orchestrate the code-switching data generation."""
 
@@ -207,40 +711,137 @@ def main():
     output_file = args.output
     model = args.model
 
+    # Check if input file exists
+    if not os.path.exists(input_file):
+        print(f"Error: Input file '{input_file}' does not exist.")
+        return
+
+    # Offline batch-job modes never call the API
+    if args.export_batch or args.import_batch:
+        data = load_mkqa_data(input_file)
+        groups, duplicate_ids = group_inputs(data, args)
+
+    if args.export_batch:
+        count = export_batch_requests(data, args.export_batch, model=model, single_call=args.single_call,
+                                      items_per_request=args.items_per_request, skip_ids=duplicate_ids)
+        print(f"Wrote {count} batch requests for {len(data)} items to {args.export_batch}")
+        return
+
+    if args.import_batch:
+        results, missing = import_batch_results(data, args.import_batch, skip_ids=duplicate_ids)
+        print(f"Imported batch results for {len(results)} items ({missing} cases missing or failed)")
+        invalid = sum(1 for result in results for case_name in GENERATED_CASES
+                      if result['code_switched_versions'][case_name]
+                      and not validate_case(case_name, result['code_switched_versions'][case_name],
+                                            result['original_ko'], result['original_en']))
+        print(f"{invalid} imported cases fail validation")
+        save_results(fan_out_results(results, groups, data), output_file)
+        return
+
+    if args.queue and args.use_async:
+        print("Error: --queue runs on the thread engine; drop --async.")
+        return
+
     # Check if API key is set
     if not os.getenv("OPENAI_API_KEY"):
         print("Error: OPENAI_API_KEY environment variable is not set.")
         print("Please set it using: export OPENAI_API_KEY='your-api-key'")
         return
 
-    # Check if input file exists
-    if not os.path.exists(input_file):
-        print(f"Error: Input file '{input_file}' does not exist.")
-        return
-
     print(f"Configuration:")
     print(f"  Input file: {input_file}")
     print(f"  Output file: {output_file}")
     print(f"  Model: {model}")
-    print(f"  API delay: {args.delay}s")
-    print(f"  Save interval: every {args.save_interval} items")
-    print(f"  Threads: {args.threads}")
+    print(f"  Rate limit: {args.rpm or 'auto'} RPM / {args.tpm or 'auto'} TPM")
+    print(f"  Requests per item: {'1 (single-call)' if args.single_call else '3'}")
+    print(f"  Items per request: {args.items_per_request}")
+    checkpoint_file = args.checkpoint or checkpoint_path_for(resolve_output_path(output_file))
+    if args.queue:
+        print(f"  Work queue: {args.queue} (lease {args.lease_seconds:.0f}s)")
+    else:
+        print(f"  Checkpoint: {checkpoint_file} (flush every {args.save_interval} items)")
+    if args.use_async:
+        print(f"  Engine: asyncio (max in-flight requests: {args.max_in_flight})")
+    else:
+        print(f"  Threads: {args.threads}")
+    print(f"  Cache: {'disabled' if args.no_cache else args.cache_db}")
+    print(f"  Timeouts: connect {args.connect_timeout:.0f}s / read {args.read_timeout:.0f}s / "
+          f"request {args.request_timeout:.0f}s{' (HTTP/2)' if args.http2 else ''}")
+    if args.metrics_file:
+        print(f"  Metrics: {args.metrics_file} (every {args.metrics_interval:.0f}s)")
+    print(f"  Validation: {'disabled' if args.no_validate else f'up to {args.max_regenerations} regenerations per case'}")
+    if args.reuse:
+        print(f"  Reuse: near duplicates >= {args.reuse_threshold:.2f} similarity"
+              f"{' (entity swap)' if args.entity_swap else ''}")
     print()
 
+    # Threads or in-flight requests share one keep-alive pool, cache, rate limiter and telemetry
+    executor = executor_from_args(args, "code-switching",
+                                  concurrency=args.max_in_flight if args.use_async else args.threads,
+                                  model=model)
+    validator = None if args.no_validate else CaseValidator(args.max_regenerations)
+    reuse = reuse_from_args(args)
+
     print("Loading MKQA data...")
     data = load_mkqa_data(input_file)
     print(f"Loaded {len(data)} question pairs")
 
+    # Only the first of each group of near-identical pairs is sent to GPT
+    groups, duplicate_ids = group_inputs(data, args)
 
-    # Modify process_mkqa_data to accept additional parameters
-    results = process_mkqa_data_with_config(
-        data,
-        model=model,
-        delay=args.delay,
-        save_interval=args.save_interval,
-        output_dir=os.path.dirname(output_file) or '.',
-        num_threads=args.threads
-    )
+    # Items already in the checkpoint log are skipped on --resume; a work queue keeps its own progress
+    done_ids = set()
+    if args.resume and executor.queue is None:
+        done_ids = {idx for idx in load_checkpoint(checkpoint_file) if idx < len(data)}
+        print(f"Resuming: {len(done_ids)} items already in {checkpoint_file}")
+
+    checkpoint = None
+    if executor.queue is None:
+        checkpoint = CheckpointWriter(checkpoint_file, flush_interval=args.save_interval, append=args.resume)
+    try:
+        if args.use_async:
+            new_count = asyncio.run(process_mkqa_data_async(
+                data,
+                executor,
+                single_call=args.single_call,
+                items_per_request=args.items_per_request,
+                checkpoint=checkpoint,
+                skip_ids=done_ids | duplicate_ids,
+                validator=validator,
+                reuse=reuse
+            ))
+        else:
+            # Modify process_mkqa_data to accept additional parameters
+            new_count = process_mkqa_data_with_config(
+                data,
+                executor,
+                single_call=args.single_call,
+                items_per_request=args.items_per_request,
+                checkpoint=checkpoint,
+                skip_ids=done_ids | duplicate_ids,
+                validator=validator,
+                reuse=reuse
+            )
+        # Every worker attached to the queue waits for the others, so all of them see the finished job
+        records = executor.queue.records() if executor.queue is not None else None
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        executor.close()
+    print(f"Generated {new_count} new items")
+
+    # Compact the append-only log into the ordered final output
+    if records is None:
+        records = compact_checkpoint(checkpoint_file)
+    results = [record for record in records if record['id'] < len(data) and record['id'] not in duplicate_ids]
+    results = fan_out_results(results, groups, data)
+
+    for line in executor.summaries():
+        print(line)
+    if validator is not None:
+        print(validator.summary())
+    if reuse is not None:
+        print(reuse.summary())
 
     print("\nSaving results...")
     save_results(results, output_file)
@@ -259,93 +860,258 @@ def main():
             for case_name, text in sample['code_switched_versions'].items():
                 print(f"    [{case_name}]: {text}")
 
-def process_single_item(item_data: tuple, model: str, delay: float) -> Dict:
+def process_single_item(item_data: tuple, executor: LLMExecutor,
+                        single_call: bool = False,
+                        validator: Optional[CaseValidator] = None,
+                        reuse: Optional[CaseReuse] = None) -> Dict:
     """Process a single item for code-switching generation."""
     idx, item = item_data
     ko_text = item['ko']
     en_text = item['en']
 
-    result = {
+    # A near duplicate answered earlier either fills the cases outright or joins the few-shot examples
+    example = None
+    if reuse is not None:
+        swapped, example = reuse.lookup(ko_text, en_text)
+        if swapped is not None:
+            return build_result(idx, ko_text, en_text, swapped)
+
+    if single_call:
+        # All GPT cases come back from one structured request
+        generated = generate_all_cases(ko_text, en_text, executor, example)
+    else:
+        generated = {
+            case_name: generate_code_switched_text(ko_text, en_text, case_name, executor, example=example)
+            for case_name in GENERATED_CASES
+        }
+
+    # Cases that fail validation are regenerated on their own
+    generated = repair_invalid_cases(ko_text, en_text, generated, executor, validator)
+    if reuse is not None:
+        reuse.add(ko_text, en_text, generated)
+
+    # Case1 is pure Korean and Case5 pure English
+    return build_result(idx, ko_text, en_text, generated)
+
+def build_result(idx: int, ko_text: str, en_text: str, generated: Dict[str, str]) -> Dict:
+    """Assemble the output record for one item from its generated cases."""
+    versions = {"Case1": ko_text}
+    versions.update((case_name, generated[case_name]) for case_name in GENERATED_CASES)
+    versions["Case5"] = en_text
+
+    return {
         "id": idx,
         "original_ko": ko_text,
         "original_en": en_text,
-        "code_switched_versions": {}
+        "code_switched_versions": versions
     }
 
-    # Define code-switching cases
-    code_switching_cases = ["Case1", "Case2", "Case3", "Case4", "Case5"]
-
-    # Generate code-switched versions for each case
-    for case_name in code_switching_cases:
-        if case_name == "Case1":
-            # Pure Korean
-            result["code_switched_versions"][case_name] = ko_text
-        elif case_name == "Case5":
-            # Pure English
-            result["code_switched_versions"][case_name] = en_text
+def swap_batch_items(batch: List[tuple], reuse: Optional[CaseReuse]) -> Tuple[Dict[int, Dict[str, str]], List[tuple]]:
+    """Fill the items of a batch that an entity swap covers; returns their cases and the items still to request."""
+    swapped = {}
+    if reuse is not None and reuse.entity_swap:
+        for idx, item in batch:
+            cases, _ = reuse.lookup(item['ko'], item['en'])
+            if cases is not None:
+                swapped[idx] = cases
+    return swapped, [(idx, item) for idx, item in batch if idx not in swapped]
+
+def process_item_batch(batch: List[tuple], executor: LLMExecutor,
+                       single_call: bool = False,
+                       validator: Optional[CaseValidator] = None,
+                       reuse: Optional[CaseReuse] = None) -> Tuple[List[Dict], int]:
+    """Process several items in one request; items missing from the response are re-queued individually.
+
+    Returns the results and the number of re-queued items.
+    """
+    swapped, pending = swap_batch_items(batch, reuse)
+    complete = {}
+    if pending:
+        try:
+            content = executor.complete(
+                build_multi_item_messages(pending),
+                temperature=0.3,
+                max_tokens=150 * len(pending) + 100,
+                response_format={"type": "json_object"},
+                tag="items"
+            )
+            complete = parse_multi_item_response(content, [idx for idx, _ in pending])
+        except Exception as e:
+            print(f"Error generating code-switched batch: {e}")
+
+    results = []
+    for idx, item in batch:
+        if idx in swapped:
+            results.append(build_result(idx, item['ko'], item['en'], swapped[idx]))
+        elif idx in complete:
+            generated = repair_invalid_cases(item['ko'], item['en'], complete[idx], executor, validator)
+            if reuse is not None:
+                reuse.add(item['ko'], item['en'], generated)
+            results.append(build_result(idx, item['ko'], item['en'], generated))
         else:
-            # Generate code-switched version
-            code_switched = generate_code_switched_text(ko_text, en_text, case_name, model=model)
-            result["code_switched_versions"][case_name] = code_switched
+            results.append(process_single_item((idx, item), executor, single_call, validator, reuse))
+
+    return results, len(pending) - len(complete)
+
+def iter_work_units(data: List[Dict[str, str]], items_per_request: int = 1,
+                    skip_ids: Optional[Set[int]] = None) -> Iterator[List[tuple]]:
+    """Lazily group the (idx, item) pairs still to process into one unit of work per request."""
+    skip_ids = skip_ids or set()
+    unit = []
+    for idx, item in enumerate(data):
+        if idx in skip_ids:
+            continue
+        unit.append((idx, item))
+        if len(unit) == items_per_request:
+            yield unit
+            unit = []
+    if unit:
+        yield unit
 
-            # Add delay to avoid rate limiting
-            time.sleep(delay)
+def process_mkqa_data_with_config(data: List[Dict[str, str]],
+                                  executor: LLMExecutor,
+                                  single_call: bool = False,
+                                  items_per_request: int = 1,
+                                  checkpoint: Optional[CheckpointWriter] = None,
+                                  skip_ids: Optional[Set[int]] = None,
+                                  validator: Optional[CaseValidator] = None,
+                                  reuse: Optional[CaseReuse] = None) -> int:
+    """Process MKQA data with custom configuration using multithreading.
+
+    Results are written to the checkpoint in input order; returns how many were generated.
+    """
+    skip_ids = skip_ids or set()
+    total = sum(1 for idx in range(len(data)) if idx not in skip_ids)
+    stats = {"requeued": 0}
+    stats_lock = threading.Lock()
+
+    # Function to process a unit of work
+    def process_unit(unit):
+        if items_per_request == 1:
+            return [process_single_item(unit[0], executor, single_call, validator, reuse)]
+        unit_results, requeued = process_item_batch(unit, executor, single_call, validator, reuse)
+        with stats_lock:
+            stats["requeued"] += requeued
+        return unit_results
+
+    # Units are read lazily into a bounded window and released in order
+    generated = executor.run(process_unit, iter_work_units(data, items_per_request, skip_ids), checkpoint,
+                             total=total, desc="Generating code-switched data", unit_size=len)
+
+    if items_per_request > 1:
+        print(f"Re-queued {stats['requeued']} of {total} items individually after batched requests")
+
+    return generated
+
+async def process_single_item_async(item_data: tuple, executor: LLMExecutor,
+                                    single_call: bool = False,
+                                    validator: Optional[CaseValidator] = None,
+                                    reuse: Optional[CaseReuse] = None) -> Dict:
+    """Process a single item, issuing the three GPT cases concurrently."""
+    idx, item = item_data
+    ko_text = item['ko']
+    en_text = item['en']
 
-    return result
+    example = None
+    if reuse is not None:
+        swapped, example = reuse.lookup(ko_text, en_text)
+        if swapped is not None:
+            return build_result(idx, ko_text, en_text, swapped)
 
-def process_mkqa_data_with_config(data: List[Dict[str, str]],
-                                  model: str = "gpt-4o-mini",
-                                  delay: float = 0.1,
-                                  save_interval: int = 10,
-                                  output_dir: str = '.',
-                                  num_threads: int = 5) -> List[Dict]:
-    """Process MKQA data with custom configuration using multithreading."""
-
- 
-    # Prepare data with indices
-    indexed_data = list(enumerate(data))
-
-    # Results dictionary to maintain order
-    results_dict = {}
-    results_lock = threading.Lock()
-
-    # Progress bar
-    pbar = tqdm(total=len(data), desc="Generating code-switched data")
-
-    # Function to process item and update progress
-    def process_with_progress(item_data):
-        result = process_single_item(item_data, model, delay)
-
-        with results_lock:
-            results_dict[result['id']] = result
-            pbar.update(1)
-
-            # Save intermediate results at specified interval
-            if len(results_dict) % save_interval == 0:
-                sorted_results = [results_dict[i] for i in sorted(results_dict.keys())]
-                intermediate_file = os.path.join(output_dir, "code_switched_data_intermediate.json")
-                save_results(sorted_results, intermediate_file)
-
-        return result
-
-    # Process items in parallel using ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        # Submit all tasks
-        futures = [executor.submit(process_with_progress, item) for item in indexed_data]
-
-        # Wait for all tasks to complete
-        for future in as_completed(futures):
-            try:
-                future.result()
-            except Exception as e:
-                print(f"Error processing item: {e}")
-
-    pbar.close()
-
-    # Sort results by ID to maintain order
-    results = [results_dict[i] for i in sorted(results_dict.keys())]
-
-    return results
+    if single_call:
+        generated = await agenerate_all_cases(ko_text, en_text, executor, example)
+    else:
+        texts = await asyncio.gather(*[
+            agenerate_code_switched_text(ko_text, en_text, case_name, executor, example=example)
+            for case_name in GENERATED_CASES
+        ])
+        generated = dict(zip(GENERATED_CASES, texts))
+
+    generated = await arepair_invalid_cases(ko_text, en_text, generated, executor, validator)
+    if reuse is not None:
+        reuse.add(ko_text, en_text, generated)
+    return build_result(idx, ko_text, en_text, generated)
+
+async def process_item_batch_async(batch: List[tuple], executor: LLMExecutor,
+                                   single_call: bool = False,
+                                   validator: Optional[CaseValidator] = None,
+                                   reuse: Optional[CaseReuse] = None) -> Tuple[List[Dict], int]:
+    """Async version of process_item_batch."""
+    swapped, pending = swap_batch_items(batch, reuse)
+    complete = {}
+    if pending:
+        try:
+            content = await executor.acomplete(
+                build_multi_item_messages(pending),
+                temperature=0.3,
+                max_tokens=150 * len(pending) + 100,
+                response_format={"type": "json_object"},
+                tag="items"
+            )
+            complete = parse_multi_item_response(content, [idx for idx, _ in pending])
+        except Exception as e:
+            print(f"Error generating code-switched batch: {e}")
+
+    requeued = [(idx, item) for idx, item in pending if idx not in complete]
+    retried = await asyncio.gather(*[
+        process_single_item_async(item_data, executor, single_call, validator, reuse) for item_data in requeued
+    ])
+    retried_by_id = {result['id']: result for result in retried}
+
+    repaired = await asyncio.gather(*[
+        arepair_invalid_cases(item['ko'], item['en'], complete[idx], executor, validator)
+        for idx, item in pending if idx in complete
+    ])
+    repaired_by_id = dict(zip([idx for idx, _ in pending if idx in complete], repaired))
+    if reuse is not None:
+        for idx, item in pending:
+            if idx in repaired_by_id:
+                reuse.add(item['ko'], item['en'], repaired_by_id[idx])
+
+    results = []
+    for idx, item in batch:
+        if idx in swapped:
+            results.append(build_result(idx, item['ko'], item['en'], swapped[idx]))
+        elif idx in complete:
+            results.append(build_result(idx, item['ko'], item['en'], repaired_by_id[idx]))
+        else:
+            results.append(retried_by_id[idx])
+    return results, len(requeued)
+
+async def process_mkqa_data_async(data: List[Dict[str, str]],
+                                  executor: LLMExecutor,
+                                  single_call: bool = False,
+                                  items_per_request: int = 1,
+                                  checkpoint: Optional[CheckpointWriter] = None,
+                                  skip_ids: Optional[Set[int]] = None,
+                                  validator: Optional[CaseValidator] = None,
+                                  reuse: Optional[CaseReuse] = None) -> int:
+    """Process MKQA data on a single event loop with at most executor.concurrency requests in flight.
+
+    Results are written to the checkpoint in input order; returns how many were generated.
+    """
+    skip_ids = skip_ids or set()
+    total = sum(1 for idx in range(len(data)) if idx not in skip_ids)
+    stats = {"requeued": 0}
+
+    async def process_unit(unit):
+        if items_per_request == 1:
+            return [await process_single_item_async(unit[0], executor, single_call, validator, reuse)]
+        unit_results, requeued = await process_item_batch_async(unit, executor, single_call, validator, reuse)
+        stats["requeued"] += requeued
+        return unit_results
+
+    try:
+        generated = await executor.arun(process_unit, iter_work_units(data, items_per_request, skip_ids),
+                                        checkpoint, total=total, desc="Generating code-switched data (async)",
+                                        unit_size=len)
+    finally:
+        await executor.aclose()
+
+    if items_per_request > 1:
+        print(f"Re-queued {stats['requeued']} of {total} items individually after batched requests")
+
+    return generated
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
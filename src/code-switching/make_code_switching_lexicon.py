@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline code-switcher: learn a ko<->en phrase lexicon from existing code-switched data and swap keywords locally.
+Cases the lexicon cannot produce are generated with GPT.
+"""
+
+import json
+import os
+import re
+import sys
+import time
+import argparse
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm.executor import LLMExecutor, add_executor_arguments, executor_from_args
+from make_code_switching_gpt import (GENERATED_CASES, CaseValidator, build_result, generate_all_cases,
+                                     generate_code_switched_text, load_mkqa_data, repair_invalid_cases,
+                                     save_results, script_counts, validate_case)
+
+DEFAULT_LEXICON_SOURCE = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..",
+                                                       "data", "outputs", "code_switched_data_fin.json"))
+
+# Longest phrase, in words, taken from or matched against either side
+MAX_PHRASE_WORDS = 3
+
+# Characters stripped from word edges before alignment and restored afterwards
+EDGE_PUNCTUATION = "?!.,;:\"'“”‘’()[]"
+
+# Korean particles that stay attached after a keyword is switched, longest first
+PARTICLES = sorted([
+    "은", "는", "이", "가", "을", "를", "의", "에", "에서", "에게", "으로", "로", "와", "과", "도", "만",
+    "까지", "부터", "이랑", "랑", "처럼", "보다", "이나", "나", "라는", "이라는", "인가요", "인가", "이다",
+], key=len, reverse=True)
+
+# The same particle after a consonant / a vowel
+PARTICLE_ALLOMORPHS = {
+    "은": "는", "는": "은", "이": "가", "가": "이", "을": "를", "를": "을",
+    "과": "와", "와": "과", "으로": "로", "로": "으로", "이라는": "라는", "라는": "이라는",
+}
+
+# Vowel-final form -> consonant-final form
+CONSONANT_FORMS = {"는": "은", "가": "이", "를": "을", "와": "과", "로": "으로", "라는": "이라는"}
+
+# English endings read with a final consonant (batchim) in Korean: "name" -> 네임, "song" -> 송
+BATCHIM_ENDINGS = ("m", "n", "ng", "l", "le", "me", "ne", "ck", "p", "b")
+
+# English phrases made only of these words carry no keyword worth switching
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "to", "for", "by", "with", "from", "and", "or", "is", "are",
+    "was", "were", "be", "do", "does", "did", "what", "who", "whom", "where", "when", "how", "which", "why",
+    "i", "it", "its", "that", "this", "there", "s",
+}
+
+def split_edges(word: str) -> Tuple[str, str, str]:
+    """Split a word into leading punctuation, core and trailing punctuation."""
+    core = word.strip(EDGE_PUNCTUATION)
+    if not core:
+        return word, "", ""
+    start = word.index(core)
+    return word[:start], core, word[start + len(core):]
+
+def normalize(word: str) -> str:
+    """Core of a word used for matching: punctuation stripped, lowercased."""
+    return split_edges(word)[1].lower()
+
+def is_hangul_word(word: str) -> bool:
+    hangul, latin = script_counts(word)
+    return hangul > 0 and latin == 0
+
+def is_latin_word(word: str) -> bool:
+    hangul, latin = script_counts(word)
+    return latin > 0 and hangul == 0
+
+def split_particle(word: str) -> Tuple[str, str]:
+    """Split a Korean word into stem and trailing particle; the particle is '' if none is found."""
+    for particle in PARTICLES:
+        if word.endswith(particle) and len(word) > len(particle):
+            return word[:-len(particle)], particle
+    return word, ""
+
+def strip_matching_particle(word: str, particle: str) -> Optional[str]:
+    """Remove `particle` (or its allomorph) from the end of a Korean word."""
+    for candidate in (particle, PARTICLE_ALLOMORPHS.get(particle)):
+        if candidate and word.endswith(candidate) and len(word) > len(candidate):
+            return word[:-len(candidate)]
+    return None
+
+def attach_particle(word: str, particle: str) -> str:
+    """Attach a Korean particle to an English word, choosing the allomorph that fits how the word is read."""
+    if particle not in PARTICLE_ALLOMORPHS:
+        return word + particle
+    consonant_form = CONSONANT_FORMS.get(particle, particle)
+    ending = word.lower()
+    if not ending.endswith(BATCHIM_ENDINGS):
+        return word + PARTICLE_ALLOMORPHS[consonant_form]
+    if consonant_form == "으로" and ending.endswith(("l", "le")):
+        # A final ㄹ takes 로
+        return word + "로"
+    return word + consonant_form
+
+def korean_phrase_at(ko_words: List[str], ko_phrase: str) -> bool:
+    """True if the phrase occurs as whole words, the last optionally followed by a particle."""
+    phrase = ko_phrase.split()
+    for i in range(len(ko_words) - len(phrase) + 1):
+        window = ko_words[i:i + len(phrase)]
+        if window[:-1] != phrase[:-1]:
+            continue
+        last = window[-1]
+        if last == phrase[-1] or (last.startswith(phrase[-1]) and last[len(phrase[-1]):] in PARTICLES):
+            return True
+    return False
+
+def contains_phrase(words: List[str], phrase: List[str]) -> bool:
+    """True if `phrase` occurs as consecutive words in `words`."""
+    n = len(phrase)
+    return any(words[i:i + n] == phrase for i in range(len(words) - n + 1))
+
+def is_keyword(en_phrase: str) -> bool:
+    return any(word not in STOPWORDS for word in en_phrase.split())
+
+def replaced_spans(source: List[str], target: List[str]) -> Iterable[Tuple[int, int, int, int]]:
+    """Word spans of `source` that `target` replaced, as (i1, i2, j1, j2)."""
+    matcher = SequenceMatcher(None, source, target, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "replace" and i2 - i1 <= MAX_PHRASE_WORDS and j2 - j1 <= MAX_PHRASE_WORDS:
+            yield i1, i2, j1, j2
+
+def align_case2(ko_text: str, en_text: str, case2: str) -> List[Tuple[str, str]]:
+    """(ko, en) phrase pairs from a Korean sentence whose keywords were switched to English."""
+    ko_words = [normalize(word) for word in ko_text.split()]
+    case_words = [normalize(word) for word in case2.split()]
+    en_words = [normalize(word) for word in en_text.split()]
+
+    pairs = []
+    for i1, i2, j1, j2 in replaced_spans(ko_words, case_words):
+        ko_span, case_span = ko_words[i1:i2], case_words[j1:j2]
+        if not all(is_hangul_word(word) for word in ko_span):
+            continue
+
+        # The last switched word may keep its Korean particle: "logo는"
+        match = re.fullmatch(r"(.*?[a-z0-9])([가-힣]*)", case_span[-1])
+        if not match or not all(is_latin_word(word) for word in case_span[:-1] + [match.group(1)]):
+            continue
+        en_phrase = case_span[:-1] + [match.group(1)]
+
+        ko_last = ko_span[-1]
+        if match.group(2):
+            ko_last = strip_matching_particle(ko_last, match.group(2))
+            if ko_last is None:
+                continue
+
+        # Keep only English that really is in the source sentence
+        if contains_phrase(en_words, en_phrase):
+            pairs.append((" ".join(ko_span[:-1] + [ko_last]), " ".join(en_phrase)))
+    return pairs
+
+def align_case4(ko_text: str, en_text: str, case4: str) -> List[Tuple[str, str]]:
+    """(ko, en) phrase pairs from an English sentence whose keywords were switched to Korean."""
+    en_words = [normalize(word) for word in en_text.split()]
+    case_words = [normalize(word) for word in case4.split()]
+
+    pairs = []
+    for i1, i2, j1, j2 in replaced_spans(en_words, case_words):
+        en_span, case_span = en_words[i1:i2], case_words[j1:j2]
+        if not all(is_latin_word(word) for word in en_span) or not all(is_hangul_word(word) for word in case_span):
+            continue
+
+        # Keep only Korean that really is in the source sentence
+        ko_phrase = " ".join(case_span)
+        if korean_phrase_at([normalize(word) for word in ko_text.split()], ko_phrase):
+            pairs.append((ko_phrase, " ".join(en_span)))
+    return pairs
+
+class PhraseLexicon:
+    """Counts of aligned (ko, en) phrase pairs, indexed from both sides."""
+
+    def __init__(self, min_count: int = 1):
+        self.min_count = min_count
+        self.counts: Counter = Counter()
+        self.by_ko: Dict[str, List[Tuple[str, int]]] = {}
+        self.by_en: Dict[str, List[Tuple[str, int]]] = {}
+
+    def add(self, ko_phrase: str, en_phrase: str):
+        if ko_phrase and en_phrase and is_keyword(en_phrase):
+            self.counts[(ko_phrase, en_phrase)] += 1
+
+    def finalize(self):
+        """Build the lookup indexes, most frequent translation first."""
+        by_ko, by_en = defaultdict(list), defaultdict(list)
+        for (ko_phrase, en_phrase), count in self.counts.most_common():
+            if count >= self.min_count:
+                by_ko[ko_phrase].append((en_phrase, count))
+                by_en[en_phrase].append((ko_phrase, count))
+        self.by_ko, self.by_en = dict(by_ko), dict(by_en)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.by_ko.values())
+
+    def save(self, path: str):
+        entries = [{"ko": ko_phrase, "en": en_phrase, "count": count}
+                   for ko_phrase, translations in sorted(self.by_ko.items())
+                   for en_phrase, count in translations]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+
+def build_lexicon(records: List[Dict], min_count: int = 1) -> PhraseLexicon:
+    """Align the Case2 and Case4 versions of existing code-switched records into a phrase lexicon."""
+    lexicon = PhraseLexicon(min_count)
+    for record in records:
+        ko_text, en_text = record["original_ko"], record["original_en"]
+        versions = record.get("code_switched_versions", {})
+        if versions.get("Case2"):
+            for ko_phrase, en_phrase in align_case2(ko_text, en_text, versions["Case2"]):
+                lexicon.add(ko_phrase, en_phrase)
+        if versions.get("Case4"):
+            for ko_phrase, en_phrase in align_case4(ko_text, en_text, versions["Case4"]):
+                lexicon.add(ko_phrase, en_phrase)
+    lexicon.finalize()
+    return lexicon
+
+def pick_spans(candidates: List[Tuple[int, int, str, int]], limit: Optional[int]) -> List[Tuple[int, int, str, int]]:
+    """Choose non-overlapping (start, end, replacement, count) spans, longest and then most frequent first."""
+    chosen = []
+    taken: Set[int] = set()
+    # Longest first keeps compounds together: "세계 대전" -> "world war", not "world 대전"
+    for candidate in sorted(candidates, key=lambda c: (c[0] - c[1], -c[3], c[0])):
+        start, end = candidate[0], candidate[1]
+        if taken.isdisjoint(range(start, end)):
+            chosen.append(candidate)
+            taken.update(range(start, end))
+        if limit and len(chosen) == limit:
+            break
+    return sorted(chosen)
+
+def replace_spans(words: List[str], spans: List[Tuple[int, int, str, int]], keep_particle: bool) -> str:
+    """Replace word spans, keeping the outer punctuation and (optionally) the Korean particle of each span."""
+    output = list(words)
+    for start, end, replacement, _ in reversed(spans):
+        lead = split_edges(words[start])[0]
+        _, last_core, trail = split_edges(words[end - 1])
+        if keep_particle:
+            replacement = attach_particle(replacement, split_particle(last_core)[1])
+        output[start:end] = [f"{lead}{replacement}{trail}"]
+    return " ".join(output)
+
+def capitalize(text: str) -> str:
+    return text[:1].upper() + text[1:]
+
+def case2_candidates(lexicon: PhraseLexicon, ko_words: List[str], en_words: List[str]) -> List[Tuple[int, int, str, int]]:
+    """Korean spans whose English translation occurs in the English sentence."""
+    candidates = []
+    for start in range(len(ko_words)):
+        for end in range(start + 1, min(start + MAX_PHRASE_WORDS, len(ko_words)) + 1):
+            span = [normalize(word) for word in ko_words[start:end]]
+            stem = split_particle(span[-1])[0]
+            for ko_phrase in {" ".join(span[:-1] + [stem]), " ".join(span)}:
+                for en_phrase, count in lexicon.by_ko.get(ko_phrase, []):
+                    if contains_phrase(en_words, en_phrase.split()):
+                        candidates.append((start, end, en_phrase, count))
+                        break
+    return candidates
+
+def case4_candidates(lexicon: PhraseLexicon, ko_words: List[str], en_words: List[str]) -> List[Tuple[int, int, str, int]]:
+    """English spans whose Korean translation occurs in the Korean sentence."""
+    candidates = []
+    for start in range(len(en_words)):
+        for end in range(start + 1, min(start + MAX_PHRASE_WORDS, len(en_words)) + 1):
+            en_phrase = " ".join(normalize(word) for word in en_words[start:end])
+            for ko_phrase, count in lexicon.by_en.get(en_phrase, []):
+                if korean_phrase_at(ko_words, ko_phrase):
+                    candidates.append((start, end, ko_phrase, count))
+                    break
+    return candidates
+
+def switch_pair(lexicon: PhraseLexicon, ko_text: str, en_text: str) -> Dict[str, str]:
+    """Generate the cases the lexicon covers for one pair; cases that fail validation are left out."""
+    ko_words, en_words = ko_text.split(), en_text.split()
+    en_norm = [normalize(word) for word in en_words]
+
+    generated = {}
+    ko_spans = case2_candidates(lexicon, ko_words, en_norm)
+    if ko_spans:
+        # Korean sentence with 1-2 English keywords
+        generated["Case2"] = replace_spans(ko_words, pick_spans(ko_spans, 2), keep_particle=True)
+
+    en_spans = case4_candidates(lexicon, [normalize(word) for word in ko_words], en_words)
+    if en_spans:
+        # English sentence with one Korean key term
+        generated["Case4"] = capitalize(replace_spans(en_words, pick_spans(en_spans, 1), keep_particle=False))
+        # English frame around every Korean phrase the lexicon knows
+        all_spans = pick_spans(en_spans, None)
+        if len(all_spans) > 1:
+            generated["Case3"] = capitalize(replace_spans(en_words, all_spans, keep_particle=False))
+
+    return {case_name: text for case_name, text in generated.items()
+            if validate_case(case_name, text, ko_text, en_text)}
+
+def fill_with_gpt(pending: List[Tuple[int, Dict[str, str], Dict[str, str]]], executor: LLMExecutor,
+                  validator: Optional[CaseValidator] = None) -> Dict[int, Dict[str, str]]:
+    """Generate only the cases the lexicon could not produce, keyed by item id.
+
+    An item with no lexicon coverage gets all cases in one structured request; a partially covered item keeps
+    its lexicon cases and asks for each missing case on its own.
+    """
+    def generate(unit):
+        idx, item, generated = unit
+        if not generated:
+            generated = generate_all_cases(item['ko'], item['en'], executor)
+        else:
+            generated = dict(generated)
+            for case_name in GENERATED_CASES:
+                if case_name not in generated:
+                    generated[case_name] = generate_code_switched_text(item['ko'], item['en'], case_name, executor)
+        # Lexicon cases already passed validation, so only GPT answers can be regenerated
+        return repair_invalid_cases(item['ko'], item['en'], generated, executor, validator)
+
+    filled = {}
+    for (idx, _, _), future in tqdm(executor.map(generate, pending), total=len(pending),
+                                    desc="Generating uncovered cases"):
+        try:
+            filled[idx] = future.result()
+        except Exception as e:
+            print(f"Error processing item {idx}: {e}")
+    return filled
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Generate code-switched data with a phrase lexicon learned from existing output, "
+                    "falling back to GPT for uncovered cases",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--input", type=str, default="../jsons/mkqa_refined_full.json",
+                        help="Path to input MKQA JSON file")
+    parser.add_argument("--output", type=str, default="code_switched_data_lexicon.json",
+                        help="Path to output JSON file")
+    parser.add_argument("--lexicon-source", type=str, default=DEFAULT_LEXICON_SOURCE,
+                        help="Existing code-switched output whose Case2/Case4 versions are aligned into the lexicon")
+    parser.add_argument("--min-count", type=int, default=1,
+                        help="Ignore phrase pairs aligned fewer times than this")
+    parser.add_argument("--save-lexicon", type=str, default=None,
+                        help="Write the learned lexicon to this JSON file")
+    parser.add_argument("--no-gpt", action="store_true",
+                        help="Leave uncovered cases empty instead of generating them with GPT")
+    parser.add_argument("--model", type=str, default="gpt-4o-mini",
+                        choices=["gpt-4o-mini", "gpt-4", "gpt-3.5-turbo"],
+                        help="OpenAI model used for uncovered cases")
+    parser.add_argument("--threads", type=int, default=5,
+                        help="Number of threads for the GPT fallback")
+    parser.add_argument("--max-regenerations", type=int, default=2,
+                        help="Regenerate a GPT case that fails validation up to this many times")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="Keep every GPT case without validating it")
+    add_executor_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    """Build the lexicon, switch every pair locally and send only the uncovered cases to GPT."""
+    args = parse_arguments()
+
+    if not os.path.exists(args.input):
+        print(f"Error: Input file '{args.input}' does not exist.")
+        return
+    if not os.path.exists(args.lexicon_source):
+        print(f"Error: Lexicon source '{args.lexicon_source}' does not exist.")
+        return
+
+    started = time.perf_counter()
+    with open(args.lexicon_source, 'r', encoding='utf-8') as f:
+        lexicon = build_lexicon(json.load(f), args.min_count)
+    print(f"Built lexicon with {len(lexicon)} phrase pairs from {args.lexicon_source} "
+          f"in {time.perf_counter() - started:.2f}s")
+    if args.save_lexicon:
+        lexicon.save(args.save_lexicon)
+        print(f"Saved lexicon to {args.save_lexicon}")
+
+    data = load_mkqa_data(args.input)
+    print(f"Loaded {len(data)} question pairs")
+
+    started = time.perf_counter()
+    local = [switch_pair(lexicon, item['ko'], item['en']) for item in data]
+    elapsed = time.perf_counter() - started
+    pending = [(idx, item, local[idx]) for idx, item in enumerate(data) if len(local[idx]) < len(GENERATED_CASES)]
+
+    local_cases = sum(len(generated) for generated in local)
+    uncovered = sum(1 for generated in local if not generated)
+    print(f"Lexicon generated {local_cases} of {len(data) * len(GENERATED_CASES)} cases "
+          f"({len(data) / max(elapsed, 1e-9):.0f} sentences/s); {len(data) - len(pending)} items fully covered, "
+          f"{len(pending) - uncovered} partially (GPT fills only the missing cases), {uncovered} not at all")
+
+    executor = None
+    if pending and not args.no_gpt:
+        if not os.getenv("OPENAI_API_KEY"):
+            print("Error: OPENAI_API_KEY environment variable is not set.")
+            print("Please set it using: export OPENAI_API_KEY='your-api-key', or pass --no-gpt")
+            return
+        executor = executor_from_args(args, "code-switching-lexicon", concurrency=args.threads, model=args.model)
+        validator = None if args.no_validate else CaseValidator(args.max_regenerations)
+        try:
+            for idx, generated in fill_with_gpt(pending, executor, validator).items():
+                local[idx].update(generated)
+        finally:
+            executor.close()
+
+    results = [build_result(idx, item['ko'], item['en'],
+                            {case_name: local[idx].get(case_name, "") for case_name in GENERATED_CASES})
+               for idx, item in enumerate(data)]
+    if executor is not None:
+        for line in executor.summaries():
+            print(line)
+        if validator is not None:
+            print(validator.summary())
+    save_results(results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Export GPT requests as a batch-request JSONL file and read batch results back
+"""
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+def build_batch_request(custom_id: str, messages: List[Dict[str, str]], model: str = "gpt-4o-mini",
+                        temperature: float = 0.3, max_tokens: int = 200,
+                        response_format: Optional[Dict] = None) -> Dict:
+    """One line of a batch-request file with the same body chat_completion would send"""
+    body = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    if response_format:
+        body["response_format"] = response_format
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def write_batch_requests(path: str, requests: Iterable[Dict]) -> int:
+    """Write batch requests as JSONL; custom_ids must be unique"""
+    seen = set()
+    with open(path, 'w', encoding='utf-8') as f:
+        for request in requests:
+            if request["custom_id"] in seen:
+                raise ValueError(f"Duplicate custom_id: {request['custom_id']}")
+            seen.add(request["custom_id"])
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+    return len(seen)
+
+
+def read_batch_results(path: str) -> Dict[str, Optional[str]]:
+    """Map custom_id to the response content, or None when that request failed"""
+    results = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            content = None
+            if not record.get("error") and response.get("status_code") == 200:
+                choices = (response.get("body") or {}).get("choices") or []
+                if choices:
+                    content = (choices[0].get("message") or {}).get("content")
+            results[record["custom_id"]] = content
+    return results
+
+
+def parse_range_id(custom_id: str, prefix: str) -> Optional[Tuple[int, int]]:
+    """Parse '<prefix>-<start>-<end>' custom_ids used for batches of consecutive items"""
+    match = re.fullmatch(re.escape(prefix) + r"-(\d+)-(\d+)", custom_id)
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def add_batch_arguments(parser):
+    """Register the shared batch-job options on an argparse parser"""
+    parser.add_argument("--export-batch", type=str, default=None,
+                        help="Write every request to this batch-request JSONL file instead of calling the API")
+    parser.add_argument("--import-batch", type=str, default=None,
+                        help="Merge this batch-results JSONL file into the normal output instead of calling the API")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed response cache for GPT calls with size-based LRU eviction
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_CACHE_DB = "data/cache/gpt_responses.sqlite"
+
+
+class ResponseCache:
+    """Persistent cache keyed by a hash of (model, messages, temperature, max_tokens)"""
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_DB, max_size_mb: float = 1024, read_only: bool = False):
+        self.db_path = db_path
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if read_only:
+            if os.path.exists(db_path):
+                self._conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+            return
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                   key TEXT PRIMARY KEY,
+                   response TEXT NOT NULL,
+                   size INTEGER NOT NULL,
+                   last_access REAL NOT NULL
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        # Total response size, kept in the database so processes sharing the file all see every write
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO meta (name, value) "
+                           "SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM responses")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict], temperature: float, max_tokens: int, **extra) -> str:
+        """Hash the request parameters that determine the response"""
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        payload.update({k: v for k, v in extra.items() if v is not None})
+        encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None"""
+        if self._conn is None:
+            self.misses += 1
+            return None
+
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.read_only:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+            return row[0]
+
+    def contains(self, key: str) -> bool:
+        """Whether key is cached, without counting a lookup or refreshing its LRU position"""
+        if self._conn is None:
+            return False
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key: str, response: str):
+        """Store a response, evicting least recently used entries past the size limit"""
+        if self.read_only or self._conn is None or not response:
+            return
+
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            # Take the write lock up front so the size read below cannot go stale under another process
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, response, size, time.time())
+                )
+                total = self._add_bytes(size - (old[0] if old else 0))
+                if total > self.max_bytes:
+                    self._evict(total)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _add_bytes(self, delta: int) -> int:
+        """Adjust the stored total size by delta and return the new total"""
+        self._conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_bytes'", (delta,))
+        return self._conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()[0]
+
+    def _evict(self, total: int):
+        """Drop oldest entries until the cache is back under 90% of its limit"""
+        target = int(self.max_bytes * 0.9)
+        freed = 0
+        while total - freed > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 100"
+            ).fetchall()
+            if not rows:
+                # Nothing left to drop: the stored total had drifted, so reset it
+                freed = total
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                freed += size
+                if total - freed <= target:
+                    break
+        self._add_bytes(-freed)
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        mode = " (read-only)" if self.read_only else ""
+        return f"Cache{mode}: {self.hits} hits / {total} lookups ({rate:.1f}%)"
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+
+def add_cache_arguments(parser):
+    """Register the shared cache options on an argparse parser"""
+    parser.add_argument("--cache-db", type=str, default=DEFAULT_CACHE_DB,
+                        help="SQLite file for the GPT response cache")
+    parser.add_argument("--cache-max-mb", type=float, default=1024,
+                        help="Maximum cache size in MB before LRU eviction")
+    parser.add_argument("--cache-read-only", action="store_true",
+                        help="Serve hits from the cache but never write to it")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Disable the response cache")
+
+
+def cache_from_args(args) -> Optional[ResponseCache]:
+    """Build a ResponseCache from parsed arguments, or None when disabled"""
+    if args.no_cache:
+        return None
+    return ResponseCache(args.cache_db, max_size_mb=args.cache_max_mb, read_only=args.cache_read_only)
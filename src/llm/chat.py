@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Single entry point for chat completion calls shared by all GPT scripts
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+from openai import APIConnectionError, APIStatusError
+
+from llm.cache import ResponseCache
+from llm.rate_limit import RateLimiter, backoff_delay, estimate_tokens, retry_after_from_headers
+from llm.telemetry import Telemetry
+
+
+class TruncatedResponse(Exception):
+    """The model stopped at max_tokens; `content` holds the partial answer"""
+
+    def __init__(self, content: str):
+        super().__init__("Response truncated at max_tokens")
+        self.content = content
+
+
+def _retry_wait(error: Exception, attempt: int, limiter: Optional[RateLimiter]) -> Optional[float]:
+    """Return how long to wait before retrying, or None if the error is not retryable"""
+    if isinstance(error, APIStatusError):
+        status = error.status_code
+        if status == 429:
+            if getattr(error, "code", None) == "insufficient_quota":
+                return None  # Retrying cannot help once the account is out of credit
+            retry_after = retry_after_from_headers(error.response.headers)
+            if limiter is not None:
+                limiter.on_rate_limited(retry_after)
+            return retry_after if retry_after is not None else backoff_delay(attempt)
+        if status >= 500:
+            return backoff_delay(attempt)
+        return None
+    if isinstance(error, APIConnectionError):
+        return backoff_delay(attempt)
+    return None
+
+
+def _record_success(limiter: Optional[RateLimiter], raw_response, response, reserved: float):
+    if limiter is None:
+        return
+    limiter.update_from_headers(raw_response.headers)
+    if response.usage is not None:
+        limiter.record_usage(reserved, response.usage.total_tokens)
+    limiter.on_success()
+
+
+def chat_completion(client, messages: List[Dict[str, str]], model: str = "gpt-4o-mini",
+                    temperature: float = 0.3, max_tokens: int = 200,
+                    cache: Optional[ResponseCache] = None,
+                    limiter: Optional[RateLimiter] = None,
+                    max_retries: int = 5,
+                    response_format: Optional[Dict] = None,
+                    telemetry: Optional[Telemetry] = None,
+                    tag: str = "",
+                    allow_truncated: bool = True) -> str:
+    """Call the chat completions API, serving identical requests from the cache
+
+    With allow_truncated=False an answer cut off at max_tokens raises TruncatedResponse and is not cached.
+    """
+    started = time.monotonic()
+    if telemetry is not None:
+        telemetry.request_started()
+
+    key = None
+    if cache is not None:
+        key = ResponseCache.make_key(model, messages, temperature, max_tokens,
+                                     response_format=response_format)
+        cached = cache.get(key)
+        if cached is not None:
+            if telemetry is not None:
+                telemetry.request_finished(model, tag, time.monotonic() - started, cache_hit=True)
+            return cached
+
+    estimated = estimate_tokens(messages, max_tokens)
+    reserved = estimated
+    extra = {"response_format": response_format} if response_format else {}
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            reserved = limiter.acquire(estimated)
+        try:
+            raw_response = client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **extra
+            )
+            response = raw_response.parse()
+            break
+        except Exception as e:
+            wait = _retry_wait(e, attempt, limiter)
+            if wait is None or attempt == max_retries:
+                if telemetry is not None:
+                    telemetry.request_finished(model, tag, time.monotonic() - started, retries=attempt, error=True)
+                raise
+            time.sleep(wait)
+
+    _record_success(limiter, raw_response, response, reserved)
+    if telemetry is not None:
+        telemetry.request_finished(model, tag, time.monotonic() - started, retries=attempt, usage=response.usage)
+    content = response.choices[0].message.content or ""
+    if not allow_truncated and response.choices[0].finish_reason == "length":
+        raise TruncatedResponse(content)
+
+    if cache is not None:
+        cache.put(key, content)
+
+    return content
+
+
+async def async_chat_completion(client, messages: List[Dict[str, str]], model: str = "gpt-4o-mini",
+                                temperature: float = 0.3, max_tokens: int = 200,
+                                cache: Optional[ResponseCache] = None,
+                                limiter: Optional[RateLimiter] = None,
+                                max_retries: int = 5,
+                                response_format: Optional[Dict] = None,
+                                telemetry: Optional[Telemetry] = None,
+                                tag: str = "",
+                                allow_truncated: bool = True) -> str:
+    """Async counterpart of chat_completion for use with AsyncOpenAI"""
+    started = time.monotonic()
+    if telemetry is not None:
+        telemetry.request_started()
+
+    key = None
+    if cache is not None:
+        key = ResponseCache.make_key(model, messages, temperature, max_tokens,
+                                     response_format=response_format)
+        cached = cache.get(key)
+        if cached is not None:
+            if telemetry is not None:
+                telemetry.request_finished(model, tag, time.monotonic() - started, cache_hit=True)
+            return cached
+
+    estimated = estimate_tokens(messages, max_tokens)
+    reserved = estimated
+    extra = {"response_format": response_format} if response_format else {}
+    attempt = 0
+    try:
+        for attempt in range(max_retries + 1):
+            if limiter is not None:
+                reserved = await limiter.acquire_async(estimated)
+            try:
+                raw_response = await client.chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    **extra
+                )
+                response = raw_response.parse()
+                break
+            except Exception as e:
+                wait = _retry_wait(e, attempt, limiter)
+                if wait is None or attempt == max_retries:
+                    if telemetry is not None:
+                        telemetry.request_finished(model, tag, time.monotonic() - started, retries=attempt,
+                                                   error=True)
+                    raise
+                await asyncio.sleep(wait)
+    except asyncio.CancelledError:
+        # A cancelled call still leaves the in-flight gauge
+        if telemetry is not None:
+            telemetry.request_finished(model, tag, time.monotonic() - started, retries=attempt, error=True)
+        raise
+
+    _record_success(limiter, raw_response, response, reserved)
+    if telemetry is not None:
+        telemetry.request_finished(model, tag, time.monotonic() - started, retries=attempt, usage=response.usage)
+    content = response.choices[0].message.content or ""
+    if not allow_truncated and response.choices[0].finish_reason == "length":
+        raise TruncatedResponse(content)
+
+    if cache is not None:
+        cache.put(key, content)
+
+    return content
+
+
+def stream_chat_completion(client, messages: List[Dict[str, str]], on_delta: Callable[[str], None],
+                           model: str = "gpt-4o-mini", temperature: float = 0.3, max_tokens: int = 200,
+                           cache: Optional[ResponseCache] = None,
+                           limiter: Optional[RateLimiter] = None,
+                           max_retries: int = 5,
+                           telemetry: Optional[Telemetry] = None,
+                           tag: str = "",
+                           allow_truncated: bool = True) -> str:
+    """Streaming counterpart of chat_completion: on_delta(text) receives each piece of the answer as it arrives
+
+    An exception raised by on_delta closes the stream, which stops generation, and propagates to the caller.
+    Only failures before the first piece arrives are retried. A cache hit is delivered as a single piece.
+    """
+    started = time.monotonic()
+    if telemetry is not None:
+        telemetry.request_started()
+
+    key = None
+    if cache is not None:
+        key = ResponseCache.make_key(model, messages, temperature, max_tokens)
+        cached = cache.get(key)
+        if cached is not None:
+            if telemetry is not None:
+                telemetry.request_finished(model, tag, time.monotonic() - started, cache_hit=True)
+            on_delta(cached)
+            return cached
+
+    estimated = estimate_tokens(messages, max_tokens)
+    reserved = estimated
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            reserved = limiter.acquire(estimated)
+        try:
+            raw_response = client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            stream = raw_response.parse()
+            break
+        except Exception as e:
+            wait = _retry_wait(e, attempt, limiter)
+            if wait is None or attempt == max_retries:
+                if telemetry is not None:
+                    telemetry.request_finished(model, tag, time.monotonic() - started, retries=attempt, error=True)
+                raise
+            time.sleep(wait)
+
+    pieces = []
+    finish_reason = None
+    usage = None
+    try:
+        for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            finish_reason = choice.finish_reason or finish_reason
+            if choice.delta.content:
+                pieces.append(choice.delta.content)
+                on_delta(choice.delta.content)
+    except BaseException:
+        stream.close()
+        if telemetry is not None:
+            telemetry.request_finished(model, tag, time.monotonic() - started, retries=attempt, error=True)
+        raise
+
+    if limiter is not None:
+        limiter.update_from_headers(raw_response.headers)
+        if usage is not None:
+            limiter.record_usage(reserved, usage.total_tokens)
+        limiter.on_success()
+    if telemetry is not None:
+        telemetry.request_finished(model, tag, time.monotonic() - started, retries=attempt, usage=usage)
+    content = "".join(pieces)
+    if not allow_truncated and finish_reason == "length":
+        raise TruncatedResponse(content)
+
+    if cache is not None:
+        cache.put(key, content)
+
+    return content
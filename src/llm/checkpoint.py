@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Append-only JSONL checkpoint log for GPT pipelines
+"""
+import json
+import os
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+_STOP = object()
+
+
+def checkpoint_path_for(output_file: str) -> str:
+    """Default checkpoint location next to the output file"""
+    root, _ = os.path.splitext(output_file)
+    return root + ".checkpoint.jsonl"
+
+
+class CheckpointWriter:
+    """Append records to a JSONL file from a dedicated writer thread, one line per record"""
+
+    def __init__(self, path: str, flush_interval: int = 10, append: bool = True):
+        self.path = path
+        self.flush_interval = max(1, flush_interval)
+        self.count = 0
+        self._queue = queue.Queue()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict):
+        """Queue a record; never blocks on disk I/O"""
+        self._queue.put(record)
+
+    def _run(self):
+        pending = 0
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                break
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.count += 1
+            pending += 1
+            # Flush on interval, or whenever the writer catches up with the workers
+            if pending >= self.flush_interval or self._queue.empty():
+                self._file.flush()
+                pending = 0
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Drain the queue and close the file"""
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def load_checkpoint(path: str, key: str = "id") -> Dict[Any, Dict]:
+    """Read a checkpoint log into {key: record}; a torn final line from a crash is ignored"""
+    records = {}
+    if not os.path.exists(path):
+        return records
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record[key]] = record
+    return records
+
+
+def compact_checkpoint(path: str, key: str = "id",
+                       records: Optional[Dict[Any, Dict]] = None) -> List[Dict]:
+    """Return the checkpointed records ordered by key, keeping the last write for each key"""
+    if records is None:
+        records = load_checkpoint(path, key)
+    return [records[k] for k in sorted(records)]
+
+
+def add_checkpoint_arguments(parser):
+    """Register the shared checkpoint options on an argparse parser"""
+    parser.add_argument("--checkpoint", type=str, default=None,
+                        help="JSONL checkpoint log (default: <output>.checkpoint.jsonl)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip items already present in the checkpoint log")
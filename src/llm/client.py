@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Shared OpenAI client factory with a connection pool sized to the configured concurrency
+"""
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI, Timeout
+
+try:
+    import httpx2 as httpx  # openai>=3 is built on httpx2
+except ImportError:
+    import httpx
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_REQUEST_TIMEOUT = 120.0
+
+# Idle connections stay open this long so bursts reuse them instead of repeating TLS handshakes
+KEEPALIVE_EXPIRY = 60.0
+
+
+def build_limits(concurrency: int) -> "httpx.Limits":
+    """Pool limits that keep one warm connection per concurrent request"""
+    concurrency = max(1, concurrency)
+    return httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+def build_timeout(connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                  read_timeout: float = DEFAULT_READ_TIMEOUT) -> Timeout:
+    """Connect, read and write timeouts; waiting for a pooled connection counts as a read"""
+    return Timeout(read_timeout, connect=connect_timeout, write=read_timeout, pool=read_timeout)
+
+
+def _http2_available(http2: bool) -> bool:
+    if not http2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        print("⚠️  HTTP/2 needs the 'h2' package (pip install h2); falling back to HTTP/1.1")
+        return False
+    return True
+
+
+def _deadline_error(request, request_timeout: float) -> "httpx.TimeoutException":
+    # Surfaces as APITimeoutError, which llm.chat retries like any connection error
+    return httpx.TimeoutException(f"Request exceeded {request_timeout:.0f}s", request=request)
+
+
+class _DeadlineStream(httpx.SyncByteStream):
+    """Response body that gives up once the request's deadline passes, however steadily bytes keep arriving"""
+
+    def __init__(self, stream, deadline: float, request, request_timeout: float):
+        self._stream = stream
+        self._deadline = deadline
+        self._request = request
+        self._request_timeout = request_timeout
+
+    def __iter__(self):
+        for chunk in self._stream:
+            if time.monotonic() > self._deadline:
+                raise _deadline_error(self._request, self._request_timeout)
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+
+
+class _DeadlineClient(DefaultHttpxClient):
+    """HTTP client that fails any request still running after request_timeout seconds.
+
+    No single connect or read wait may exceed the deadline, and it is checked again once the headers are in
+    and between body chunks, so a response that trickles in cannot hold a worker thread indefinitely.
+    """
+
+    def __init__(self, request_timeout: Optional[float] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.request_timeout = request_timeout
+
+    def send(self, request, *, stream: bool = False, **kwargs):
+        if not self.request_timeout:
+            return super().send(request, stream=stream, **kwargs)
+        deadline = time.monotonic() + self.request_timeout
+        timeout = request.extensions.get("timeout")
+        if timeout:
+            request.extensions = {**request.extensions, "timeout": {
+                key: self.request_timeout if value is None else min(value, self.request_timeout)
+                for key, value in timeout.items()}}
+
+        response = super().send(request, stream=True, **kwargs)
+        if time.monotonic() > deadline:
+            response.close()
+            raise _deadline_error(request, self.request_timeout)
+        response.stream = _DeadlineStream(response.stream, deadline, request, self.request_timeout)
+        if not stream:
+            try:
+                response.read()
+            except BaseException:
+                response.close()
+                raise
+        return response
+
+
+class _DeadlineAsyncClient(DefaultAsyncHttpxClient):
+    """Async HTTP client that cancels any request still running after request_timeout seconds"""
+
+    def __init__(self, request_timeout: Optional[float] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.request_timeout = request_timeout
+
+    async def send(self, request, **kwargs):
+        if not self.request_timeout:
+            return await super().send(request, **kwargs)
+        try:
+            return await asyncio.wait_for(super().send(request, **kwargs), self.request_timeout)
+        except asyncio.TimeoutError:
+            raise _deadline_error(request, self.request_timeout)
+
+
+def create_client(concurrency: int = 5,
+                  connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                  read_timeout: float = DEFAULT_READ_TIMEOUT,
+                  request_timeout: Optional[float] = DEFAULT_REQUEST_TIMEOUT,
+                  http2: bool = False,
+                  api_key: Optional[str] = None) -> OpenAI:
+    """OpenAI client for up to `concurrency` worker threads sharing one keep-alive pool; each request fails
+    after request_timeout"""
+    timeout = build_timeout(connect_timeout, read_timeout)
+    http_client = _DeadlineClient(request_timeout=request_timeout, limits=build_limits(concurrency),
+                                  timeout=timeout, http2=_http2_available(http2))
+    # Retries are handled by llm.chat so the rate limiter sees every 429
+    return OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=timeout,
+                  http_client=http_client)
+
+
+def create_async_client(concurrency: int = 200,
+                        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                        read_timeout: float = DEFAULT_READ_TIMEOUT,
+                        request_timeout: Optional[float] = DEFAULT_REQUEST_TIMEOUT,
+                        http2: bool = False,
+                        api_key: Optional[str] = None) -> AsyncOpenAI:
+    """AsyncOpenAI client for up to `concurrency` in-flight requests; each is cancelled after request_timeout"""
+    timeout = build_timeout(connect_timeout, read_timeout)
+    http_client = _DeadlineAsyncClient(request_timeout=request_timeout, limits=build_limits(concurrency),
+                                       timeout=timeout, http2=_http2_available(http2))
+    return AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=timeout,
+                       http_client=http_client)
+
+
+def add_client_arguments(parser):
+    """Register the shared HTTP client options on an argparse parser"""
+    parser.add_argument("--connect-timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help="Seconds to wait for a TCP/TLS connection to the API")
+    parser.add_argument("--read-timeout", type=float, default=DEFAULT_READ_TIMEOUT,
+                        help="Seconds to wait for response data (or a free pooled connection) before retrying")
+    parser.add_argument("--request-timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT,
+                        help="Give up on a request still running after this many seconds, even if its "
+                             "response is still arriving (0 disables)")
+    parser.add_argument("--http2", action="store_true",
+                        help="Multiplex requests over HTTP/2 connections (requires the 'h2' package)")
+
+
+def client_settings_from_args(args) -> Dict:
+    """Keyword arguments for create_client or create_async_client from parsed arguments"""
+    return {"connect_timeout": args.connect_timeout, "read_timeout": args.read_timeout, "http2": args.http2,
+            "request_timeout": args.request_timeout or None}
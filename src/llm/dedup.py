@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Group near-identical inputs so each distinct question is sent to GPT once
+"""
+import math
+import unicodedata
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """Fold width, case and punctuation and collapse whitespace so near-identical questions compare equal"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = "".join(" " if unicodedata.category(c).startswith("P") else c for c in text)
+    return " ".join(text.split())
+
+
+def pair_key(item: Dict) -> str:
+    """Dedup key for an en/ko pair"""
+    return normalize_text(item.get("ko", "")) + "\n" + normalize_text(item.get("en", ""))
+
+
+def group_duplicates(items: List[Any], key: Callable[[Any], str] = pair_key) -> Dict[int, List[int]]:
+    """Map the first index of each group to every index in it, both in input order"""
+    groups = {}
+    first_by_key = {}
+    for idx, item in enumerate(items):
+        rep = first_by_key.setdefault(key(item), idx)
+        groups.setdefault(rep, []).append(idx)
+    return groups
+
+
+def match_records(entries: List[Any], records: List[Any], entry_key: Callable[[Any], str],
+                  record_key: Callable[[Any], str]) -> List[Optional[Any]]:
+    """Align answer records with the entries they were generated for, one record or None per entry.
+
+    A record goes to the first unmatched entry with the same key. A record whose key matches no entry
+    (the model rewrote its copy of the input) takes the entry at its own position if that one is still free;
+    when exactly as many records as entries are then left over, they are paired up in order.
+    """
+    matched = [None] * len(entries)
+    slots = defaultdict(deque)
+    for idx, entry in enumerate(entries):
+        slots[entry_key(entry)].append(idx)
+
+    unmatched = []
+    for pos, record in enumerate(records):
+        key = record_key(record)
+        if slots.get(key):
+            matched[slots[key].popleft()] = record
+        else:
+            unmatched.append((pos, record))
+    leftover = []
+    for pos, record in unmatched:
+        if pos < len(entries) and matched[pos] is None:
+            matched[pos] = record
+        else:
+            leftover.append(record)
+    free = [idx for idx, record in enumerate(matched) if record is None]
+    if len(free) == len(leftover):
+        for idx, record in zip(free, leftover):
+            matched[idx] = record
+    return matched
+
+
+def in_input_order(positioned: Iterable[Tuple[int, Any]]) -> List[Any]:
+    """Values of (input position, value) pairs sorted back into input order"""
+    return [value for _, value in sorted(positioned, key=lambda pair: pair[0])]
+
+
+def batched_calls_saved(total: int, unique: int, batch_size: int) -> int:
+    """API calls saved when unique instead of total items are sent in batches of batch_size"""
+    return math.ceil(total / batch_size) - math.ceil(unique / batch_size)
+
+
+def dedup_summary(total: int, unique: int, calls_saved: int) -> str:
+    return (f"Dedup: {total} inputs -> {unique} unique ({total - unique} duplicates, "
+            f"{calls_saved} API calls saved)")
+
+
+def add_dedup_arguments(parser):
+    """Register the shared dedup option on an argparse parser"""
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Send every input to GPT, even near-identical duplicates")
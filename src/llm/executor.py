@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Shared execution layer for the GPT scripts: client, cache, rate limiting, retries, scheduling,
+checkpointing, work queues and telemetry behind one object, so each script only builds prompts and parses responses
+"""
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from llm.cache import ResponseCache, add_cache_arguments, cache_from_args
+from llm.chat import async_chat_completion, chat_completion, stream_chat_completion
+from llm.checkpoint import CheckpointWriter, compact_checkpoint, load_checkpoint
+from llm.client import add_client_arguments, client_settings_from_args, create_async_client, create_client
+from llm.hedging import Hedger, add_hedging_arguments, hedger_from_args
+from llm.rate_limit import RateLimiter, add_rate_limit_arguments, limiter_from_args
+from llm.scheduler import add_scheduler_arguments, aiter_ordered, iter_ordered
+from llm.telemetry import Telemetry, add_telemetry_arguments, telemetry_from_args
+from llm.work_queue import WorkQueue, job_fingerprint, queue_from_args
+from utils.json_stream import JsonArrayParser
+
+
+def strip_code_fences(text: str) -> str:
+    """Remove a surrounding ```json ... ``` markdown fence from a model response"""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text
+
+
+def parse_json_response(text: str) -> Any:
+    """Parse the JSON in a model response, tolerating markdown fences; raises json.JSONDecodeError"""
+    return json.loads(strip_code_fences(text))
+
+
+class LLMExecutor:
+    """Run one script's chat requests with shared concurrency, caching, rate limiting, retries and telemetry"""
+
+    def __init__(self, model: str = "gpt-4o-mini", concurrency: int = 5,
+                 cache: Optional[ResponseCache] = None,
+                 limiter: Optional[RateLimiter] = None,
+                 max_retries: int = 5,
+                 telemetry: Optional[Telemetry] = None,
+                 max_pending: Optional[int] = None,
+                 client_settings: Optional[Dict] = None,
+                 hedger: Optional[Hedger] = None,
+                 queue: Optional[WorkQueue] = None):
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.telemetry = telemetry
+        self.max_pending = max_pending
+        self.client_settings = client_settings or {}
+        self.hedger = hedger
+        self.queue = queue
+
+        self._client = None
+        self._async_client = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Shared OpenAI client, created on first use so offline modes need no API key"""
+        with self._lock:
+            if self._client is None:
+                self._client = create_client(self.concurrency, **self.client_settings)
+            return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = create_async_client(self.concurrency, **self.client_settings)
+        return self._async_client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Caps the requests in flight on the event loop at the configured concurrency"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def _hedged(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                response_format: Optional[Dict]) -> bool:
+        """Whether a call goes through the hedger; cache hits answer at once and are never duplicated"""
+        if self.hedger is None:
+            return False
+        if self.cache is None:
+            return True
+        key = ResponseCache.make_key(self.model, messages, temperature, max_tokens, response_format=response_format)
+        return not self.cache.contains(key)
+
+    def complete(self, messages: List[Dict[str, str]], temperature: float = 0.3, max_tokens: int = 200,
+                 response_format: Optional[Dict] = None, tag: str = "", allow_truncated: bool = True) -> str:
+        """One chat completion through the cache, rate limiter, retries, hedging and telemetry"""
+        def request():
+            return chat_completion(self.client, messages, model=self.model, temperature=temperature,
+                                   max_tokens=max_tokens, cache=self.cache, limiter=self.limiter,
+                                   max_retries=self.max_retries, response_format=response_format,
+                                   telemetry=self.telemetry, tag=tag, allow_truncated=allow_truncated)
+
+        if self._hedged(messages, temperature, max_tokens, response_format):
+            return self.hedger.run(request)
+        return request()
+
+    async def acomplete(self, messages: List[Dict[str, str]], temperature: float = 0.3, max_tokens: int = 200,
+                        response_format: Optional[Dict] = None, tag: str = "",
+                        allow_truncated: bool = True) -> str:
+        """Async version of complete, bounded by the shared semaphore; a duplicate does not take a slot"""
+        def request():
+            return async_chat_completion(self.async_client, messages, model=self.model,
+                                         temperature=temperature, max_tokens=max_tokens, cache=self.cache,
+                                         limiter=self.limiter, max_retries=self.max_retries,
+                                         response_format=response_format, telemetry=self.telemetry,
+                                         tag=tag, allow_truncated=allow_truncated)
+
+        async with self.semaphore:
+            if self._hedged(messages, temperature, max_tokens, response_format):
+                return await self.hedger.arun(request)
+            return await request()
+
+    def stream_items(self, messages: List[Dict[str, str]], on_item: Callable[[Any], None],
+                     temperature: float = 0.3, max_tokens: int = 200, tag: str = "",
+                     allow_truncated: bool = True) -> str:
+        """Stream a completion whose answer is a JSON array, calling on_item(element) as soon as each one closes.
+
+        Text before the opening "[" (such as a markdown fence) is skipped. A malformed element raises ValueError
+        and on_item may raise to reject an element; either way the request is cancelled mid-generation and the
+        elements already delivered stay with the caller. Returns the full answer text.
+        """
+        parser = JsonArrayParser()
+        started = False
+
+        def on_delta(text):
+            nonlocal started
+            if not started:
+                if "[" not in text:
+                    return
+                text = text[text.index("["):]
+                started = True
+            for item in parser.feed(text):
+                on_item(item)
+
+        return stream_chat_completion(self.client, messages, on_delta, model=self.model, temperature=temperature,
+                                      max_tokens=max_tokens, cache=self.cache, limiter=self.limiter,
+                                      max_retries=self.max_retries, telemetry=self.telemetry, tag=tag,
+                                      allow_truncated=allow_truncated)
+
+    def map(self, worker: Callable[[Any], Any], units: Iterable[Any]) -> Iterator[Tuple[Any, Any]]:
+        """Run worker(unit) on the thread pool, yielding (unit, finished future) in input order"""
+        return iter_ordered(worker, units, self.concurrency, self.max_pending)
+
+    def amap(self, worker: Callable[[Any], Any], units: Iterable[Any]):
+        """Async version of map for coroutine workers"""
+        return aiter_ordered(worker, units, self.concurrency, self.max_pending)
+
+    def run(self, worker: Callable[[Any], List[Dict]], units: Iterable[Any],
+            checkpoint: Optional[CheckpointWriter] = None, total: Optional[int] = None,
+            desc: str = "Processing", unit_size: Callable[[Any], int] = lambda unit: 1) -> int:
+        """Run worker(unit) -> records over the units, writing records to the checkpoint in input order.
+
+        Units that raise are reported and skipped. Returns the number of records produced. With a work queue
+        the units are shared with the other workers instead and their records collected with queue.records().
+        """
+        if self.queue is not None:
+            units = list(units)
+            return self.run_queued(worker, units, units, desc=desc, unit_size=unit_size)
+
+        produced = 0
+        with tqdm(total=total, desc=desc) as pbar:
+            for unit, future in self.map(worker, units):
+                try:
+                    records = future.result()
+                except Exception as e:
+                    print(f"Error processing item: {e}")
+                    records = []
+                if checkpoint is not None:
+                    for record in records:
+                        checkpoint.write(record)
+                produced += len(records)
+                pbar.update(unit_size(unit))
+        return produced
+
+    def run_queued(self, worker: Callable[[Any], List[Dict]], units: List[Any], job: Any,
+                   desc: str = "Processing", unit_size: Callable[[Any], int] = lambda unit: 1) -> int:
+        """Run worker(unit) -> records over the units claimed from the work queue until it is drained.
+
+        job describes the units; workers attached to the same queue must pass the same one. Each thread claims
+        one unit at a time; once nothing is left to claim, threads wait for units leased by other workers,
+        taking them over if their leases expire. Returns the number of records this worker produced.
+        """
+        queue = self.queue
+        queue.prepare(len(units), job_fingerprint(job))
+        # Idle threads look for expired leases a few times per lease period
+        poll_interval = min(5.0, queue.lease_seconds / 4)
+        produced = 0
+        produced_lock = threading.Lock()
+
+        done = queue.done_keys()
+        with tqdm(total=sum(unit_size(unit) for unit in units), desc=desc,
+                  initial=sum(unit_size(units[key]) for key in done)) as pbar:
+            def claim_loop():
+                nonlocal produced
+                while True:
+                    key = queue.claim()
+                    if key is None:
+                        if queue.finished():
+                            return
+                        time.sleep(poll_interval)
+                        continue
+                    try:
+                        records = worker(units[key])
+                    except Exception as e:
+                        print(f"Error processing item: {e}")
+                        queue.fail(key, str(e))
+                        continue
+                    queue.complete(key, records)
+                    with produced_lock:
+                        produced += len(records)
+                    pbar.update(unit_size(units[key]))
+
+            threads = [threading.Thread(target=claim_loop, name=f"queue-worker-{i}", daemon=True)
+                       for i in range(self.concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return produced
+
+    async def arun(self, worker: Callable[[Any], Any], units: Iterable[Any],
+                   checkpoint: Optional[CheckpointWriter] = None, total: Optional[int] = None,
+                   desc: str = "Processing", unit_size: Callable[[Any], int] = lambda unit: 1) -> int:
+        """Async version of run for coroutine workers"""
+        produced = 0
+        with tqdm(total=total, desc=desc) as pbar:
+            async for unit, task in self.amap(worker, units):
+                try:
+                    records = task.result()
+                except Exception as e:
+                    print(f"Error processing item: {e}")
+                    records = []
+                if checkpoint is not None:
+                    for record in records:
+                        checkpoint.write(record)
+                produced += len(records)
+                pbar.update(unit_size(unit))
+        return produced
+
+    def run_batches(self, items: List[Any], spans: List[Tuple[int, int]],
+                    worker: Callable[[List[Any], int], Dict], checkpoint_file: str, resume: bool = False,
+                    meta: Optional[Dict] = None, desc: str = "Processing batches") -> List[Dict]:
+        """Run worker(items[start:end], start) -> record fields over (start, end) spans with a checkpoint log.
+
+        Each record is stored as {"id": batch_index, **meta, **fields}; with resume, batches already logged
+        with the same meta are skipped. Returns the records of every batch, in batch order. With a work queue
+        the batches are shared with the other workers and the queue replaces the checkpoint log.
+        """
+        meta = meta or {}
+        num_batches = len(spans)
+
+        def batch_worker(batch_index):
+            start, end = spans[batch_index]
+            return [{"id": batch_index, **meta, **worker(items[start:end], start)}]
+
+        if self.queue is not None:
+            self.run_queued(batch_worker, list(range(num_batches)), {"items": items, "spans": spans, "meta": meta},
+                            desc=desc)
+            return self.queue.records()
+
+        def matches(record):
+            return record["id"] < num_batches and all(record.get(key) == value for key, value in meta.items())
+
+        done_batches = set()
+        if resume:
+            done_batches = {idx for idx, record in load_checkpoint(checkpoint_file).items() if matches(record)}
+            print(f"♻️  Resuming: {len(done_batches)} batches already in {checkpoint_file}")
+
+        # Batches are sliced only when a worker slot opens
+        pending = (idx for idx in range(num_batches) if idx not in done_batches)
+        checkpoint = CheckpointWriter(checkpoint_file, append=resume)
+        try:
+            self.run(batch_worker, pending, checkpoint, total=num_batches - len(done_batches), desc=desc)
+        finally:
+            checkpoint.close()
+
+        return [record for record in compact_checkpoint(checkpoint_file) if matches(record)]
+
+    def summaries(self) -> List[str]:
+        """Cache, rate limiter, hedging and telemetry summary lines"""
+        lines = []
+        if self.cache is not None:
+            lines.append(f"🗄️  {self.cache.summary()}")
+        if self.limiter is not None:
+            lines.append(f"🚦 {self.limiter.summary()}")
+        if self.hedger is not None:
+            lines.append(f"🪃 {self.hedger.summary()}")
+        if self.queue is not None:
+            lines.append(f"📬 {self.queue.summary()}")
+        if self.telemetry is not None:
+            lines.append(f"📈 {self.telemetry.summary()}")
+        return lines
+
+    def close(self):
+        """Write the final metrics and release the cache, hedging threads and work queue"""
+        if self.hedger is not None:
+            self.hedger.close()
+        if self.queue is not None:
+            self.queue.close()
+        if self.telemetry is not None:
+            self.telemetry.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    async def aclose(self):
+        """Close the async HTTP client; call on the event loop that used it"""
+        if self.hedger is not None:
+            await self.hedger.aclose()
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+
+def add_executor_arguments(parser):
+    """Register the cache, rate limit, telemetry, scheduling, hedging and HTTP client options on an argparse parser"""
+    add_cache_arguments(parser)
+    add_rate_limit_arguments(parser)
+    add_telemetry_arguments(parser)
+    add_scheduler_arguments(parser)
+    add_hedging_arguments(parser)
+    add_client_arguments(parser)
+
+
+def executor_from_args(args, script: str, concurrency: int, model: str = "gpt-4o-mini") -> LLMExecutor:
+    """Build an LLMExecutor from parsed arguments"""
+    return LLMExecutor(model=model, concurrency=concurrency, cache=cache_from_args(args),
+                       limiter=limiter_from_args(args), max_retries=args.max_retries,
+                       telemetry=telemetry_from_args(args, script), max_pending=args.max_pending,
+                       client_settings=client_settings_from_args(args),
+                       hedger=hedger_from_args(args, concurrency), queue=queue_from_args(args))
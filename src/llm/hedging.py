@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Hedged GPT requests: a call still running past a latency percentile gets one duplicate, and whichever
+answers first is used, with the duplicates capped at a share of all calls
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, List, Optional
+
+# Latencies observed before the percentile is trusted enough to hedge on
+MIN_SAMPLES = 20
+# Recent first-attempt latencies the hedging threshold is computed from
+LATENCY_WINDOW = 500
+
+DEFAULT_HEDGE_BUDGET = 0.05
+
+
+def quantile(values: List[float], q: float) -> float:
+    """Nearest-rank quantile of sorted values, 0.0 when empty"""
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+class _Call:
+    """Timing of one hedged call: when it started, when its first attempt and the served answer finished"""
+
+    __slots__ = ("started", "primary", "served", "hedged")
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.primary = None
+        self.served = None
+        self.hedged = False
+
+    def unhedged_latency(self, now: float) -> float:
+        """What the call would have taken without hedging; a first attempt still running counts as running so far"""
+        return self.primary if self.primary is not None else now - self.started
+
+
+class Hedger:
+    """Send a duplicate of calls that outlive the given latency percentile and keep the first answer.
+
+    The threshold comes from the latencies of recent first attempts, so duplicates do not drag it down.
+    At most budget duplicates are sent per call made; a duplicate that loses keeps running and its first
+    attempt's latency still feeds the threshold and the report of how much tail latency hedging removed.
+    """
+
+    def __init__(self, percentile: float = 95.0, budget: float = DEFAULT_HEDGE_BUDGET, concurrency: int = 5,
+                 min_samples: int = MIN_SAMPLES):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.hedges = 0
+        self.hedge_wins = 0
+
+        self._concurrency = max(1, concurrency)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._calls = []
+        self._pool = None
+        self._losers = set()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        """Threads for first attempts and duplicates, sized so duplicates never wait behind a full pool"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._concurrency * 2, thread_name_prefix="hedge")
+            return self._pool
+
+    def threshold(self) -> Optional[float]:
+        """Seconds after which a call is hedged, or None until enough latencies are known"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            return quantile(sorted(self._latencies), self.percentile / 100)
+
+    def _begin(self) -> _Call:
+        call = _Call()
+        with self._lock:
+            self._calls.append(call)
+        return call
+
+    def _primary_done(self, call: _Call):
+        latency = time.monotonic() - call.started
+        with self._lock:
+            call.primary = latency
+            self._latencies.append(latency)
+
+    def _reserve_hedge(self, call: _Call) -> bool:
+        """Take one duplicate from the budget, if any is left"""
+        with self._lock:
+            if self.hedges + 1 > self.budget * len(self._calls):
+                return False
+            self.hedges += 1
+            call.hedged = True
+            return True
+
+    def _served(self, call: _Call, hedge_won: bool):
+        with self._lock:
+            call.served = time.monotonic() - call.started
+            self.hedge_wins += int(hedge_won)
+
+    def run(self, request: Callable[[], Any]) -> Any:
+        """Run request(), duplicating it once if it is still running past the threshold"""
+        call = self._begin()
+        primary = self.pool.submit(request)
+        primary.add_done_callback(lambda _: self._primary_done(call))
+
+        winner = primary
+        delay = self.threshold()
+        if delay is not None and not wait([primary], timeout=delay).done and self._reserve_hedge(call):
+            hedge = self.pool.submit(request)
+            done, pending = wait([primary, hedge], return_when=FIRST_COMPLETED)
+            winner = primary if primary in done else hedge
+            # A failed attempt only loses if the other one can still answer
+            if winner.exception() is not None and pending:
+                winner = pending.pop()
+
+        try:
+            return winner.result()
+        finally:
+            self._served(call, winner is not primary and winner.exception() is None)
+
+    async def arun(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of run; request() returns a fresh coroutine for each attempt"""
+        call = self._begin()
+        primary = asyncio.ensure_future(request())
+        primary.add_done_callback(lambda _: self._primary_done(call))
+        attempts = [primary]
+
+        try:
+            winner = primary
+            delay = self.threshold()
+            if delay is not None:
+                await asyncio.wait([primary], timeout=delay)
+            if delay is not None and not primary.done() and self._reserve_hedge(call):
+                hedge = asyncio.ensure_future(request())
+                attempts.append(hedge)
+                done, pending = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                winner = primary if primary in done else hedge
+                if winner.exception() is not None and pending:
+                    winner = pending.pop()
+            else:
+                await asyncio.wait([primary])
+        except asyncio.CancelledError:
+            for attempt in attempts:
+                attempt.cancel()
+            raise
+
+        for attempt in attempts:
+            if not attempt.done():
+                self._losers.add(attempt)
+                attempt.add_done_callback(self._losers.discard)
+        self._served(call, winner is not primary and not winner.cancelled() and winner.exception() is None)
+        return await winner
+
+    def report(self) -> dict:
+        """Served versus unhedged latency of the calls answered so far"""
+        now = time.monotonic()
+        with self._lock:
+            calls = [call for call in self._calls if call.served is not None]
+            hedges, wins = self.hedges, self.hedge_wins
+
+        served = sorted(call.served for call in calls)
+        unhedged = sorted(call.unhedged_latency(now) for call in calls)
+        median = quantile(unhedged, 0.5)
+        # Tail latency: the time calls spent beyond the median, with and without hedging
+        tail = sum(max(0.0, call.unhedged_latency(now) - median) for call in calls)
+        tail_after = sum(max(0.0, call.served - median) for call in calls)
+        return {
+            "percentile": self.percentile,
+            "budget": self.budget,
+            "calls": len(calls),
+            "hedged": hedges,
+            "hedge_wins": wins,
+            "p99_unhedged_seconds": quantile(unhedged, 0.99),
+            "p99_seconds": quantile(served, 0.99),
+            "max_unhedged_seconds": unhedged[-1] if unhedged else 0.0,
+            "max_seconds": served[-1] if served else 0.0,
+            "tail_removed": (tail - tail_after) / tail if tail else 0.0,
+        }
+
+    def summary(self) -> str:
+        report = self.report()
+        calls = report["calls"]
+        share = report["hedged"] / calls if calls else 0.0
+        return (f"Hedging: {report['hedged']} of {calls} calls duplicated past p{report['percentile']:g} "
+                f"({share:.1%} extra, budget {report['budget']:.0%}), {report['hedge_wins']} won by the duplicate; "
+                f"p99 {report['p99_unhedged_seconds']:.2f}s -> {report['p99_seconds']:.2f}s, "
+                f"max {report['max_unhedged_seconds']:.2f}s -> {report['max_seconds']:.2f}s, "
+                f"{report['tail_removed']:.0%} of the latency beyond the median removed")
+
+    def close(self):
+        """Stop accepting work; duplicates still running finish in the background"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    async def aclose(self):
+        """Cancel the async duplicates that lost; call before closing the async client"""
+        losers = list(self._losers)
+        for task in losers:
+            task.cancel()
+        if losers:
+            await asyncio.gather(*losers, return_exceptions=True)
+
+
+def add_hedging_arguments(parser):
+    """Register the request hedging options on an argparse parser"""
+    parser.add_argument("--hedge-percentile", type=float, default=0,
+                        help="Send a duplicate of GPT calls still running past this latency percentile "
+                             "(e.g. 95) and use whichever answers first; 0 disables hedging")
+    parser.add_argument("--hedge-budget", type=float, default=DEFAULT_HEDGE_BUDGET,
+                        help="Most duplicate calls as a share of all calls")
+
+
+def hedger_from_args(args, concurrency: int) -> Optional[Hedger]:
+    """Build a Hedger from parsed arguments, or None when hedging is off"""
+    if args.hedge_percentile <= 0:
+        return None
+    return Hedger(percentile=args.hedge_percentile, budget=args.hedge_budget, concurrency=concurrency)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Run the GPT scripts against the local mock server across a concurrency sweep and report throughput
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm.mock_server import MockChatServer, add_mock_server_arguments, mock_server_from_args
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# name -> (script path, concurrency flag, extra arguments); refine skips its local pre-screen, which would
+# otherwise pass most clean sample records through without a request
+SCRIPTS = {
+    "code-switching": ("src/code-switching/make_code_switching_gpt.py", "--threads", []),
+    "code-switching-async": ("src/code-switching/make_code_switching_gpt.py", "--max-in-flight", ["--async"]),
+    "refine": ("src/refine/refine_korean_with_gpt.py", "--max-workers", ["--no-prescreen"]),
+    "typo": ("src/typo/generate_typos_with_gpt_improved.py", "--max-workers", []),
+}
+
+
+def write_sample(input_file: str, sample_size: int, path: str) -> int:
+    """Copy the first sample_size records of input_file to path"""
+    with open(input_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if sample_size > 0:
+        data = data[:sample_size]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return len(data)
+
+
+def run_script(name: str, concurrency: int, input_file: str, work_dir: str,
+               server: MockChatServer, extra_args: List[str]) -> Dict:
+    """Run one script once against the mock server and collect timing and server stats"""
+    script, flag, script_args = SCRIPTS[name]
+    output_file = os.path.join(work_dir, f"{name}_{concurrency}.json")
+    command = [sys.executable, os.path.join(REPO_ROOT, script),
+               "--input", input_file, "--output", output_file,
+               flag, str(concurrency), "--no-cache"] + script_args + extra_args
+    env = dict(os.environ, OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY="mock")
+
+    server.reset_stats()
+    started = time.monotonic()
+    completed = subprocess.run(command, env=env, cwd=work_dir, capture_output=True, text=True)
+    elapsed = time.monotonic() - started
+    stats = server.stats()
+
+    if completed.returncode != 0:
+        print(f"❌ {name} (concurrency {concurrency}) exited with {completed.returncode}")
+        print(completed.stderr[-2000:])
+
+    return {
+        "script": name,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "returncode": completed.returncode,
+        **stats,
+        "retries": stats["rate_limited"] + stats["server_errors"],
+    }
+
+
+def print_report(rows: List[Dict], items: int):
+    """Print the sweep as a table"""
+    header = (f"{'script':<22}{'conc':>6}{'items/s':>10}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}"
+              f"{'429s':>7}{'500s':>7}{'retries':>9}")
+    print("\n" + header)
+    print("-" * len(header))
+    for row in rows:
+        seconds = max(row["seconds"], 1e-9)
+        print(f"{row['script']:<22}{row['concurrency']:>6}{items / seconds:>10.1f}"
+              f"{row['completed'] / seconds:>9.1f}{row['p50_ms']:>9.0f}{row['p99_ms']:>9.0f}"
+              f"{row['rate_limited']:>7}{row['server_errors']:>7}{row['retries']:>9}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load-test the GPT scripts against a local mock OpenAI server")
+    parser.add_argument("--scripts", default="code-switching,refine,typo",
+                        help=f"Comma-separated scripts to run ({', '.join(SCRIPTS)})")
+    parser.add_argument("--concurrency", default="1,4,16",
+                        help="Comma-separated thread/worker/in-flight counts to sweep")
+    parser.add_argument("--input", default=os.path.join(REPO_ROOT, "data/test/mkqa_refined_simple.json"),
+                        help="en/ko input JSON file")
+    parser.add_argument("--sample-size", type=int, default=40, help="Number of input records, -1 for all")
+    parser.add_argument("--report", default=None, help="Also write the sweep results to this JSON file")
+    parser.add_argument("--script-args", default="",
+                        help="Extra arguments passed to every script, e.g. \"--rpm 600\"")
+    add_mock_server_arguments(parser)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scripts.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCRIPTS]
+    if unknown:
+        parser.error(f"Unknown scripts: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    server = mock_server_from_args(args)
+    server.start()
+    print(f"🧪 Mock server on {server.base_url} "
+          f"({args.latency_dist} {args.latency_ms:.0f} ms, 429 rate {args.rate_limit_rate}, "
+          f"500 rate {args.server_error_rate})")
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="load_test_") as work_dir:
+        input_file = os.path.join(work_dir, "input.json")
+        items = write_sample(args.input, args.sample_size, input_file)
+        print(f"📊 {items} items per run, concurrency sweep {levels}")
+
+        for name in names:
+            for level in levels:
+                row = run_script(name, level, input_file, work_dir, server, args.script_args.split())
+                rows.append(row)
+                print(f"  {name} @ {level}: {row['seconds']:.1f}s, {row['completed']} requests, "
+                      f"{row['retries']} retries")
+
+    server.stop()
+    print_report(rows, items)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({"items": items, "runs": rows}, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Report saved to {args.report}")
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the chat completions API, for tuning concurrency and rate limits without spending money
+"""
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm.rate_limit import estimate_text_tokens, estimate_tokens
+
+LATENCY_DISTRIBUTIONS = ["fixed", "uniform", "lognormal"]
+
+# Characters per streamed chunk; the second half of the latency is spread over the chunks
+STREAM_CHUNK_CHARS = 24
+
+
+def mock_code_switch(ko_text: str, en_text: str) -> Dict[str, str]:
+    """Deterministic Case2/3/4 strings built from the words of the input pair"""
+    ko_words = ko_text.split() or [ko_text]
+    en_words = en_text.split() or [en_text]
+    half = len(en_words) // 2
+    return {
+        "Case2": " ".join([en_words[-1]] + ko_words[1:]),
+        "Case3": " ".join(en_words[:half] + ko_words[-(len(en_words) - half):]),
+        "Case4": " ".join(en_words[:-1] + [ko_words[0]]),
+    }
+
+
+def mock_typos(text: str) -> Dict:
+    """Deterministic typo record in the format generate_typos_with_gpt_improved.py expects"""
+    swap = lambda t, i: t[:i] + t[i + 1] + t[i] + t[i + 2:] if len(t) > i + 1 else t
+    return {
+        "original": text,
+        "substitution": {"1_error": text[:-1] + "ㅏ", "2_errors": "ㅓ" + text[1:-1] + "ㅏ"},
+        "deletion": {"1_error": text[:-1], "2_errors": text[1:-1]},
+        "insertion": {"1_error": text + text[-1:], "2_errors": text[:1] + text + text[-1:]},
+        "transposition": {"1_error": swap(text, len(text) - 2), "2_errors": swap(swap(text, len(text) - 2), 0)},
+        "spacing": {"1_error": text.replace(" ", "", 1), "2_errors": text.replace(" ", "", 2)},
+    }
+
+
+def mock_typo_scores(record: Dict) -> Dict:
+    """Deterministic naturalness scores: single typos rate higher than double ones"""
+    scores = {"id": record["id"]}
+    for error_type, variants in record.items():
+        if isinstance(variants, dict):
+            scores[error_type] = {key: {"natural": 4 if key == "1_error" else 3, "exact": text != record["original"]}
+                                  for key, text in variants.items()}
+    return scores
+
+
+def _between(text: str, start: str, end: str) -> str:
+    tail = text.split(start, 1)[1]
+    return tail.split(end, 1)[0] if end in tail else tail
+
+
+def canned_response(messages: List[Dict[str, str]], response_format: Optional[Dict] = None) -> str:
+    """Answer a request from one of the repo's GPT scripts in the format its parser expects"""
+    user = (messages[-1].get("content") or "") if messages else ""
+
+    # Fused refine + code-switching: keep the Korean and switch it
+    if "\nPairs:\n" in user:
+        items = json.loads(_between(user, "\nPairs:\n", "\nOutput:"))
+        return json.dumps([{"id": item["id"], "ko": item["ko"], **mock_code_switch(item["ko"], item["en"])}
+                           for item in items], ensure_ascii=False)
+
+    # Code-switching: multi-item, single-call and per-case prompts
+    if "\nInput:\n" in user:
+        items = json.loads(_between(user, "\nInput:\n", "\nOutput:"))
+        return json.dumps({item["id"]: mock_code_switch(item["ko"], item["en"]) for item in items},
+                          ensure_ascii=False)
+    if "Now generate:" in user:
+        pair = user.rsplit("Now generate:", 1)[1]
+        ko_text = _between(pair, "Korean original: ", "\n").strip()
+        en_text = _between(pair, "English original: ", "\n").strip()
+        cases = mock_code_switch(ko_text, en_text)
+        if response_format:
+            return json.dumps(cases, ensure_ascii=False)
+        if "keyword-level English" in user:
+            return cases["Case2"]
+        if "mixed structure" in user:
+            return cases["Case3"]
+        return cases["Case4"]
+
+    # Refinement: echo the en/ko pairs back unchanged
+    if "입력 데이터:\n" in user:
+        entries = json.loads(_between(user, "입력 데이터:\n", "\n\nJSON"))
+        return json.dumps(entries, ensure_ascii=False, indent=2)
+
+    # Hybrid typo mode: score locally generated variants
+    if "채점할 오타:\n" in user:
+        records = json.loads(_between(user, "채점할 오타:\n", "\n\nJSON"))
+        return json.dumps([mock_typo_scores(record) for record in records], ensure_ascii=False)
+
+    # GPT typo generation
+    if "입력 텍스트:\n" in user:
+        texts = json.loads(_between(user, "입력 텍스트:\n", "\n\n"))
+        return json.dumps([mock_typos(text) for text in texts], ensure_ascii=False)
+
+    return "OK"
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of a list, 0.0 when empty"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections under the bursts the async engine produces
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients cancel streamed answers by closing the connection
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockChatServer:
+    """Threaded HTTP server that mimics /v1/chat/completions, including rate-limit headers and injected errors"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 300.0, latency_dist: str = "lognormal", latency_sigma: float = 0.5,
+                 rate_limit_rate: float = 0.0, server_error_rate: float = 0.0,
+                 rpm: int = 10_000, tpm: int = 10_000_000, seed: int = 0):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_dist}")
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.rpm = rpm
+        self.tpm = tpm
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = deque()  # (timestamp, tokens) of requests accepted in the last minute
+        self.reset_stats()
+
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {"requests": 0, "completed": 0, "rate_limited": 0, "server_errors": 0,
+                           "prompt_tokens": 0, "completion_tokens": 0}
+            self._latencies = []
+
+    def stats(self) -> Dict:
+        """Counters plus server-side latency percentiles in milliseconds"""
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = list(self._latencies)
+        stats["p50_ms"] = percentile(latencies, 50)
+        stats["p99_ms"] = percentile(latencies, 99)
+        return stats
+
+    def sample_latency(self) -> float:
+        """Draw one response latency in seconds from the configured distribution"""
+        with self._lock:
+            if self.latency_dist == "fixed":
+                ms = self.latency_ms
+            elif self.latency_dist == "uniform":
+                ms = self._random.uniform(0, 2 * self.latency_ms)
+            else:
+                # latency_ms is the median; sigma controls the tail
+                ms = self._random.lognormvariate(math.log(max(self.latency_ms, 1e-3)), self.latency_sigma)
+        return ms / 1000
+
+    def admit(self, tokens: int):
+        """Decide the outcome of a request: returns (status, retry_after_seconds, rate-limit headers)"""
+        with self._lock:
+            self._stats["requests"] += 1
+            now = time.monotonic()
+            while self._window and now - self._window[0][0] >= 60:
+                self._window.popleft()
+            used_tokens = sum(t for _, t in self._window)
+            headers = {
+                "x-ratelimit-limit-requests": str(self.rpm),
+                "x-ratelimit-limit-tokens": str(self.tpm),
+                "x-ratelimit-remaining-requests": str(max(0, self.rpm - len(self._window) - 1)),
+                "x-ratelimit-remaining-tokens": str(max(0, self.tpm - used_tokens - tokens)),
+            }
+
+            over_quota = len(self._window) >= self.rpm or used_tokens + tokens > self.tpm
+            if over_quota or self._random.random() < self.rate_limit_rate:
+                self._stats["rate_limited"] += 1
+                retry_after = 60 - (now - self._window[0][0]) if over_quota and self._window else 0.5
+                return 429, retry_after, headers
+            if self._random.random() < self.server_error_rate:
+                self._stats["server_errors"] += 1
+                return 500, None, headers
+
+            self._window.append((now, tokens))
+            return 200, None, headers
+
+    def record(self, latency: float, prompt_tokens: int, completion_tokens: int) -> int:
+        """Count a completed request and return its sequence number"""
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["prompt_tokens"] += prompt_tokens
+            self._stats["completion_tokens"] += completion_tokens
+            self._latencies.append(latency * 1000)
+            return self._stats["completed"]
+
+    def start(self) -> str:
+        """Serve from a background thread and return the base URL for OPENAI_BASE_URL"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, self.server.mock.stats())
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        mock = self.server.mock
+        started = time.monotonic()
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+        if self.path.rstrip("/").endswith("/stats/reset"):
+            mock.reset_stats()
+            self._send_json(200, mock.stats())
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        messages = body.get("messages") or []
+        prompt_tokens = estimate_tokens(messages)
+        status, retry_after, headers = mock.admit(prompt_tokens + (body.get("max_tokens") or 0))
+        if status == 429:
+            headers["retry-after-ms"] = str(int(retry_after * 1000))
+            self._send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "requests",
+                                            "code": "rate_limit_exceeded"}}, headers)
+            return
+
+        latency = mock.sample_latency()
+        streaming = bool(body.get("stream"))
+        # A streamed answer starts halfway through the latency and trickles in over the rest
+        time.sleep(latency / 2 if streaming else latency)
+        if status == 500:
+            self._send_json(500, {"error": {"message": "The server had an error (mock)", "type": "server_error"}})
+            return
+
+        content = canned_response(messages, body.get("response_format"))
+        completion_tokens = estimate_text_tokens(content)
+        finish_reason = "stop"
+        max_tokens = body.get("max_tokens")
+        if max_tokens and completion_tokens > max_tokens:
+            # Cut the answer off like the real API does when max_tokens runs out
+            content = content[:len(content) * max_tokens // completion_tokens]
+            while estimate_text_tokens(content) > max_tokens:
+                content = content[:-1]
+            completion_tokens = estimate_text_tokens(content)
+            finish_reason = "length"
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens,
+                 "prompt_tokens_details": {"cached_tokens": 0}}
+        if streaming:
+            self._send_stream(body, content, finish_reason, usage, latency / 2, headers, started)
+            return
+        sequence = mock.record(time.monotonic() - started, prompt_tokens, completion_tokens)
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{sequence}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": finish_reason}],
+            "usage": usage,
+        }, headers)
+
+    def _send_stream(self, body: Dict, content: str, finish_reason: str, usage: Dict, duration: float,
+                     headers: Dict[str, str], started: float):
+        """Send the answer as server-sent chat.completion.chunk events over chunked transfer encoding"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+        base = {"id": "chatcmpl-mock-stream", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini")}
+        events = [{**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece},
+                                        "finish_reason": None}]} for piece in pieces]
+        events.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append({**base, "choices": [], "usage": usage})
+
+        try:
+            for event in events:
+                self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n")
+                if duration and len(pieces) > 1:
+                    time.sleep(duration / len(pieces))
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream early to cancel generation
+            self.close_connection = True
+        self.server.mock.record(time.monotonic() - started, usage["prompt_tokens"], usage["completion_tokens"])
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def add_mock_server_arguments(parser):
+    """Register the mock server options on an argparse parser"""
+    parser.add_argument("--latency-ms", type=float, default=300.0,
+                        help="Median response latency in milliseconds")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal",
+                        help="Latency distribution (uniform spans 0..2x the median)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                        help="Sigma of the lognormal latency distribution")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with an injected 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with an injected 500")
+    parser.add_argument("--mock-rpm", type=int, default=10_000,
+                        help="Requests per minute quota advertised and enforced by the mock")
+    parser.add_argument("--mock-tpm", type=int, default=10_000_000,
+                        help="Tokens per minute quota advertised and enforced by the mock")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latency and error injection")
+
+
+def mock_server_from_args(args, host: str = "127.0.0.1", port: int = 0) -> MockChatServer:
+    """Build a MockChatServer from parsed arguments"""
+    return MockChatServer(host=host, port=port, latency_ms=args.latency_ms, latency_dist=args.latency_dist,
+                          latency_sigma=args.latency_sigma, rate_limit_rate=args.rate_limit_rate,
+                          server_error_rate=args.server_error_rate, rpm=args.mock_rpm, tpm=args.mock_tpm,
+                          seed=args.seed)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local mock of the OpenAI chat completions API")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    add_mock_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = mock_server_from_args(args, host=args.host, port=args.port)
+    print(f"🧪 Mock OpenAI server on {server.base_url}")
+    print(f"   export OPENAI_BASE_URL={server.base_url} OPENAI_API_KEY=mock")
+    print(f"   Stats: GET {server.base_url}/stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+MinHash/LSH index over en/ko pairs already sent to GPT, so a template question ("who sings X" / "who sings Y")
+can reuse its nearest neighbour's answer, either as a few-shot example or by swapping the differing entity
+"""
+import random
+import re
+import zlib
+from collections import defaultdict
+from typing import Any, List, Optional, Tuple
+
+from llm.dedup import normalize_text
+
+# Prime modulus for the MinHash permutations (2^61 - 1)
+MERSENNE_PRIME = (1 << 61) - 1
+
+SHINGLE_CHARS = 3
+
+DEFAULT_NUM_PERM = 32
+DEFAULT_BANDS = 16
+DEFAULT_REUSE_THRESHOLD = 0.5
+
+# Most words the differing span of either side may have to count as an entity swap
+MAX_ENTITY_WORDS = 4
+
+# Particles that follow a Korean entity, longest first; stripped so "스릴러를" also replaces a bare "스릴러"
+KO_PARTICLES = ("이라는", "라는", "으로", "에서",
+                "은", "는", "이", "가", "을", "를", "의", "에", "와", "과", "도", "로")
+
+# English words that belong to the question template, never to a swapped entity
+TEMPLATE_WORDS = {"a", "an", "the", "is", "are", "was", "were", "do", "does", "did", "what", "who", "where", "when",
+                  "why", "how", "which", "of", "in", "on", "for", "to", "from", "name", "term", "phrase", "word"}
+
+
+def pair_text(ko: str, en: str) -> str:
+    return normalize_text(ko) + " | " + normalize_text(en)
+
+
+def shingles(text: str, size: int = SHINGLE_CHARS) -> frozenset:
+    """Character n-grams of text; texts shorter than size are one shingle"""
+    if len(text) <= size:
+        return frozenset([text])
+    return frozenset(text[i:i + size] for i in range(len(text) - size + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHashIndex:
+    """Locality-sensitive index of shingle sets; candidates sharing an LSH band are ranked by exact Jaccard"""
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, bands: int = DEFAULT_BANDS,
+                 threshold: float = DEFAULT_REUSE_THRESHOLD, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(MERSENNE_PRIME)) for _ in range(num_perm)]
+        self._rows = num_perm // bands
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+        self._shingles = []
+        self._payloads = []
+        self.threshold = threshold
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def _bands(self, items: frozenset) -> List[Tuple[int, ...]]:
+        hashes = [zlib.crc32(item.encode("utf-8")) for item in items]
+        signature = [min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self._perms]
+        return [tuple(signature[i:i + self._rows]) for i in range(0, len(signature), self._rows)]
+
+    def add(self, text: str, payload: Any):
+        items = shingles(text)
+        key = len(self._payloads)
+        self._shingles.append(items)
+        self._payloads.append(payload)
+        for bucket, band in zip(self._buckets, self._bands(items)):
+            bucket[band].append(key)
+
+    def nearest(self, text: str) -> Optional[Tuple[float, Any]]:
+        """(similarity, payload) of the most similar indexed text at or above the threshold, or None"""
+        items = shingles(text)
+        candidates = {key for bucket, band in zip(self._buckets, self._bands(items)) for key in bucket.get(band, ())}
+        best = max(((jaccard(items, self._shingles[key]), -key) for key in candidates), default=None)
+        if best is None or best[0] < self.threshold:
+            return None
+        return best[0], self._payloads[-best[1]]
+
+
+def differing_span(old: str, new: str, word_suffix: bool = True) -> Optional[Tuple[str, str]]:
+    """The spans left after removing the common prefix and suffix of two texts, cut at word starts.
+
+    With word_suffix the spans also end at a word boundary; otherwise a shared particle may follow them.
+    Returns None when the texts are equal or either span is empty.
+    """
+    if old == new:
+        return None
+    prefix = 0
+    while prefix < min(len(old), len(new)) and old[prefix] == new[prefix]:
+        prefix += 1
+    while prefix and not old[prefix - 1].isspace():
+        prefix -= 1
+
+    suffix = 0
+    while suffix < min(len(old), len(new)) - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    if word_suffix:
+        while suffix and old[len(old) - suffix].isalnum():
+            suffix -= 1
+
+    old_span = old[prefix:len(old) - suffix].strip()
+    new_span = new[prefix:len(new) - suffix].strip()
+    if not old_span or not new_span:
+        return None
+    return old_span, new_span
+
+
+def strip_particle(word: str) -> str:
+    for particle in KO_PARTICLES:
+        if len(word) > len(particle) and word.endswith(particle):
+            return word[:-len(particle)]
+    return word
+
+
+def entity_replacements(old_ko: str, old_en: str, new_ko: str, new_en: str) -> Optional[List[Tuple[str, str]]]:
+    """(old, new) replacements turning one pair into the other when they differ in one short span per side.
+
+    A pair identical up to case, width and punctuation needs no replacement. Returns None when the pairs
+    differ in more than an entity.
+    """
+    if pair_text(old_ko, old_en) == pair_text(new_ko, new_en):
+        return []
+    en = differing_span(old_en, new_en)
+    ko = differing_span(old_ko, new_ko, word_suffix=False)
+    if en is None or ko is None or en[0].casefold() == ko[0].casefold():
+        return None
+    for old_span, new_span in (en, ko):
+        if max(len(old_span.split()), len(new_span.split())) > MAX_ENTITY_WORDS:
+            return None
+    en_words = [set(span.casefold().split()) for span in en]
+    if en_words[0] & en_words[1] or (en_words[0] | en_words[1]) & TEMPLATE_WORDS:
+        return None
+    # The shared template must outweigh the entity on both sides
+    if len(en[0]) * 2 > len(old_en) or len(ko[0]) * 2 > len(old_ko):
+        return None
+
+    replacements = [en, ko]
+    bare = (strip_particle(ko[0]), strip_particle(ko[1]))
+    if bare != ko:
+        replacements.append(bare)
+    return replacements
+
+
+def substitute(text: str, replacements: List[Tuple[str, str]]) -> Optional[str]:
+    """Apply the replacements in one pass, or None if the text contains none of the old spans.
+
+    Matching is case-insensitive for Latin text and keeps a capitalised match capitalised; longer spans win.
+    """
+    if not replacements:
+        return text
+    spans = {old.casefold(): new for old, new in replacements}
+    pattern = re.compile("|".join(re.escape(old) for old in sorted(spans, key=len, reverse=True)), re.IGNORECASE)
+
+    def replace(match):
+        new = spans[match.group(0).casefold()]
+        return new[:1].upper() + new[1:] if match.group(0)[:1].isupper() else new
+
+    result, count = pattern.subn(replace, text)
+    return result if count else None
+
+
+def add_reuse_arguments(parser, default_source: Optional[str] = None):
+    """Register the near-duplicate reuse options on an argparse parser"""
+    parser.add_argument("--reuse", action="store_true",
+                        help="Give each input its most similar earlier pair's answer as an extra few-shot example")
+    parser.add_argument("--reuse-source", type=str, nargs="*", default=[default_source] if default_source else [],
+                        help="Earlier outputs indexed for --reuse, in addition to the pairs answered in this run")
+    parser.add_argument("--reuse-threshold", type=float, default=DEFAULT_REUSE_THRESHOLD,
+                        help="Minimum shingle Jaccard similarity for a pair to count as a near duplicate")
+    parser.add_argument("--entity-swap", action="store_true",
+                        help="With --reuse, skip GPT when a near duplicate differs only in one entity and "
+                             "substitute that entity in its answer")
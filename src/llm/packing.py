@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Pack items into batches by estimated output tokens instead of a fixed item count
+"""
+from typing import Any, Callable, List, Sequence, Tuple
+
+# Share of max_tokens a packed batch aims to fill, leaving headroom for estimation error
+DEFAULT_BUDGET_SHARE = 0.8
+
+# Upper bound on items in one packed batch, so a run of very short items stays a reviewable request
+DEFAULT_MAX_BATCH_ITEMS = 50
+
+
+def fixed_spans(count: int, batch_size: int) -> List[Tuple[int, int]]:
+    """(start, end) spans of batch_size items, end exclusive"""
+    return [(start, min(start + batch_size, count)) for start in range(0, count, batch_size)]
+
+
+def pack_spans(items: Sequence[Any], output_tokens: Callable[[Any], int], budget: int,
+               max_items: int) -> List[Tuple[int, int]]:
+    """Greedily group consecutive items while their estimated output fits the token budget.
+
+    A batch holds at most max_items items; an item estimated above the budget gets a batch of its own.
+    Spans are (start, end), end exclusive, and keep the input order.
+    """
+    spans = []
+    start = 0
+    used = 0
+    for idx, item in enumerate(items):
+        tokens = output_tokens(item)
+        if idx > start and (used + tokens > budget or idx - start >= max_items):
+            spans.append((start, idx))
+            start, used = idx, 0
+        used += tokens
+    if start < len(items):
+        spans.append((start, len(items)))
+    return spans
+
+
+def batch_spans(items: Sequence[Any], batch_size: int, output_tokens: Callable[[Any], int],
+                budget: int, max_items: int = DEFAULT_MAX_BATCH_ITEMS) -> List[Tuple[int, int]]:
+    """Token-budget spans of up to max_items items, or fixed batch_size spans when the budget is 0"""
+    if budget <= 0:
+        return fixed_spans(len(items), batch_size)
+    return pack_spans(items, output_tokens, budget, max_items)
+
+
+def halves(items: List[Any]) -> Tuple[List[Any], List[Any]]:
+    """Split a batch in two for a retry after a truncated answer"""
+    mid = (len(items) + 1) // 2
+    return items[:mid], items[mid:]
+
+
+def add_packing_arguments(parser, max_tokens: int):
+    """Register the token-budget packing options on an argparse parser; packing is off unless asked for"""
+    default_budget = int(max_tokens * DEFAULT_BUDGET_SHARE)
+    parser.add_argument("--token-budget", type=int, nargs="?", const=default_budget, default=0,
+                        help=f"Pack batches up to this many estimated output tokens instead of --batch-size items "
+                             f"(without a value: {default_budget}, 80%% of max_tokens {max_tokens}); "
+                             f"by default batches hold --batch-size items")
+    parser.add_argument("--max-batch-items", type=int, default=DEFAULT_MAX_BATCH_ITEMS,
+                        help="Most items in one packed batch")
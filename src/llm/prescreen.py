@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Flag the en/ko pairs whose Korean needs GPT refinement, so clean translations skip the API entirely
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+# A question that stops on a bare jamo, a one-syllable fragment or a particle was cut off mid-word
+TRAILING_JAMO = re.compile(r"[ㄱ-ㆎ]$")
+TRAILING_PARTICLES = ("을", "를", "에", "의", "에서", "에게", "으로", "부터", "까지", "하고")
+# One-syllable words that legitimately end a query ("설명해 줘", "이거 뭐", "알아야 할 모든 것")
+FINAL_SYLLABLE_WORDS = {"줘", "돼", "뭐", "뭘", "왜", "요", "죠", "다", "야", "지", "까",
+                        "것", "곳", "뜻", "끝"}
+
+LATIN = re.compile(r"[A-Za-z]")
+
+DEFAULT_MIN_HANGUL_RATIO = 0.5
+DEFAULT_MIN_LENGTH_RATIO = 0.15
+DEFAULT_MAX_LENGTH_RATIO = 1.5
+
+REASONS = ("empty", "latin", "truncated", "low_hangul", "length_ratio")
+
+
+def is_hangul(c: str) -> bool:
+    return "가" <= c <= "힣" or "ㄱ" <= c <= "ㆎ"
+
+
+def looks_truncated(ko: str) -> bool:
+    """Korean that ends on a bare jamo, a stray one-syllable word or a dangling particle"""
+    words = ko.rstrip(" .?!").split()
+    if not words:
+        return False
+    last = words[-1]
+    if TRAILING_JAMO.search(last):
+        return True
+    if len(words) > 1 and len(last) == 1 and is_hangul(last) and last not in FINAL_SYLLABLE_WORDS:
+        return True
+    return len(last) > 2 and last.endswith(TRAILING_PARTICLES)
+
+
+class PairScreen:
+    """Local checks that decide whether an en/ko pair needs GPT refinement"""
+
+    def __init__(self, min_hangul_ratio: float = DEFAULT_MIN_HANGUL_RATIO,
+                 min_length_ratio: float = DEFAULT_MIN_LENGTH_RATIO,
+                 max_length_ratio: float = DEFAULT_MAX_LENGTH_RATIO):
+        self.min_hangul_ratio = min_hangul_ratio
+        self.min_length_ratio = min_length_ratio
+        self.max_length_ratio = max_length_ratio
+
+    @property
+    def settings(self) -> Dict:
+        return {"min_hangul_ratio": self.min_hangul_ratio, "min_length_ratio": self.min_length_ratio,
+                "max_length_ratio": self.max_length_ratio}
+
+    def reasons(self, entry: Dict) -> List[str]:
+        """Why a pair needs refinement; an empty list means it can pass through untouched"""
+        ko = (entry.get("ko") or "").strip()
+        if not ko:
+            return ["empty"]
+
+        reasons = []
+        if LATIN.search(ko):
+            reasons.append("latin")
+        if looks_truncated(ko):
+            reasons.append("truncated")
+
+        # Ratios over non-space characters, so spacing differences do not count
+        chars = ko.replace(" ", "")
+        if sum(1 for c in chars if is_hangul(c)) < self.min_hangul_ratio * len(chars):
+            reasons.append("low_hangul")
+        en_chars = len((entry.get("en") or "").replace(" ", ""))
+        if en_chars and not self.min_length_ratio <= len(chars) / en_chars <= self.max_length_ratio:
+            reasons.append("length_ratio")
+        return reasons
+
+
+class ScreenReport:
+    """Counts of screened entries by outcome and reason"""
+
+    def __init__(self):
+        self.total = 0
+        self.flagged = 0
+        self.reasons = Counter()
+        self.calls_before = 0
+        self.calls_after = 0
+
+    def add(self, reasons: List[str]):
+        self.total += 1
+        if reasons:
+            self.flagged += 1
+            self.reasons.update(reasons)
+
+    @property
+    def passed(self) -> int:
+        return self.total - self.flagged
+
+    def summary(self) -> str:
+        reasons = ", ".join(f"{reason} {self.reasons[reason]}" for reason in REASONS if self.reasons[reason])
+        return (f"Pre-screen: {self.flagged} of {self.total} entries need refinement ({reasons or 'none'}), "
+                f"{self.passed} passed through; {self.calls_before - self.calls_after} of "
+                f"{self.calls_before} API calls avoided")
+
+    def to_dict(self) -> Dict:
+        return {"total": self.total, "flagged": self.flagged, "passed": self.passed,
+                "reasons": {reason: self.reasons[reason] for reason in REASONS},
+                "calls_without_prescreen": self.calls_before, "calls_with_prescreen": self.calls_after,
+                "calls_avoided": self.calls_before - self.calls_after}
+
+
+def add_prescreen_arguments(parser):
+    """Register the shared pre-screen options on an argparse parser"""
+    parser.add_argument("--no-prescreen", action="store_true",
+                        help="Send every pair to GPT instead of only those the local checks flag")
+    parser.add_argument("--min-hangul-ratio", type=float, default=DEFAULT_MIN_HANGUL_RATIO,
+                        help="Flag Korean whose share of Hangul characters is below this")
+    parser.add_argument("--length-ratio", type=float, nargs=2, metavar=("MIN", "MAX"),
+                        default=[DEFAULT_MIN_LENGTH_RATIO, DEFAULT_MAX_LENGTH_RATIO],
+                        help="Flag Korean whose length relative to the English is outside this range")
+
+
+def screen_from_args(args) -> Optional[PairScreen]:
+    """Build the pair screen from parsed arguments, or None with --no-prescreen"""
+    if args.no_prescreen:
+        return None
+    return PairScreen(min_hangul_ratio=args.min_hangul_ratio, min_length_ratio=args.length_ratio[0],
+                      max_length_ratio=args.length_ratio[1])
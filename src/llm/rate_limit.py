@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Adaptive token-bucket rate limiter shared by all GPT calls in a process
+"""
+import asyncio
+import math
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+
+DEFAULT_RPM = 500
+DEFAULT_TPM = 200_000
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset durations such as '1s', '6m0s' or '20ms' into seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Rough token count for a string: ~4 ASCII chars or ~1 Hangul syllable per token"""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int = 0) -> int:
+    """Rough token count for a request, including per-message overhead"""
+    total = 0
+    for message in messages:
+        total += estimate_text_tokens(message.get("content") or "") + 4
+    return total + max_tokens
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RateLimiter:
+    """Enforce requests/minute and tokens/minute budgets, adapting to 429s and rate-limit headers"""
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 burst_seconds: float = 10.0, min_factor: float = 0.1):
+        # Explicit limits act as a ceiling; otherwise start conservative and learn from headers
+        self.rpm_ceiling = rpm or math.inf
+        self.tpm_ceiling = tpm or math.inf
+        self.rpm = rpm or DEFAULT_RPM
+        self.tpm = tpm or DEFAULT_TPM
+        self.burst_seconds = burst_seconds
+        self.min_factor = min_factor
+        self.factor = 1.0
+        self.throttled = 0
+
+        self._lock = threading.Lock()
+        self._last = time.monotonic()
+        self._pause_until = 0.0
+        self._last_decrease = 0.0
+        self._requests = self._request_capacity()
+        self._tokens = self._token_capacity()
+
+    def _request_capacity(self) -> float:
+        return max(1.0, self.rpm * self.factor * self.burst_seconds / 60)
+
+    def _token_capacity(self) -> float:
+        return max(1.0, self.tpm * self.factor * self.burst_seconds / 60)
+
+    def _refill(self, now: float):
+        elapsed = now - self._last
+        self._last = now
+        self._requests = min(self._request_capacity(), self._requests + elapsed * self.rpm * self.factor / 60)
+        self._tokens = min(self._token_capacity(), self._tokens + elapsed * self.tpm * self.factor / 60)
+
+    def _take(self, tokens: int) -> Tuple[float, float]:
+        """Take budget for one request; returns (seconds to wait before sending it, tokens taken)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # A request larger than the bucket only takes the whole bucket, or it could never be sent
+            reserved = min(tokens, self._token_capacity())
+            self._requests -= 1
+            self._tokens -= reserved
+
+            wait = max(0.0, self._pause_until - now)
+            if self._requests < 0:
+                wait = max(wait, -self._requests * 60 / (self.rpm * self.factor))
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens * 60 / (self.tpm * self.factor))
+            return wait, reserved
+
+    def reserve(self, tokens: int) -> float:
+        """Take budget for one request now and return how long the caller must wait before sending it"""
+        return self._take(tokens)[0]
+
+    def acquire(self, tokens: int) -> float:
+        """Block the calling thread until the request fits in the budget; returns the tokens taken for it"""
+        wait, reserved = self._take(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return reserved
+
+    async def acquire_async(self, tokens: int) -> float:
+        """Suspend the calling coroutine until the request fits in the budget; returns the tokens taken for it"""
+        wait, reserved = self._take(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return reserved
+
+    def record_usage(self, reserved: float, actual: int):
+        """Correct the token bucket once the real usage of a request is known.
+
+        reserved is what acquire took for the request, which is less than the estimate when that exceeded
+        the bucket; only the difference to what was really taken is given back.
+        """
+        with self._lock:
+            self._tokens = min(self._token_capacity(), self._tokens + reserved - actual)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Adopt the server's view of our quota from x-ratelimit-* response headers"""
+        def header_number(name):
+            try:
+                return float(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        limit_requests = header_number("x-ratelimit-limit-requests")
+        limit_tokens = header_number("x-ratelimit-limit-tokens")
+        remaining_requests = header_number("x-ratelimit-remaining-requests")
+        remaining_tokens = header_number("x-ratelimit-remaining-tokens")
+
+        with self._lock:
+            if limit_requests:
+                self.rpm = min(limit_requests, self.rpm_ceiling)
+            if limit_tokens:
+                self.tpm = min(limit_tokens, self.tpm_ceiling)
+            if remaining_requests is not None:
+                self._requests = min(self._requests, remaining_requests)
+            if remaining_tokens is not None:
+                self._tokens = min(self._tokens, remaining_tokens)
+
+    def on_success(self):
+        """Additively recover throughput after a successful request"""
+        with self._lock:
+            self.factor = min(1.0, self.factor + 0.01)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """Halve throughput and pause all callers after a 429"""
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            # Concurrent requests from one burst all fail together; count them as one signal
+            if now - self._last_decrease > 1.0:
+                self.factor = max(self.min_factor, self.factor * 0.5)
+                self._last_decrease = now
+            pause = retry_after if retry_after is not None else backoff_delay(self.throttled, cap=10.0)
+            self._pause_until = max(self._pause_until, now + pause + random.uniform(0, 0.5))
+            self._requests = min(self._requests, 0.0)
+
+    def summary(self) -> str:
+        return (f"Rate limiter: {self.rpm:.0f} RPM / {self.tpm:.0f} TPM, "
+                f"throughput factor {self.factor:.2f}, {self.throttled} rate-limited responses")
+
+
+def retry_after_from_headers(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Read the server-suggested wait from retry-after style headers"""
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = parse_duration(headers.get("retry-after"))
+    return min(retry_after, 60.0) if retry_after is not None else None
+
+
+def add_rate_limit_arguments(parser):
+    """Register the shared rate limit options on an argparse parser"""
+    parser.add_argument("--rpm", type=int, default=None,
+                        help=f"Requests per minute ceiling (default: learn from headers, starting at {DEFAULT_RPM})")
+    parser.add_argument("--tpm", type=int, default=None,
+                        help=f"Tokens per minute ceiling (default: learn from headers, starting at {DEFAULT_TPM})")
+    parser.add_argument("--max-retries", type=int, default=5,
+                        help="Retries per request on 429, 5xx and connection errors")
+
+
+def limiter_from_args(args) -> RateLimiter:
+    """Build a RateLimiter from parsed arguments"""
+    return RateLimiter(rpm=args.rpm, tpm=args.tpm)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Bounded producer/consumer scheduling: pull work lazily, cap what is queued and release results in input order
+"""
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Units allowed past the oldest unfinished one, per worker
+WINDOW_PER_WORKER = 4
+
+
+class ReorderBuffer:
+    """Hold out-of-order completions until every earlier sequence number has arrived"""
+
+    def __init__(self):
+        self.next_seq = 0
+        self._pending: Dict[int, Any] = {}
+
+    def add(self, seq: int, value: Any) -> List[Any]:
+        """Store a completion and return the values that can now be released in order"""
+        self._pending[seq] = value
+        ready = []
+        while self.next_seq in self._pending:
+            ready.append(self._pending.pop(self.next_seq))
+            self.next_seq += 1
+        return ready
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+def window_for(concurrency: int, max_pending: Optional[int] = None) -> int:
+    """Number of units that may be queued, running or waiting for release at once"""
+    return max(concurrency, max_pending or WINDOW_PER_WORKER * concurrency)
+
+
+def iter_ordered(worker: Callable[[Any], Any], units: Iterable[Any], max_workers: int,
+                 max_pending: Optional[int] = None) -> Iterator[Tuple[Any, Future]]:
+    """Run worker(unit) on a thread pool and yield (unit, finished future) in input order.
+
+    Units are pulled from the iterable only when a slot opens, and no unit more than the window past the
+    oldest unreleased one is started, so memory grows with concurrency rather than with the input.
+    """
+    window = window_for(max_workers, max_pending)
+    units = iter(units)
+    reorder = ReorderBuffer()
+    in_flight: Dict[Future, Tuple[int, Any]] = {}
+    next_seq = 0
+    exhausted = False
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            # Backpressure: only read more input while the window has room
+            while not exhausted and next_seq < reorder.next_seq + window:
+                try:
+                    unit = next(units)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight[executor.submit(worker, unit)] = (next_seq, unit)
+                next_seq += 1
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                seq, unit = in_flight.pop(future)
+                yield from reorder.add(seq, (unit, future))
+    finally:
+        # Stopping early drops work that has not started yet
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def aiter_ordered(worker: Callable[[Any], Awaitable[Any]], units: Iterable[Any], concurrency: int,
+                        max_pending: Optional[int] = None) -> AsyncIterator[Tuple[Any, asyncio.Task]]:
+    """Async version of iter_ordered: at most the window of worker(unit) tasks exist at once"""
+    window = window_for(concurrency, max_pending)
+    units = iter(units)
+    reorder = ReorderBuffer()
+    in_flight: Dict[asyncio.Task, Tuple[int, Any]] = {}
+    next_seq = 0
+    exhausted = False
+
+    try:
+        while True:
+            while not exhausted and next_seq < reorder.next_seq + window:
+                try:
+                    unit = next(units)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight[asyncio.ensure_future(worker(unit))] = (next_seq, unit)
+                next_seq += 1
+
+            if not in_flight:
+                break
+
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                seq, unit = in_flight.pop(task)
+                for ready in reorder.add(seq, (unit, task)):
+                    yield ready
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+
+def add_scheduler_arguments(parser):
+    """Register the shared scheduling option on an argparse parser"""
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help=f"Work units queued or awaiting in-order release at once "
+                             f"(default: {WINDOW_PER_WORKER}x the concurrency)")
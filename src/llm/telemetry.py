@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Per-request token, latency, retry and cost telemetry for GPT calls, exported as JSON or Prometheus text
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4": (30.00, 30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+}
+
+_COUNTERS = ["requests", "errors", "cache_hits", "retries", "prompt_tokens", "cached_tokens",
+             "completion_tokens", "latency_seconds"]
+
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of the given usage; unknown models cost 0"""
+    input_price, cached_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0, 0.0))
+    return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + completion_tokens * output_price) / 1_000_000
+
+
+class Telemetry:
+    """Thread-safe counters for every chat completion of one script, tagged by model and request type"""
+
+    def __init__(self, script: str, metrics_file: Optional[str] = None, interval: float = 10.0,
+                 window_seconds: float = 60.0, max_latencies: int = 10_000):
+        self.script = script
+        self.metrics_file = metrics_file
+        self.interval = interval
+        self.window_seconds = window_seconds
+        self.in_flight = 0
+
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._series = {}  # (model, tag) -> counters
+        self._recent = deque()  # (timestamp, tokens) of requests finished inside the window
+        self._latencies = deque(maxlen=max_latencies)
+        self._stop = threading.Event()
+        self._thread = None
+
+        if metrics_file:
+            if os.path.dirname(metrics_file):
+                os.makedirs(os.path.dirname(metrics_file), exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+            self._thread.start()
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, model: str, tag: str, latency: float, retries: int = 0,
+                         usage=None, cache_hit: bool = False, error: bool = False):
+        """Record one finished call; usage is the response.usage object, or None"""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+
+        with self._lock:
+            self.in_flight -= 1
+            series = self._series.setdefault((model, tag), dict.fromkeys(_COUNTERS, 0))
+            series["requests"] += 1
+            series["errors"] += int(error)
+            series["cache_hits"] += int(cache_hit)
+            series["retries"] += retries
+            series["prompt_tokens"] += prompt_tokens
+            series["cached_tokens"] += cached_tokens
+            series["completion_tokens"] += completion_tokens
+            series["latency_seconds"] += latency
+            if not cache_hit:
+                self._latencies.append(latency)
+
+            now = time.monotonic()
+            self._recent.append((now, prompt_tokens + completion_tokens))
+            while self._recent and now - self._recent[0][0] > self.window_seconds:
+                self._recent.popleft()
+
+    def snapshot(self) -> Dict:
+        """Totals, live rates and per-(model, tag) breakdown"""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = max(now - self._started, 1e-9)
+            recent = [(t, tokens) for t, tokens in self._recent if now - t <= self.window_seconds]
+            window = max(min(self.window_seconds, elapsed), 1e-9)
+            latencies = sorted(self._latencies)
+            series = [{"model": model, "tag": tag, **counters}
+                      for (model, tag), counters in sorted(self._series.items())]
+            in_flight = self.in_flight
+
+        totals = dict.fromkeys(_COUNTERS, 0)
+        cost = 0.0
+        for row in series:
+            for name in _COUNTERS:
+                totals[name] += row[name]
+            row["estimated_cost_usd"] = estimate_cost(row["model"], row["prompt_tokens"],
+                                                      row["cached_tokens"], row["completion_tokens"])
+            cost += row["estimated_cost_usd"]
+
+        def quantile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+
+        return {
+            "script": self.script,
+            "elapsed_seconds": elapsed,
+            "in_flight": in_flight,
+            "requests_per_second": len(recent) / window,
+            "tokens_per_second": sum(tokens for _, tokens in recent) / window,
+            "latency_p50_seconds": quantile(0.5),
+            "latency_p99_seconds": quantile(0.99),
+            "estimated_cost_usd": cost,
+            "totals": totals,
+            "series": series,
+        }
+
+    def to_prometheus(self, snapshot: Optional[Dict] = None) -> str:
+        """Render a snapshot in the Prometheus text exposition format"""
+        snapshot = snapshot or self.snapshot()
+        script = snapshot["script"]
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in [("script", script)] + labels)
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        counters = [
+            ("llm_requests_total", "requests", "Chat completion calls"),
+            ("llm_errors_total", "errors", "Calls that failed after all retries"),
+            ("llm_cache_hits_total", "cache_hits", "Calls served from the response cache"),
+            ("llm_retries_total", "retries", "Retries after 429, 5xx or connection errors"),
+            ("llm_prompt_tokens_total", "prompt_tokens", "Prompt tokens"),
+            ("llm_cached_tokens_total", "cached_tokens", "Prompt tokens served from the prompt cache"),
+            ("llm_completion_tokens_total", "completion_tokens", "Completion tokens"),
+            ("llm_request_seconds_total", "latency_seconds", "Wall time spent in calls, including retries"),
+        ]
+        for name, key, help_text in counters:
+            metric(name, "counter", help_text,
+                   [([("model", row["model"]), ("tag", row["tag"])], row[key]) for row in snapshot["series"]])
+
+        metric("llm_in_flight_requests", "gauge", "Calls currently in progress", [([], snapshot["in_flight"])])
+        metric("llm_requests_per_second", "gauge", "Calls finished per second over the recent window",
+               [([], round(snapshot["requests_per_second"], 3))])
+        metric("llm_tokens_per_second", "gauge", "Tokens per second over the recent window",
+               [([], round(snapshot["tokens_per_second"], 3))])
+        metric("llm_request_latency_seconds", "gauge", "Call latency quantiles, excluding cache hits",
+               [([("quantile", "0.5")], round(snapshot["latency_p50_seconds"], 4)),
+                ([("quantile", "0.99")], round(snapshot["latency_p99_seconds"], 4))])
+        metric("llm_estimated_cost_usd", "gauge", "Estimated spend from token usage",
+               [([], round(snapshot["estimated_cost_usd"], 6))])
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Atomically rewrite the metrics file; .prom files get Prometheus text, others JSON"""
+        if not self.metrics_file:
+            return
+        snapshot = self.snapshot()
+        if self.metrics_file.endswith(".prom"):
+            text = self.to_prometheus(snapshot)
+        else:
+            text = json.dumps(snapshot, ensure_ascii=False, indent=2)
+        tmp_path = self.metrics_file + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, self.metrics_file)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def close(self):
+        """Stop the background writer and write the final metrics"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
+
+    def summary(self) -> str:
+        snapshot = self.snapshot()
+        totals = snapshot["totals"]
+        calls = totals["requests"] - totals["cache_hits"]
+        avg_latency = totals["latency_seconds"] / calls if calls else 0.0
+        return (f"Telemetry: {totals['requests']} calls ({totals['cache_hits']} cached, {totals['retries']} retries, "
+                f"{totals['errors']} errors), {totals['prompt_tokens']} prompt / {totals['cached_tokens']} cached / "
+                f"{totals['completion_tokens']} completion tokens, avg {avg_latency:.2f}s, "
+                f"p99 {snapshot['latency_p99_seconds']:.2f}s, ~${snapshot['estimated_cost_usd']:.4f}")
+
+
+def add_telemetry_arguments(parser):
+    """Register the shared telemetry options on an argparse parser"""
+    parser.add_argument("--metrics-file", type=str, default=None,
+                        help="Periodically write live LLM metrics here (.prom for Prometheus text, otherwise JSON)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="Seconds between metrics file updates")
+
+
+def telemetry_from_args(args, script: str) -> Telemetry:
+    """Build a Telemetry recorder from parsed arguments"""
+    return Telemetry(script, metrics_file=args.metrics_file, interval=args.metrics_interval)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+SQLite work queue shared by several worker processes: units of one job are claimed under expiring leases,
+so a long GPT run can be split across processes or machines and a crashed worker's units are taken over
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Seconds a writer waits for another process's transaction before giving up
+BUSY_TIMEOUT = 60
+
+
+def job_fingerprint(job: Any) -> str:
+    """Hash of everything that defines a job's units, so workers started with other inputs are refused"""
+    encoded = json.dumps(job, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """Units 0..n-1 of one job in a SQLite file, each pending, leased, done or failed.
+
+    A worker claims a unit by leasing it for lease_seconds; a heartbeat thread renews the leases this worker
+    holds, so a lease only runs out when its worker has died. Expired leases are claimed again like pending
+    units, up to max_attempts claims per unit. Finished units keep their records for the final output.
+    """
+
+    def __init__(self, db_path: str, worker_id: Optional[str] = None, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, journal_mode: str = "wal"):
+        self.db_path = db_path
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.completed = 0
+        self.reclaimed = 0
+        self._lock = threading.Lock()
+        self._heartbeat = None
+        self._stop = threading.Event()
+        self._final_counts = {}
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Transactions are opened explicitly so a claim can take the write lock before it reads
+        self._conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode.upper()}")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS units (
+                   key INTEGER PRIMARY KEY,
+                   status TEXT NOT NULL DEFAULT 'pending',
+                   owner TEXT,
+                   lease_expires REAL,
+                   attempts INTEGER NOT NULL DEFAULT 0,
+                   error TEXT,
+                   result TEXT
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON units(status)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS job (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _transaction(self, body):
+        """Run body() inside BEGIN IMMEDIATE, holding the database write lock for its whole duration"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = body()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def prepare(self, num_units: int, fingerprint: str):
+        """Create the job's units on first use; raises ValueError if the file already holds a different job"""
+        def body():
+            row = self._conn.execute("SELECT value FROM job WHERE name = 'fingerprint'").fetchone()
+            if row is None:
+                self._conn.execute("INSERT INTO job (name, value) VALUES ('fingerprint', ?)", (fingerprint,))
+                self._conn.executemany("INSERT INTO units (key) VALUES (?)", ((key,) for key in range(num_units)))
+            elif row[0] != fingerprint:
+                raise ValueError(f"{self.db_path} holds the units of a different job "
+                                 f"(other input, batch size or options); start it with a new --queue file")
+        self._transaction(body)
+
+    def claim(self) -> Optional[int]:
+        """Lease the next pending or expired unit to this worker; None when nothing can be claimed right now"""
+        def body():
+            now = time.time()
+            # A unit whose worker died max_attempts times is given up rather than crashing more workers
+            self._conn.execute(
+                "UPDATE units SET status = 'failed', owner = NULL, error = 'lease expired' "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, self.max_attempts))
+            row = self._conn.execute(
+                "SELECT key, status FROM units WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY key LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE units SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE key = ?", (self.worker_id, now + self.lease_seconds, row[0]))
+            if row[1] == "leased":
+                self.reclaimed += 1
+            return row[0]
+
+        key = self._transaction(body)
+        if key is not None:
+            self._start_heartbeat()
+        return key
+
+    def complete(self, key: int, records: List[Dict]):
+        """Store a unit's records; the first worker to finish a unit wins if its lease was taken over"""
+        def body():
+            cursor = self._conn.execute(
+                "UPDATE units SET status = 'done', owner = NULL, lease_expires = NULL, error = NULL, result = ? "
+                "WHERE key = ? AND status != 'done'", (json.dumps(records, ensure_ascii=False), key))
+            self.completed += cursor.rowcount
+        self._transaction(body)
+
+    def fail(self, key: int, error: str):
+        """Give a unit back after an error: pending again, or failed once it has used up its attempts"""
+        def body():
+            self._conn.execute(
+                "UPDATE units SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "owner = NULL, lease_expires = NULL, error = ? WHERE key = ? AND owner = ? AND status = 'leased'",
+                (self.max_attempts, error, key, self.worker_id))
+        self._transaction(body)
+
+    def renew(self) -> int:
+        """Extend every lease this worker holds; returns how many were renewed"""
+        def body():
+            return self._conn.execute(
+                "UPDATE units SET lease_expires = ? WHERE owner = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, self.worker_id)).rowcount
+        return self._transaction(body)
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is not None:
+                return
+            self._heartbeat = threading.Thread(target=self._beat, name="queue-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _beat(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                self.renew()
+            except sqlite3.Error as e:
+                print(f"⚠️  Could not renew queue leases: {e}")
+
+    def counts(self) -> Dict[str, int]:
+        """Number of units per status; after close, the numbers at the time of closing"""
+        if self._conn is None:
+            return dict(self._final_counts)
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def done_keys(self) -> List[int]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT key FROM units WHERE status = 'done'")]
+
+    def finished(self) -> bool:
+        """Whether every unit is done or failed, so no worker will add more records"""
+        counts = self.counts()
+        return counts["pending"] == 0 and counts["leased"] == 0
+
+    def records(self) -> List[Dict]:
+        """Records of every finished unit, in unit order"""
+        with self._lock:
+            rows = self._conn.execute("SELECT result FROM units WHERE status = 'done' ORDER BY key").fetchall()
+        return [record for row in rows for record in json.loads(row[0])]
+
+    def summary(self) -> str:
+        counts = self.counts()
+        total = sum(counts.values())
+        return (f"Work queue {self.db_path}: {counts['done']}/{total} units done, {counts['failed']} failed, "
+                f"{counts['pending'] + counts['leased']} outstanding; worker {self.worker_id} finished "
+                f"{self.completed}, took over {self.reclaimed} expired leases")
+
+    def close(self):
+        """Stop renewing leases and close the database"""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+        if self._conn is None:
+            return
+        self._final_counts = self.counts()
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+
+def add_queue_arguments(parser):
+    """Register the shared work queue options on an argparse parser"""
+    parser.add_argument("--queue", type=str, default=None,
+                        help="SQLite work queue shared by every worker started with the same arguments; "
+                             "workers claim units under leases and each writes the output once the queue is drained")
+    parser.add_argument("--worker-id", type=str, default=None,
+                        help="Name of this worker in the queue (default: host-pid)")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="Seconds a dead worker's units stay leased before another worker takes them over")
+    parser.add_argument("--queue-max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="Claims per unit before it is marked failed")
+    parser.add_argument("--queue-journal", choices=["wal", "delete"], default="wal",
+                        help="SQLite journal mode: wal for workers on one host, delete for several machines "
+                             "on a network filesystem (WAL needs shared memory)")
+
+
+def queue_from_args(args) -> Optional[WorkQueue]:
+    """Open the WorkQueue from parsed arguments, or None when --queue is not given or not supported by the script"""
+    if not getattr(args, "queue", None):
+        return None
+    return WorkQueue(args.queue, worker_id=args.worker_id, lease_seconds=args.lease_seconds,
+                     max_attempts=args.queue_max_attempts, journal_mode=args.queue_journal)
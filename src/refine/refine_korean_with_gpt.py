@@ -4,30 +4,40 @@ Use GPT-4-mini to refine Korean translations in MKQA dataset
 """
 import json
 import os
-from openai import OpenAI
-from typing import List, Dict, Optional
+import sys
+from typing import List, Dict, Optional, Tuple
 import time
-from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
-
-# Initialize OpenAI client
-def initialize_client():
-    """Initialize OpenAI client with API key from environment variable"""
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm.checkpoint import add_checkpoint_arguments, checkpoint_path_for
+from llm.batch_jobs import (add_batch_arguments, build_batch_request, parse_range_id,
+                            read_batch_results, write_batch_requests)
+from llm.dedup import add_dedup_arguments, batched_calls_saved, dedup_summary, group_duplicates, in_input_order
+from llm.chat import TruncatedResponse
+from llm.executor import LLMExecutor, add_executor_arguments, executor_from_args
+from llm.packing import DEFAULT_MAX_BATCH_ITEMS, add_packing_arguments, batch_spans
+from llm.prescreen import PairScreen, ScreenReport, add_prescreen_arguments, screen_from_args
+from llm.rate_limit import estimate_text_tokens
+from llm.work_queue import add_queue_arguments
+from utils.json_stream import salvage_json_array
+
+def check_api_key():
+    """Exit with a hint if OPENAI_API_KEY is not set"""
+    if not os.getenv("OPENAI_API_KEY"):
         print("⚠️  Please set OPENAI_API_KEY environment variable")
         print("   export OPENAI_API_KEY='your-api-key-here'")
         exit(1)
 
-    client = OpenAI(api_key=api_key)
-    return client
+REFINE_MAX_TOKENS = 2000
+
+REFINE_SYSTEM_PROMPT = "당신은 한국어 번역 품질을 개선하는 전문가입니다. JSON 형식으로만 응답합니다."
 
-def process_batch(client, entries: List[Dict], batch_size: int = 10) -> List[Optional[Dict]]:
-    """Process a batch of entries with GPT-4-mini"""
+def build_refine_messages(items: List[Tuple[int, Dict]]) -> List[Dict[str, str]]:
+    """Build the chat messages for one batch of (id, en/ko pair) items"""
 
-    # Prepare the batch data for GPT
-    batch_text = json.dumps(entries, ensure_ascii=False, indent=2)
+    # Prepare the batch data for GPT; ids let the answer be matched back even if items are dropped
+    batch_text = json.dumps([{"id": idx, "en": entry["en"], "ko": entry["ko"]} for idx, entry in items],
+                            ensure_ascii=False, indent=2)
 
     prompt = f"""다음은 영어-한국어 질문 쌍입니다.
 한국어 번역을 검토해서:
@@ -37,53 +47,196 @@ def process_batch(client, entries: List[Dict], batch_size: int = 10) -> List[Opt
 4. 의미를 아에 모르겠는 한국어 문장은 null로 고쳐주세요.
 
 입력 형식:
-[{{"en": "영어 질문", "ko": "한국어 질문"}}, ...]
+[{{"id": 0, "en": "영어 질문", "ko": "한국어 질문"}}, ...]
 
-출력 형식 (JSON 배열로 반환):
-[{{"en": "영어 질문", "ko": "개선된 한국어 또는 null"}}, ...]
+출력 형식 (JSON 배열로 반환, 모든 id를 입력과 같은 순서로 포함):
+[{{"id": 0, "ko": "개선된 한국어 또는 null"}}, ...]
 
 입력 데이터:
 {batch_text}
 
 JSON 배열 형식으로만 응답해주세요."""
 
+    return [
+        {"role": "system", "content": REFINE_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def is_refine_item(item, wanted) -> bool:
+    """Whether an answer element is {"id": <requested id>, "ko": <string or null>}"""
+    return (isinstance(item, dict) and item.get("id") in wanted and "ko" in item
+            and (item["ko"] is None or isinstance(item["ko"], str)))
+
+def refine_answers(result_text: str, wanted) -> Dict[int, Optional[str]]:
+    """Refined Korean (None if GPT marked it null) for every well-formed answer element whose id is wanted
+
+    Every complete item is salvaged from a truncated or malformed response.
+    """
+    return {item["id"]: item["ko"] for item in salvage_json_array(result_text) if is_refine_item(item, wanted)}
+
+def parse_refine_response(result_text: str, ids: List[int]) -> Dict[int, Optional[str]]:
+    """Map each requested id to its refined Korean (None if GPT marked it null)
+
+    Ids that are missing, unknown or malformed are left out so the caller can retry them.
+    """
+    wanted = set(ids)
+    refined = refine_answers(result_text, wanted)
+
+    if len(refined) < len(wanted):
+        print(f"⚠️  Response covered {len(refined)} of {len(wanted)} items")
+    return refined
+
+def refine_item_tokens(item: Tuple[int, Dict]) -> int:
+    """Estimated answer tokens for an (id, entry) item: the refined sentence, allowing it to grow, plus its JSON"""
+    return estimate_text_tokens(item[1]["ko"]) * 3 // 2 + 16
+
+def stream_batch(executor: LLMExecutor, items: List[Tuple[int, Dict]]) -> Optional[Dict[int, Optional[str]]]:
+    """Streaming version of process_batch that validates each item as it arrives
+
+    The request is cancelled at the first element that is malformed or does not belong to the batch.
+    """
+    wanted = {idx for idx, _ in items}
+    refined = {}
+
+    def on_item(item):
+        if not is_refine_item(item, wanted) or item["id"] in refined:
+            raise ValueError(f"unexpected element {json.dumps(item, ensure_ascii=False)[:80]}")
+        refined[item["id"]] = item["ko"]
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Using GPT-4-mini (also known as gpt-4o-mini)
-            messages=[
-                {"role": "system", "content": "당신은 한국어 번역 품질을 개선하는 전문가입니다. JSON 형식으로만 응답합니다."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,  # Lower temperature for more consistent output
-            max_tokens=2000
+        executor.stream_items(
+            build_refine_messages(items),
+            on_item,
+            temperature=0.3,
+            max_tokens=REFINE_MAX_TOKENS,
+            tag="batch" if len(items) > 1 else "single",
+            allow_truncated=False
         )
+    except TruncatedResponse:
+        print(f"✂️  Response truncated at max_tokens for a batch of {len(items)} items")
+    except ValueError as e:
+        # Keep the items that arrived before the bad element; the rest are retried in smaller batches
+        print(f"⚠️  Cancelled streaming response after {len(refined)} items: {e}")
+    except Exception as e:
+        print(f"❌ API error: {e}")
+        return None
 
-        # Parse the response
-        result_text = response.choices[0].message.content.strip()
-
-        # Try to extract JSON from the response
-        if result_text.startswith("```json"):
-            result_text = result_text[7:]  # Remove ```json
-        if result_text.startswith("```"):
-            result_text = result_text[3:]  # Remove ```
-        if result_text.endswith("```"):
-            result_text = result_text[:-3]  # Remove ```
+    if len(refined) < len(wanted):
+        print(f"⚠️  Response covered {len(refined)} of {len(wanted)} items")
+    return refined
 
-        result = json.loads(result_text)
-        return result
+def process_batch(executor: LLMExecutor, items: List[Tuple[int, Dict]],
+                  stream: bool = False) -> Optional[Dict[int, Optional[str]]]:
+    """Process a batch of (id, entry) items with GPT-4-mini; returns None if the API call fails"""
+    if stream:
+        return stream_batch(executor, items)
 
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON parsing error: {e}")
-        print(f"Response: {result_text[:200]}...")
-        return entries  # Return original if parsing fails
+    try:
+        result_text = executor.complete(
+            build_refine_messages(items),
+            temperature=0.3,  # Lower temperature for more consistent output
+            max_tokens=REFINE_MAX_TOKENS,
+            tag="batch" if len(items) > 1 else "single",
+            allow_truncated=False
+        )
+    except TruncatedResponse as e:
+        # Keep the items that were finished; the rest are retried in smaller batches
+        print(f"✂️  Response truncated at max_tokens for a batch of {len(items)} items")
+        result_text = e.content
     except Exception as e:
         print(f"❌ API error: {e}")
-        return entries  # Return original if API fails
+        return None
+
+    return parse_refine_response(result_text, [idx for idx, _ in items])
+
+def refine_with_bisection(executor: LLMExecutor, items: List[Tuple[int, Dict]],
+                          stream: bool = False) -> Dict[int, Optional[str]]:
+    """Refine a batch, retrying only the ids missing from the answer in recursively halved sub-batches
+
+    A failed API call is not split, since smaller requests would fail the same way.
+    """
+    refined = process_batch(executor, items, stream=stream)
+    if refined is None:
+        return {}
+
+    missing = [(idx, entry) for idx, entry in items if idx not in refined]
+    if not missing or len(items) == 1:
+        return refined
+
+    mid = (len(missing) + 1) // 2
+    for half in (missing[:mid], missing[mid:]):
+        if half:
+            refined.update(refine_with_bisection(executor, half, stream=stream))
+    return refined
+
+def split_refined(items: List[Tuple[int, Dict]], refined: Dict[int, Optional[str]],
+                  members: List[List[Tuple[int, Dict]]]):
+    """Split a batch into refined entries, originals GPT marked as null and entries it never answered
+
+    members[id] lists the (input position, entry) of every input deduplicated into item id, itself first;
+    each gets a copy of the result. Entries are returned as [input position, entry] pairs.
+    """
+    batch_refined = []
+    batch_failed = []
+    batch_unrefined = []
+
+    for idx, _ in items:
+        if idx not in refined:
+            batch_unrefined.extend([pos, entry] for pos, entry in members[idx])
+        elif refined[idx] is None:
+            batch_failed.extend([pos, entry] for pos, entry in members[idx])
+        else:
+            batch_refined.extend([pos, {"en": entry["en"], "ko": refined[idx]}] for pos, entry in members[idx])
+
+    return batch_refined, batch_failed, batch_unrefined
+
+def dedup_refine_data(data: List[Dict], dedup: bool = True):
+    """Keep the first of each group of near-identical pairs
+
+    Returns the kept entries and, per kept entry, the (input position, entry) of every member of its group.
+    """
+    if not dedup:
+        return data, [[(idx, entry)] for idx, entry in enumerate(data)]
+
+    groups = group_duplicates(data)
+    unique = [data[rep] for rep in groups]
+    members = [[(idx, data[idx]) for idx in group] for group in groups.values()]
+    return unique, members
+
+def prescreen_refine_data(data: List[Dict], members: List[List[Tuple[int, Dict]]],
+                          screen: Optional[PairScreen]):
+    """Split pairs into (id, entry) items for GPT and entries passed through unchanged with their duplicates
+
+    Ids are positions in data, so batches built from the flagged items still line up with members.
+    Returns the items, the passed-through entries as [input position, entry] pairs and a report
+    (None without a screen).
+    """
+    if screen is None:
+        return list(enumerate(data)), [], None
+
+    report = ScreenReport()
+    items = []
+    passed = []
+    for idx, entry in enumerate(data):
+        reasons = screen.reasons(entry)
+        report.add(reasons)
+        if reasons:
+            items.append((idx, entry))
+        else:
+            passed.extend([pos, member] for pos, member in members[idx])
 
-def refine_korean_translations(input_file: str, output_file: str, batch_size: int = 10, max_workers: int = 5):
-    """Main function to refine Korean translations"""
+    return items, passed, report
 
-    # Load the data
+def save_prescreen_report(report: ScreenReport, output_file: str):
+    """Print the pre-screen summary and save it next to the output"""
+    print(f"🔎 {report.summary()}")
+    report_file = output_file.replace(".json", "_prescreen.json")
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+    print(f"💾 Pre-screen report saved to {report_file}")
+
+def load_refine_data(input_file: str) -> Optional[List[Dict]]:
+    """Load en/ko pairs, converting the structured MKQA format if needed"""
     print(f"📚 Loading {input_file}...")
     with open(input_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
@@ -101,73 +254,13 @@ def refine_korean_translations(input_file: str, output_file: str, batch_size: in
             data = simple_data
         else:
             print("❌ Unsupported data format. Expected 'en'/'ko' or 'query'/'queries' format")
-            return 0
-
-    print(f"📊 Total entries to process: {len(data)}")
-
-    # Initialize OpenAI client
-    client = initialize_client()
+            return None
 
-    # Process in batches with multi-threading
-    refined_data = []
-    failed_entries = []
-    results_lock = threading.Lock()
-
-    print(f"🔄 Processing in batches of {batch_size} with {max_workers} workers...")
-
-    # Worker function for processing batches
-    def process_batch_worker(batch_data, batch_index):
-        """Process a single batch in a worker thread"""
-        try:
-            # Process batch with GPT
-            refined_batch = process_batch(client, batch_data, batch_size)
-
-            batch_refined = []
-            batch_failed = []
-
-            # Check results and filter out nulls
-            for j, entry in enumerate(refined_batch):
-                if entry and entry.get("ko") is not None:
-                    batch_refined.append(entry)
-                else:
-                    batch_failed.append(batch_data[j] if j < len(batch_data) else None)
-
-            return batch_index, batch_refined, batch_failed
-        except Exception as e:
-            print(f"❌ Error processing batch {batch_index}: {e}")
-            return batch_index, [], batch_data
-
-    # Use ThreadPoolExecutor for parallel processing
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {}
-
-        # Submit batch jobs
-        for i in range(0, len(data), batch_size):
-            batch = data[i:i+batch_size]
-            batch_index = i // batch_size
-            future = executor.submit(process_batch_worker, batch, batch_index)
-            futures[future] = batch_index
-
-        # Collect results (maintaining order)
-        results_dict = {}
-        failed_dict = {}
-
-        # Progress bar with result collection
-        with tqdm(total=len(futures), desc="Processing batches") as pbar:
-            for future in as_completed(futures):
-                batch_index, batch_refined, batch_failed = future.result()
-                results_dict[batch_index] = batch_refined
-                failed_dict[batch_index] = batch_failed
-                pbar.update(1)
-
-        # Combine results in order
-        for i in sorted(results_dict.keys()):
-            refined_data.extend(results_dict[i])
-            failed_entries.extend(failed_dict[i])
-
-    print(f"\n✅ Successfully refined: {len(refined_data)} entries")
-    print(f"❌ Discarded (low quality): {len(failed_entries)} entries")
+    return data
 
+def save_refinement(refined_data: List[Dict], failed_entries: List[Dict], output_file: str,
+                    unrefined_entries: Optional[List[Dict]] = None):
+    """Save refined entries and, separately, the discarded and unanswered ones"""
     # Save refined data in simple en/ko format
     print(f"💾 Saving to {output_file}...")
     with open(output_file, 'w', encoding='utf-8') as f:
@@ -180,17 +273,189 @@ def refine_korean_translations(input_file: str, output_file: str, batch_size: in
             json.dump(failed_entries, f, ensure_ascii=False, indent=2)
         print(f"💾 Discarded entries saved to {discarded_file}")
 
+    # Save entries GPT never answered so they can be rerun
+    if unrefined_entries:
+        unrefined_file = output_file.replace(".json", "_unrefined.json")
+        with open(unrefined_file, 'w', encoding='utf-8') as f:
+            json.dump(unrefined_entries, f, ensure_ascii=False, indent=2)
+        print(f"💾 Unrefined entries saved to {unrefined_file}")
+
+def export_refine_batch(input_file: str, batch_file: str, batch_size: int = 10, dedup: bool = True,
+                        token_budget: int = 0, max_batch_items: int = DEFAULT_MAX_BATCH_ITEMS,
+                        screen: Optional[PairScreen] = None) -> int:
+    """Write one batch request per refinement batch instead of calling the API"""
+    data = load_refine_data(input_file)
+    if data is None:
+        return 0
+    data, members = dedup_refine_data(data, dedup)
+    items, _, report = prescreen_refine_data(data, members, screen)
+    spans = batch_spans(items, batch_size, refine_item_tokens, token_budget, max_batch_items)
+    if report is not None:
+        report.calls_before = len(batch_spans(list(enumerate(data)), batch_size, refine_item_tokens,
+                                              token_budget, max_batch_items))
+        report.calls_after = len(spans)
+        print(f"🔎 {report.summary()}")
+
+    # custom_id holds the first and last id of the batch, which need not be contiguous after screening
+    requests = (
+        build_batch_request(f"refine-{items[start][0]}-{items[end - 1][0]}",
+                            build_refine_messages(items[start:end]),
+                            model="gpt-4o-mini", temperature=0.3, max_tokens=REFINE_MAX_TOKENS)
+        for start, end in spans
+    )
+    count = write_batch_requests(batch_file, requests)
+    print(f"📤 Wrote {count} batch requests for {len(items)} entries to {batch_file}")
+    return count
+
+def import_refine_batch(input_file: str, batch_file: str, output_file: str, dedup: bool = True,
+                        screen: Optional[PairScreen] = None) -> int:
+    """Merge batch results into the normal refined/discarded outputs
+
+    Every answer whose id maps to an input entry is used, even for entries the current pre-screen would
+    pass through, so results exported with other screen settings are not lost.
+    """
+    data = load_refine_data(input_file)
+    if data is None:
+        return 0
+    data, members = dedup_refine_data(data, dedup)
+    items, _, _ = prescreen_refine_data(data, members, screen)
+    sent = dict(items)
+
+    refined_pairs = []
+    failed_pairs = []
+    unrefined_pairs = []
+    batch_results = read_batch_results(batch_file)
+    spans = sorted(filter(None, (parse_range_id(custom_id, "refine") for custom_id in batch_results)))
+    missing = 0
+    covered = set()
+
+    for start, end in spans:
+        batch_ids = range(start, min(end + 1, len(data)))
+        content = batch_results[f"refine-{start}-{end}"]
+        if content is None:
+            # Failed requests leave their entries unrefined
+            missing += 1
+            refined = {}
+        else:
+            refined = refine_answers(content, set(batch_ids))
+        batch_items = [(idx, data[idx]) for idx in batch_ids if idx in sent or idx in refined]
+        covered.update(idx for idx, _ in batch_items)
+        unanswered = sum(1 for idx, _ in batch_items if idx not in refined)
+        if content is not None and unanswered:
+            print(f"⚠️  Response covered {len(batch_items) - unanswered} of {len(batch_items)} items")
+        batch_refined, batch_failed, batch_unrefined = split_refined(batch_items, refined, members)
+        refined_pairs.extend(batch_refined)
+        failed_pairs.extend(batch_failed)
+        unrefined_pairs.extend(batch_unrefined)
+
+    # Entries with no request in the results file were never refined either
+    _, _, never_sent = split_refined([item for item in items if item[0] not in covered], {}, members)
+    unrefined_pairs.extend(never_sent)
+    # Entries the current screen passes through stay unchanged unless the results file answered them
+    passed_entries = [[pos, member] for idx in range(len(data)) if idx not in sent and idx not in covered
+                      for pos, member in members[idx]]
+    refined_data = in_input_order(refined_pairs + passed_entries)
+    failed_entries = in_input_order(failed_pairs)
+    unrefined_entries = in_input_order(unrefined_pairs)
+
+    print(f"📥 Imported {len(spans)} batches ({missing} failed requests)")
+    print(f"\n✅ Successfully refined: {len(refined_pairs)} entries")
+    print(f"⏭️  Passed through unchanged: {len(passed_entries)} entries")
+    print(f"❌ Discarded (low quality): {len(failed_entries)} entries")
+    print(f"⚠️  Unrefined (no answer): {len(unrefined_entries)} entries")
+    save_refinement(refined_data, failed_entries, output_file, unrefined_entries)
+    return len(refined_data)
+
+def refine_korean_translations(input_file: str, output_file: str, batch_size: int = 10,
+                               executor: Optional[LLMExecutor] = None,
+                               checkpoint_file: Optional[str] = None,
+                               resume: bool = False,
+                               dedup: bool = True,
+                               token_budget: int = 0,
+                               max_batch_items: int = DEFAULT_MAX_BATCH_ITEMS,
+                               screen: Optional[PairScreen] = None,
+                               stream: bool = False):
+    """Main function to refine Korean translations"""
+    executor = executor or LLMExecutor()
+
+    # Load the data
+    data = load_refine_data(input_file)
+    if data is None:
+        return 0
+
+    print(f"📊 Total entries to process: {len(data)}")
+
+    # Near-identical pairs are refined once and the result is copied to every duplicate
+    work_data, members = dedup_refine_data(data, dedup)
+    if dedup:
+        print(f"🧹 {dedup_summary(len(data), len(work_data), batched_calls_saved(len(data), len(work_data), batch_size))}")
+
+    # Pairs that pass the local checks are kept as they are and never sent to GPT
+    work_items, passed_entries, report = prescreen_refine_data(work_data, members, screen)
+
+    # Batches are packed up to the estimated output budget instead of a fixed entry count
+    spans = batch_spans(work_items, batch_size, refine_item_tokens, token_budget, max_batch_items)
+    if report is not None:
+        report.calls_before = len(batch_spans(list(enumerate(work_data)), batch_size, refine_item_tokens,
+                                              token_budget, max_batch_items))
+        report.calls_after = len(spans)
+        save_prescreen_report(report, output_file)
+
+    if work_items:
+        check_api_key()
+
+    if token_budget > 0:
+        print(f"🔄 Packing {len(work_items)} entries into {len(spans)} batches of ~{token_budget} output tokens "
+              f"with {executor.concurrency} workers...")
+    else:
+        print(f"🔄 Processing in batches of {batch_size} with {executor.concurrency} workers...")
+
+    # Worker function for processing batches
+    def process_batch_worker(items, start):
+        """Process a single batch of (id, entry) items in a worker thread"""
+        try:
+            # Process batch with GPT, bisecting to recover items missing from the answer
+            refined = refine_with_bisection(executor, items, stream=stream)
+        except Exception as e:
+            print(f"❌ Error processing batch at id {items[0][0]}: {e}")
+            refined = {}
+        batch_refined, batch_failed, batch_unrefined = split_refined(items, refined, members)
+        return {"refined": batch_refined, "failed": batch_failed, "unrefined": batch_unrefined}
+
+    # Finished batches are appended to a checkpoint log; --resume skips them. Entries are logged with their
+    # input positions ("positioned"), so logs from before that are not reused
+    records = executor.run_batches(work_items, spans, process_batch_worker,
+                                   checkpoint_file or checkpoint_path_for(output_file), resume=resume,
+                                   meta={"batch_size": batch_size, "dedup": dedup, "token_budget": token_budget,
+                                         "max_batch_items": max_batch_items,
+                                         "prescreen": screen.settings if screen else None, "positioned": True})
+
+    refined_pairs = [pair for record in records for pair in record["refined"]]
+    failed_entries = in_input_order(pair for record in records for pair in record["failed"])
+    unrefined_entries = in_input_order(pair for record in records for pair in record.get("unrefined", []))
+
+    print(f"\n✅ Successfully refined: {len(refined_pairs)} entries")
+    executor.close()
+    for line in executor.summaries():
+        print(line)
+    print(f"⏭️  Passed through unchanged: {len(passed_entries)} entries")
+    print(f"❌ Discarded (low quality): {len(failed_entries)} entries")
+    print(f"⚠️  Unrefined (no answer): {len(unrefined_entries)} entries")
+
+    # Passed-through entries keep their input positions among the refined ones
+    refined_data = in_input_order(refined_pairs + passed_entries)
+    save_refinement(refined_data, failed_entries, output_file, unrefined_entries)
+
     # Show sample improvements
     print("\n" + "="*60)
     print("Sample improvements:")
     print("="*60)
 
-    for i in range(min(5, len(data), len(refined_data))):
-        if i < len(data) and i < len(refined_data):
-            print(f"\nEntry {i+1}:")
-            print(f"Original KO: {data[i]['ko']}")
-            print(f"Refined KO:  {refined_data[i]['ko']}")
-            print("-"*40)
+    for i, (pos, entry) in enumerate(sorted(refined_pairs, key=lambda pair: pair[0])[:5]):
+        print(f"\nEntry {i+1}:")
+        print(f"Original KO: {data[pos]['ko']}")
+        print(f"Refined KO:  {entry['ko']}")
+        print("-"*40)
 
     return len(refined_data)
 
@@ -219,8 +484,31 @@ if __name__ == "__main__":
     parser.add_argument("--max-workers", type=int, default=5, help="Maximum number of parallel workers")
     parser.add_argument("--test", action="store_true", help="Test with small sample first")
     parser.add_argument("--sample-size", type=int, default=20, help="Sample size for testing")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream responses and validate each item as it arrives, cancelling on malformed output")
+    add_checkpoint_arguments(parser)
+    add_queue_arguments(parser)
+    add_batch_arguments(parser)
+    add_dedup_arguments(parser)
+    add_packing_arguments(parser, REFINE_MAX_TOKENS)
+    add_prescreen_arguments(parser)
+    add_executor_arguments(parser)
 
     args = parser.parse_args()
+    screen = screen_from_args(args)
+
+    # Offline batch-job modes never call the API
+    if args.export_batch:
+        export_refine_batch(args.input, args.export_batch, batch_size=args.batch_size, dedup=not args.no_dedup,
+                            token_budget=args.token_budget, max_batch_items=args.max_batch_items, screen=screen)
+        sys.exit(0)
+    if args.import_batch:
+        count = import_refine_batch(args.input, args.import_batch, args.output, dedup=not args.no_dedup,
+                                    screen=screen)
+        print(f"\n✅ Complete! Refined {count} entries")
+        sys.exit(0)
+
+    executor = executor_from_args(args, "refine", concurrency=2 if args.test else args.max_workers)
 
     if args.test:
         # Create and process a sample file first
@@ -232,7 +520,13 @@ if __name__ == "__main__":
             sample_file,
             "mkqa_sample_refined.json",
             batch_size=5,
-            max_workers=2
+            executor=executor,
+            resume=args.resume,
+            dedup=not args.no_dedup,
+            token_budget=args.token_budget,
+            max_batch_items=args.max_batch_items,
+            screen=screen,
+            stream=args.stream
         )
         print(f"\n✅ Test complete! Refined {count} entries")
         print("Check 'mkqa_sample_refined.json' for results")
@@ -242,7 +536,14 @@ if __name__ == "__main__":
             args.input,
             args.output,
             batch_size=args.batch_size,
-            max_workers=args.max_workers
+            executor=executor,
+            checkpoint_file=args.checkpoint,
+            resume=args.resume,
+            dedup=not args.no_dedup,
+            token_budget=args.token_budget,
+            max_batch_items=args.max_batch_items,
+            screen=screen,
+            stream=args.stream
         )
         print(f"\n✅ Complete! Refined {count} entries")
-        print(f"Output saved to: {args.output}")
\ No newline at end of file
+        print(f"Output saved to: {args.output}")
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The pipeline scripts live in per-stage directories and import their siblings and the shared llm/ and utils/
+# packages by path, so the tests put the same directories on sys.path
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in (SRC_DIR, os.path.join(SRC_DIR, "typo"), os.path.join(SRC_DIR, "refine"),
+                  os.path.join(SRC_DIR, "code-switching")):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
@@ -0,0 +1,49 @@
+import json
+import os
+
+import pytest
+
+from llm.batch_jobs import build_batch_request, parse_range_id, read_batch_results, write_batch_requests
+
+BATCH_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "test", "batch")
+
+MESSAGES = [{"role": "user", "content": "안녕하세요"}]
+
+
+def test_build_batch_request():
+    request = build_batch_request("refine-0-9", MESSAGES, max_tokens=4000, response_format={"type": "json_object"})
+    assert request["custom_id"] == "refine-0-9"
+    assert request["url"] == "/v1/chat/completions"
+    assert request["body"]["max_tokens"] == 4000
+    assert request["body"]["response_format"] == {"type": "json_object"}
+    assert "response_format" not in build_batch_request("x", MESSAGES)["body"]
+
+
+def test_write_batch_requests(tmp_path):
+    path = str(tmp_path / "requests.jsonl")
+    requests = [build_batch_request(f"cs-{i}-Case2", MESSAGES) for i in range(3)]
+
+    assert write_batch_requests(path, requests) == 3
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["custom_id"] for line in f] == ["cs-0-Case2", "cs-1-Case2", "cs-2-Case2"]
+
+    with pytest.raises(ValueError):
+        write_batch_requests(path, requests + requests[:1])
+
+
+def test_read_batch_results_marks_failed_requests():
+    results = read_batch_results(os.path.join(BATCH_DATA, "typo_batch_results.jsonl"))
+    assert sorted(results) == ["typo-0-1", "typo-2-3"]
+    assert json.loads(results["typo-0-1"])[0]["original"].startswith("어디에서")
+    assert results["typo-2-3"] is None
+
+
+@pytest.mark.parametrize("custom_id, expected", [
+    ("refine-0-9", (0, 9)),
+    ("refine-10-19", (10, 19)),
+    ("typo-0-9", None),
+    ("refine-0", None),
+    ("refine-0-9-x", None),
+])
+def test_parse_range_id(custom_id, expected):
+    assert parse_range_id(custom_id, "refine") == expected
@@ -0,0 +1,68 @@
+from llm.cache import ResponseCache
+
+MESSAGES = [{"role": "user", "content": "안녕하세요"}]
+
+
+def test_make_key_depends_on_every_request_parameter():
+    key = ResponseCache.make_key("gpt-4o-mini", MESSAGES, 0.3, 200)
+
+    assert key == ResponseCache.make_key("gpt-4o-mini", [dict(MESSAGES[0])], 0.3, 200)
+    assert key == ResponseCache.make_key("gpt-4o-mini", MESSAGES, 0.3, 200, response_format=None)
+    assert key != ResponseCache.make_key("gpt-4o", MESSAGES, 0.3, 200)
+    assert key != ResponseCache.make_key("gpt-4o-mini", MESSAGES, 0.7, 200)
+    assert key != ResponseCache.make_key("gpt-4o-mini", MESSAGES, 0.3, 400)
+    assert key != ResponseCache.make_key("gpt-4o-mini", MESSAGES, 0.3, 200, response_format={"type": "json_object"})
+
+
+def test_put_get_persists_across_instances(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(db_path)
+    cache.put("a", "응답")
+    assert cache.get("a") == "응답"
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+    reader = ResponseCache(db_path, read_only=True)
+    assert reader.get("a") == "응답"
+    reader.put("c", "ignored")
+    assert not reader.contains("c")
+    reader.close()
+
+
+def test_read_only_without_database(tmp_path):
+    cache = ResponseCache(str(tmp_path / "missing.sqlite"), read_only=True)
+    assert cache.get("a") is None
+    assert not (tmp_path / "missing.sqlite").exists()
+
+
+def test_evicts_least_recently_used(tmp_path):
+    # Room for a little over three 1000-byte responses
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_size_mb=3500 / (1024 * 1024))
+    for key in "abc":
+        cache.put(key, key * 1000)
+    cache.get("a")  # a is now more recent than b
+    cache.put("d", "d" * 1000)
+
+    assert cache.contains("a")
+    assert not cache.contains("b")
+    assert cache.contains("c")
+    assert cache.contains("d")
+    cache.close()
+
+
+def test_size_limit_holds_across_instances_sharing_a_file(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite")
+    max_size_mb = 3500 / (1024 * 1024)
+    first = ResponseCache(db_path, max_size_mb=max_size_mb)
+    second = ResponseCache(db_path, max_size_mb=max_size_mb)
+    for key in "abcd":
+        (first if key in "ac" else second).put(key, key * 1000)
+
+    # Each instance wrote only 2000 bytes, but together they went past the limit
+    stored = first._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    assert stored <= 3500
+    assert not first.contains("a")
+    assert second.contains("d")
+    first.close()
+    second.close()
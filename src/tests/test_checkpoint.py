@@ -0,0 +1,48 @@
+import json
+
+from llm.checkpoint import CheckpointWriter, checkpoint_path_for, compact_checkpoint, load_checkpoint
+
+
+def test_checkpoint_path_for():
+    assert checkpoint_path_for("data/outputs/cs.json") == "data/outputs/cs.checkpoint.jsonl"
+
+
+def test_writer_appends_and_load_round_trips(tmp_path):
+    path = str(tmp_path / "nested" / "run.checkpoint.jsonl")
+    with CheckpointWriter(path, flush_interval=2) as writer:
+        for i in range(5):
+            writer.write({"id": i, "ko": f"문장 {i}"})
+    assert writer.count == 5
+
+    with CheckpointWriter(path) as writer:
+        writer.write({"id": 5, "ko": "문장 5"})
+
+    records = load_checkpoint(path)
+    assert sorted(records) == list(range(6))
+    assert records[3] == {"id": 3, "ko": "문장 3"}
+
+
+def test_writer_without_append_truncates(tmp_path):
+    path = str(tmp_path / "run.checkpoint.jsonl")
+    with CheckpointWriter(path) as writer:
+        writer.write({"id": 0})
+    with CheckpointWriter(path, append=False) as writer:
+        writer.write({"id": 1})
+    assert list(load_checkpoint(path)) == [1]
+
+
+def test_load_skips_torn_last_line_and_blank_lines(tmp_path):
+    path = tmp_path / "run.checkpoint.jsonl"
+    path.write_text('{"id": 0}\n\n{"id": 1}\n{"id": 2, "ko": "잘', encoding="utf-8")
+    assert list(load_checkpoint(str(path))) == [0, 1]
+    assert load_checkpoint(str(tmp_path / "missing.jsonl")) == {}
+
+
+def test_compact_orders_by_key_and_keeps_last_write(tmp_path):
+    path = tmp_path / "run.checkpoint.jsonl"
+    lines = [{"id": 2, "v": "a"}, {"id": 0, "v": "b"}, {"id": 2, "v": "c"}, {"id": 1, "v": "d"}]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines), encoding="utf-8")
+
+    assert compact_checkpoint(str(path)) == [{"id": 0, "v": "b"}, {"id": 1, "v": "d"}, {"id": 2, "v": "c"}]
+    assert compact_checkpoint(str(path), key="v") == [{"id": 2, "v": "a"}, {"id": 0, "v": "b"},
+                                                       {"id": 2, "v": "c"}, {"id": 1, "v": "d"}]
@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import json
+import time
+
+import openai
+import pytest
+
+from llm.client import (add_client_arguments, build_limits, build_timeout, client_settings_from_args,
+                        create_async_client, create_client)
+from llm.mock_server import MockChatServer
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def test_build_limits_keeps_a_connection_per_worker():
+    limits = build_limits(16)
+    assert limits.max_connections == 16
+    assert limits.max_keepalive_connections == 16
+    assert build_limits(0).max_connections == 1
+
+
+def test_build_timeout():
+    timeout = build_timeout(connect_timeout=5, read_timeout=30)
+    assert (timeout.connect, timeout.read, timeout.write, timeout.pool) == (5, 30, 30, 30)
+
+
+def test_settings_from_args():
+    parser = argparse.ArgumentParser()
+    add_client_arguments(parser)
+    assert client_settings_from_args(parser.parse_args(["--request-timeout", "0"])) == {
+        "connect_timeout": 10.0, "read_timeout": 60.0, "http2": False, "request_timeout": None}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    mock = MockChatServer(latency_ms=1, latency_dist="fixed")
+    monkeypatch.setenv("OPENAI_BASE_URL", mock.start())
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    yield mock
+    mock.stop()
+
+
+def test_client_reaches_server(server):
+    client = create_client(concurrency=2)
+    response = client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+    assert response.choices[0].message.content == "OK"
+
+
+def test_async_request_timeout_cancels_slow_request(server):
+    server.latency_ms = 1000
+
+    async def call():
+        client = create_async_client(concurrency=2, request_timeout=0.2)
+        try:
+            return await client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+        finally:
+            await client.close()
+
+    started = time.monotonic()
+    with pytest.raises(openai.APITimeoutError):
+        asyncio.run(call())
+    assert time.monotonic() - started < 0.9
+
+
+def test_request_timeout_bounds_a_slow_sync_request(server):
+    server.latency_ms = 1000
+    client = create_client(concurrency=2, request_timeout=0.2)
+
+    started = time.monotonic()
+    with pytest.raises(openai.APITimeoutError):
+        client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+    assert time.monotonic() - started < 0.9
+    client.close()
+
+
+def test_request_timeout_stops_a_trickling_sync_stream(server):
+    # Streamed answers start after half the latency and trickle in over the other half; the mock server echoes
+    # refine requests, so this one streams back dozens of chunks
+    server.latency_ms = 2000
+    client = create_client(concurrency=2, request_timeout=1.3)
+    entries = [{"id": i, "ko": f"문장 {i}"} for i in range(10)]
+    messages = [{"role": "user", "content": f"입력 데이터:\n{json.dumps(entries, ensure_ascii=False)}\n\nJSON"}]
+
+    started = time.monotonic()
+    with pytest.raises(openai.APITimeoutError):
+        for _ in client.chat.completions.create(model="gpt-4o-mini", messages=messages, stream=True):
+            pass
+    assert time.monotonic() - started < 1.8
+    client.close()
+
+
+def test_sync_client_without_deadline(server):
+    client = create_client(concurrency=2, request_timeout=None)
+    assert client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES).choices[0].message.content == "OK"
+    client.close()
@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+import pytest
+
+from make_code_switching_gpt import (CaseValidator, arepair_invalid_cases, english_share, generate_all_cases,
+                                     parse_multi_case_response, parse_multi_item_response, process_item_batch,
+                                     process_single_item, process_single_item_async, repair_invalid_cases,
+                                     validate_case)
+
+ITEM = {"ko": "미국의 수도는 어디인가?", "en": "What is the capital of the United States?"}
+
+CANNED = {
+    "Case2": "미국의 capital은 어디인가?",
+    "Case3": "What is 미국의 수도?",
+    "Case4": "What is the 수도 of the United States?",
+}
+
+
+class FakeExecutor:
+    """Answers each case request with a canned case, keyed by the request tag"""
+
+    def __init__(self, answers=None):
+        self.answers = answers or {}
+        self.tags = []
+
+    def complete(self, messages, tag="", **kwargs):
+        self.tags.append(tag)
+        return self.answers.get(tag, CANNED.get(tag, ""))
+
+    async def acomplete(self, messages, tag="", **kwargs):
+        return self.complete(messages, tag=tag, **kwargs)
+
+
+def test_async_single_item_matches_threaded():
+    threaded = process_single_item((3, ITEM), FakeExecutor())
+    concurrent = asyncio.run(process_single_item_async((3, ITEM), FakeExecutor()))
+
+    assert concurrent == threaded
+    assert threaded["id"] == 3
+    assert threaded["code_switched_versions"] == {"Case1": ITEM["ko"], **CANNED, "Case5": ITEM["en"]}
+
+
+def test_failed_request_leaves_case_empty():
+    class FailingExecutor(FakeExecutor):
+        def complete(self, messages, tag="", **kwargs):
+            if tag == "Case3":
+                raise RuntimeError("server error")
+            return super().complete(messages, tag=tag, **kwargs)
+
+    result = asyncio.run(process_single_item_async((0, ITEM), FailingExecutor()))
+    assert result["code_switched_versions"]["Case3"] == ""
+    assert result["code_switched_versions"]["Case2"] == CANNED["Case2"]
+
+
+def test_parse_multi_case_response():
+    text = "```json\n" + json.dumps({**CANNED, "Case3": "  ", "Case5": "extra"}, ensure_ascii=False) + "\n```"
+    assert parse_multi_case_response(text) == {"Case2": CANNED["Case2"], "Case4": CANNED["Case4"]}
+    assert parse_multi_case_response("not json") == {}
+    assert parse_multi_case_response("[1, 2]") == {}
+
+
+def test_multi_case_falls_back_per_missing_case():
+    executor = FakeExecutor({"all": json.dumps({"Case2": CANNED["Case2"], "Case4": CANNED["Case4"]})})
+
+    assert generate_all_cases(ITEM["ko"], ITEM["en"], executor) == CANNED
+    assert executor.tags == ["all", "Case3"]
+
+
+def test_parse_multi_item_response_keeps_complete_ids():
+    text = json.dumps({"4": CANNED, "7": {"Case2": CANNED["Case2"]}, "9": CANNED}, ensure_ascii=False)
+    assert parse_multi_item_response(text, [4, 7, 8]) == {4: CANNED}
+
+
+def test_item_batch_requeues_missing_items_in_order():
+    batch = [(0, ITEM), (1, {"ko": "홍콩은 도시인가요?", "en": "Is Hong Kong a city?"}), (2, ITEM)]
+    executor = FakeExecutor({"items": json.dumps({"0": CANNED, "2": CANNED}, ensure_ascii=False)})
+
+    results, requeued = process_item_batch(batch, executor)
+
+    assert requeued == 1
+    assert [result["id"] for result in results] == [0, 1, 2]
+    assert executor.tags == ["items", "Case2", "Case3", "Case4"]
+    assert results[1]["original_ko"] == "홍콩은 도시인가요?"
+
+
+
+@pytest.mark.parametrize("case_name", sorted(CANNED))
+def test_validate_case_accepts_examples(case_name):
+    assert validate_case(case_name, CANNED[case_name], ITEM["ko"], ITEM["en"])
+
+
+@pytest.mark.parametrize("case_name, text", [
+    ("Case2", ""),
+    ("Case2", ITEM["ko"]),
+    ("Case4", ITEM["en"]),
+    ("Case2", "Output: 미국의 capital은 어디인가?"),
+    ("Case2", "미국의 capital은\n어디인가?"),
+    ("Case2", "Where is the capital of 미국?"),
+    ("Case3", "미국의 수도는 where인가?"),
+    ("Case4", "미국의 수도는 어디인가요 capital"),
+])
+def test_validate_case_rejects(case_name, text):
+    assert not validate_case(case_name, text, ITEM["ko"], ITEM["en"])
+
+
+def test_english_share_weights_hangul():
+    assert english_share("abc") == 1.0
+    assert english_share("가나") == 0.0
+    assert english_share("ab 가") == pytest.approx(2 / 4.5)
+    assert english_share("123 !") == 0.0
+
+
+def test_repair_regenerates_only_invalid_cases():
+    generated = {**CANNED, "Case3": "미국의 수도는 where인가?"}
+    answers = {"Case3-regen": CANNED["Case3"]}
+
+    validator = CaseValidator(max_regenerations=2)
+    executor = FakeExecutor(answers)
+    assert repair_invalid_cases(ITEM["ko"], ITEM["en"], generated, executor, validator) == CANNED
+    assert executor.tags == ["Case3-regen"]
+    assert (validator.checked, validator.failed, validator.repaired) == (3, 1, 1)
+
+    async_validator = CaseValidator(max_regenerations=2)
+    repaired = asyncio.run(arepair_invalid_cases(ITEM["ko"], ITEM["en"], generated, FakeExecutor(answers),
+                                                 async_validator))
+    assert repaired == CANNED
+    assert (async_validator.failed, async_validator.repaired) == (1, 1)
+
+
+def test_repair_keeps_original_when_regeneration_fails():
+    generated = {**CANNED, "Case3": "미국의 수도는 where인가?"}
+    validator = CaseValidator(max_regenerations=2)
+    executor = FakeExecutor({"Case3-regen": ""})
+
+    assert repair_invalid_cases(ITEM["ko"], ITEM["en"], generated, executor, validator) == generated
+    assert executor.tags == ["Case3-regen", "Case3-regen"]
+    assert validator.repaired == 0
@@ -0,0 +1,98 @@
+from generate_typos_with_gpt_improved import dedup_typo_data, fan_out_typos
+from llm.dedup import group_duplicates, in_input_order, match_records, normalize_text, pair_key
+from make_code_switching_gpt import build_result, fan_out_results
+from refine_korean_with_gpt import dedup_refine_data, split_refined
+
+# Positions 3 and 5 repeat position 0 up to width, case and punctuation
+DATA = [
+    {"en": "Who wrote Hamlet?", "ko": "햄릿은 누가 썼나요?"},
+    {"en": "Where is Seoul?", "ko": "서울은 어디에 있나요"},
+    {"en": "What is DNA", "ko": "DNA는 무엇인가요"},
+    {"en": "who wrote hamlet", "ko": "햄릿은  누가 썼나요"},
+    {"en": "Is Hong Kong a city?", "ko": "홍콩은 도시인가요?"},
+    {"en": "Who wrote Hamlet?", "ko": "햄릿은 누가 썼나요？"},
+]
+
+
+def test_normalize_text():
+    assert normalize_text("  ＤＮＡ는,  무엇인가요? ") == "dna는 무엇인가요"
+    assert normalize_text(None) == ""
+    assert pair_key(DATA[0]) == pair_key(DATA[3]) == pair_key(DATA[5])
+
+
+def test_group_duplicates():
+    assert group_duplicates(DATA) == {0: [0, 3, 5], 1: [1], 2: [2], 4: [4]}
+
+
+def identity(value):
+    return value
+
+
+def test_match_records_reordered_and_dropped():
+    entries = ["a", "b", "c", "d"]
+    assert match_records(entries, ["c", "a", "d"], identity, identity) == ["a", None, "c", "d"]
+
+
+def test_match_records_rewritten_originals():
+    entries = ["a", "b", "c"]
+    # "B!" and "C!" match nothing; B! keeps its own position and C! is paired with the last free entry
+    assert match_records(entries, ["B!", "a", "C!"], identity, identity) == ["a", "B!", "C!"]
+    assert match_records(entries, ["x", "y", "z", "w"], identity, identity) == ["x", "y", "z"]
+
+
+def test_match_records_duplicate_keys():
+    assert match_records(["a", "a", "b"], ["b", "a", "a"], identity, identity) == ["a", "a", "b"]
+
+
+def test_in_input_order():
+    assert in_input_order([(2, "c"), (0, "a"), (1, "b")]) == ["a", "b", "c"]
+
+
+def test_typo_fan_out_round_trip_keeps_input_order():
+    unique, members = dedup_typo_data(DATA)
+    assert [entry["ko"] for entry in unique] == [DATA[i]["ko"] for i in (0, 1, 2, 4)]
+
+    # The record for Seoul is missing from the answer
+    records = [{"original": entry["ko"]} for entry in unique]
+    records[1] = None
+    output = in_input_order(fan_out_typos(records, members))
+
+    assert [record["original"] for record in output] == [DATA[i]["ko"] for i in (0, 2, 0, 4, 0)]
+    output[0]["original"] = "changed"
+    assert output[2]["original"] == DATA[0]["ko"]
+
+
+def test_typo_without_dedup():
+    unique, members = dedup_typo_data(DATA, dedup=False)
+    assert unique == DATA
+    assert members == [[i] for i in range(len(DATA))]
+
+
+def test_refine_split_round_trip_keeps_input_order():
+    unique, members = dedup_refine_data(DATA)
+    items = list(enumerate(unique))
+    # Hamlet refined, Seoul marked null, DNA refined, Hong Kong never answered
+    refined = {0: "햄릿의 작가는 누구인가요?", 1: None, 2: "DNA란 무엇인가요"}
+
+    batch_refined, batch_failed, batch_unrefined = split_refined(items, refined, members)
+
+    assert [pos for pos, _ in batch_refined] == [0, 3, 5, 2]
+    assert batch_failed == [[1, DATA[1]]]
+    assert batch_unrefined == [[4, DATA[4]]]
+
+    output = in_input_order(batch_refined + batch_failed + batch_unrefined)
+    assert [entry["en"] for entry in output] == [entry["en"] for entry in DATA]
+    assert [entry["ko"] for entry in output] == [
+        refined[0], DATA[1]["ko"], refined[2], refined[0], DATA[4]["ko"], refined[0]]
+
+
+def test_code_switching_fan_out_sorted_by_id():
+    groups = group_duplicates(DATA)
+    cases = {"Case2": "2", "Case3": "3", "Case4": "4"}
+    results = [build_result(rep, DATA[rep]["ko"], DATA[rep]["en"], cases) for rep in groups]
+
+    fanned = fan_out_results(results, groups, DATA)
+
+    assert [result["id"] for result in fanned] == list(range(len(DATA)))
+    assert [result["original_ko"] for result in fanned] == [entry["ko"] for entry in DATA]
+    assert fanned[5]["code_switched_versions"]["Case2"] == "2"
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+
+from llm.checkpoint import CheckpointWriter, load_checkpoint
+from llm.executor import LLMExecutor, parse_json_response, strip_code_fences
+
+
+@pytest.mark.parametrize("text", [
+    '[{"id": 0}]',
+    '```json\n[{"id": 0}]\n```',
+    '```\n[{"id": 0}]\n```',
+    '  [{"id": 0}]  \n',
+])
+def test_parse_json_response(text):
+    assert parse_json_response(text) == [{"id": 0}]
+
+
+def test_parse_json_response_raises():
+    assert strip_code_fences("```json\nnot json```").strip() == "not json"
+    with pytest.raises(json.JSONDecodeError):
+        parse_json_response("```json\nnot json```")
+
+
+def records_for(unit):
+    if unit == 3:
+        raise RuntimeError("boom")
+    return [{"id": unit * 10}, {"id": unit * 10 + 1}]
+
+
+def test_run_writes_records_in_input_order_and_skips_failures(tmp_path):
+    path = str(tmp_path / "run.checkpoint.jsonl")
+    executor = LLMExecutor(concurrency=4)
+    with CheckpointWriter(path) as checkpoint:
+        produced = executor.run(records_for, range(6), checkpoint, total=6)
+
+    assert produced == 10
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["id"] for line in f] == [0, 1, 10, 11, 20, 21, 40, 41, 50, 51]
+
+
+def test_arun_matches_run(tmp_path):
+    async def worker(unit):
+        return records_for(unit)
+
+    path = str(tmp_path / "run.checkpoint.jsonl")
+    with CheckpointWriter(path) as checkpoint:
+        produced = asyncio.run(LLMExecutor(concurrency=4).arun(worker, range(6), checkpoint, total=6))
+    assert produced == 10
+    assert sorted(load_checkpoint(path)) == [0, 1, 10, 11, 20, 21, 40, 41, 50, 51]
+
+
+def test_run_batches_resumes_matching_batches(tmp_path):
+    path = str(tmp_path / "batches.checkpoint.jsonl")
+    items = list("abcdefg")
+    spans = [(0, 3), (3, 6), (6, 7)]
+    calls = []
+    failures = [3]
+
+    def worker(batch, start):
+        calls.append(start)
+        if start in failures:
+            failures.remove(start)
+            raise RuntimeError("first attempt fails")
+        return {"start": start, "items": batch}
+
+    executor = LLMExecutor(concurrency=1)
+    records = executor.run_batches(items, spans, worker, path, meta={"batch_size": 3})
+    assert [record["id"] for record in records] == [0, 2]
+
+    records = executor.run_batches(items, spans, worker, path, resume=True, meta={"batch_size": 3})
+    assert calls == [0, 3, 6, 3]
+    assert [record["items"] for record in records] == [["a", "b", "c"], ["d", "e", "f"], ["g"]]
+    assert records[0] == {"id": 0, "batch_size": 3, "start": 0, "items": ["a", "b", "c"]}
+
+    # Other settings never reuse the logged batches
+    calls.clear()
+    records = executor.run_batches(items, spans, worker, path, resume=True, meta={"batch_size": 4})
+    assert calls == [0, 3, 6]
+    assert len(records) == 3
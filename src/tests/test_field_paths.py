@@ -0,0 +1,63 @@
+import json
+
+from make_typos_fin import parse_field_paths, perturb_field, perturb_records
+
+
+def mark(text):
+    return text + "!"
+
+
+def test_parse_field_paths():
+    assert parse_field_paths("queries.ko") == [["queries", "ko"]]
+    assert parse_field_paths("queries.ko, answers.ko[].text") == [
+        ["queries", "ko"],
+        ["answers", "ko", "[]", "text"],
+    ]
+    assert parse_field_paths("tags[]") == [["tags", "[]"]]
+    assert parse_field_paths(" , ") == []
+
+
+def test_perturb_field_nested_and_lists():
+    record = {
+        "queries": {"ko": "질문", "en": "question"},
+        "answers": {"ko": [{"text": "답1"}, {"text": "답2"}, {"type": "unanswerable"}]},
+        "tags": ["가", 3, "나"],
+    }
+
+    assert perturb_field(record, ["queries", "ko"], mark) == 1
+    assert perturb_field(record, ["answers", "ko", "[]", "text"], mark) == 2
+    assert perturb_field(record, ["tags", "[]"], mark) == 2
+
+    assert record["queries"] == {"ko": "질문!", "en": "question"}
+    assert record["answers"]["ko"] == [{"text": "답1!"}, {"text": "답2!"}, {"type": "unanswerable"}]
+    assert record["tags"] == ["가!", 3, "나!"]
+
+
+def test_perturb_field_missing_or_wrong_type():
+    record = {"queries": {"ko": None}, "answers": "not a list"}
+
+    assert perturb_field(record, ["queries", "ko"], mark) == 0
+    assert perturb_field(record, ["queries", "ja"], mark) == 0
+    assert perturb_field(record, ["answers", "[]"], mark) == 0
+    assert perturb_field(record, [], mark) == 0
+    assert record == {"queries": {"ko": None}, "answers": "not a list"}
+
+
+def test_perturb_records_only_touches_selected_fields(tmp_path):
+    records = [
+        {"query": "who", "queries": {"ko": "누가 그랬나요"}, "answers": {"ko": [{"text": "서울특별시"}]}},
+        {"query": "what", "queries": {"ko": "무엇을 했나요"}, "answers": {"ko": []}},
+    ]
+    input_file = tmp_path / "in.json"
+    input_file.write_text(json.dumps(records, ensure_ascii=False), encoding="utf-8")
+    output_file = tmp_path / "out.jsonl"
+
+    num_records, num_fields = perturb_records(str(input_file), str(output_file), "queries.ko",
+                                              error_type="substitution")
+
+    assert (num_records, num_fields) == (2, 2)
+    output = [json.loads(line) for line in output_file.read_text(encoding="utf-8").splitlines()]
+    for before, after in zip(records, output):
+        assert after["query"] == before["query"]
+        assert after["answers"] == before["answers"]
+        assert after["queries"]["ko"] != before["queries"]["ko"]
@@ -0,0 +1,149 @@
+import json
+
+import pytest
+
+from llm.batch_jobs import read_batch_results
+from llm.chat import TruncatedResponse
+from llm.executor import LLMExecutor
+from make_code_switching_fused import (assemble_outputs, export_fused_batch, fuse_with_bisection, import_fused_batch,
+                                       is_complete, parse_fused_response, process_fused_data)
+
+# 2 repeats 0; GPT discards the DNA question
+DATA = [
+    {"en": "Where is Seoul?", "ko": "서울은 어디에 있나요?"},
+    {"en": "Is Hong Kong a city?", "ko": "홍콩은 도시인가요?"},
+    {"en": "where is seoul", "ko": "서울은  어디에 있나요"},
+    {"en": "What is DNA?", "ko": "DNA는 무엇인가요?"},
+    {"en": "Who wrote Hamlet?", "ko": "햄릿은 누가"},
+]
+REPRESENTATIVES = [0, 1, 0, 3, 4]
+
+
+def fused_ids(messages):
+    """Pairs of a fused request, by id"""
+    prompt = messages[-1]["content"]
+    batch = prompt.split("Pairs:\n", 1)[1].rsplit("\nOutput: ", 1)[0]
+    return {item["id"]: item for item in json.loads(batch)}
+
+
+def fused_item(idx, pair, cases=("Case2", "Case3", "Case4")):
+    if "DNA" in pair["ko"]:
+        return {"id": idx, "ko": None}
+    return {"id": idx, "ko": pair["ko"] + " (개선)", **{case: f"{pair['en']} ({case})" for case in cases}}
+
+
+class FusedExecutor(LLMExecutor):
+    """Answers fused requests; batches larger than max_items are cut off after their first item"""
+
+    def __init__(self, max_items=100, **kwargs):
+        super().__init__(**kwargs)
+        self.max_items = max_items
+        self.batches = []
+        self.tags = []
+
+    def complete(self, messages, tag="", **kwargs):
+        self.tags.append(tag)
+        if tag != "fused":
+            return f"single ({tag})"
+        pairs = fused_ids(messages)
+        self.batches.append(list(pairs))
+        answer = [fused_item(idx, pair) for idx, pair in pairs.items()]
+        if len(pairs) > self.max_items:
+            raise TruncatedResponse(json.dumps(answer[:1], ensure_ascii=False)[:-1] + ', {"id": ')
+        return json.dumps(answer, ensure_ascii=False)
+
+
+def test_parse_fused_response():
+    text = json.dumps([
+        {"id": 0, "ko": " 서울은 어디에 있나요? ", "Case2": "서울은 where에 있나요?", "Case3": "", "Case4": "Where is 서울?"},
+        {"id": 1, "ko": None},
+        {"id": 2, "ko": "  "},
+        {"id": 3, "Case2": "no ko"},
+        {"id": 9, "ko": "unknown id"},
+    ], ensure_ascii=False)
+    answers = parse_fused_response(text, [0, 1, 2, 3])
+
+    assert answers == {
+        0: {"ko": "서울은 어디에 있나요?", "cases": {"Case2": "서울은 where에 있나요?", "Case4": "Where is 서울?"}},
+        1: {"ko": None, "cases": {}},
+    }
+    assert not is_complete(answers[0]) and is_complete(answers[1])
+
+
+def test_bisection_retries_only_unanswered_items():
+    executor = FusedExecutor(max_items=2)
+    answers = fuse_with_bisection(executor, list(enumerate(DATA)))
+
+    assert answers == parse_fused_response(json.dumps([fused_item(idx, pair) for idx, pair in enumerate(DATA)]),
+                                           list(range(len(DATA))))
+    assert executor.batches == [[0, 1, 2, 3, 4], [1, 2], [3, 4]]
+
+
+def test_partial_answer_is_kept_and_missing_cases_are_asked_one_by_one(tmp_path):
+    class PartialExecutor(FusedExecutor):
+        def complete(self, messages, tag="", **kwargs):
+            if tag != "fused":
+                return super().complete(messages, tag=tag, **kwargs)
+            self.tags.append(tag)
+            pairs = fused_ids(messages)
+            self.batches.append(list(pairs))
+            # Pair 1 never gets its Case3
+            return json.dumps([fused_item(idx, pair, ("Case2", "Case4") if idx == 1 else ("Case2", "Case3", "Case4"))
+                               for idx, pair in pairs.items()], ensure_ascii=False)
+
+    executor = PartialExecutor()
+    refined, _, _, results = process_fused_data(DATA[:2], executor, str(tmp_path / "checkpoint.jsonl"), dedup=False)
+
+    assert executor.batches == [[0, 1], [1]]
+    assert executor.tags == ["fused", "fused", "Case3"]
+    assert results[1]["code_switched_versions"]["Case3"] == "single (Case3)"
+    assert results[1]["code_switched_versions"]["Case2"] == "Is Hong Kong a city? (Case2)"
+
+
+def test_assemble_outputs_copies_answers_to_duplicates_in_input_order():
+    answers = {0: {"ko": "서울", "cases": {"Case2": "a", "Case3": "b", "Case4": "c"}}, 3: {"ko": None, "cases": {}}}
+    refined, failed, unrefined, results = assemble_outputs(DATA, dict(enumerate(REPRESENTATIVES)), answers)
+
+    assert refined == [{"en": DATA[0]["en"], "ko": "서울"}, {"en": DATA[2]["en"], "ko": "서울"}]
+    assert failed == [DATA[3]]
+    assert unrefined == [DATA[1], DATA[4]]
+    assert [result["id"] for result in results] == [0, 1]
+    assert results[1]["code_switched_versions"]["Case5"] == DATA[2]["en"]
+
+
+def expected_outputs():
+    """Every kept pair in input order, duplicates carrying their representative's refined sentence"""
+    refined = [{"en": pair["en"], "ko": DATA[rep]["ko"] + " (개선)"}
+               for pair, rep in zip(DATA, REPRESENTATIVES) if "DNA" not in pair["ko"]]
+    results = [{"id": idx, "original_ko": item["ko"], "original_en": item["en"], "code_switched_versions": {
+        "Case1": item["ko"], **{case: f"{DATA[rep]['en']} ({case})" for case in ("Case2", "Case3", "Case4")},
+        "Case5": item["en"]}}
+        for idx, (item, rep) in enumerate(zip(refined, [rep for rep in REPRESENTATIVES if rep != 3]))]
+    return refined, [DATA[3]], [], results
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 10])
+def test_online_fused_keeps_input_order(tmp_path, batch_size):
+    executor = FusedExecutor(concurrency=4)
+    outputs = process_fused_data(DATA, executor, str(tmp_path / "checkpoint.jsonl"), batch_size=batch_size)
+
+    assert outputs == expected_outputs()
+    assert "Case2" not in executor.tags
+
+
+def test_batch_export_import_round_trip_matches_online(tmp_path):
+    requests_file = tmp_path / "requests.jsonl"
+    results_file = tmp_path / "results.jsonl"
+    export_fused_batch(DATA, str(requests_file), batch_size=2)
+
+    executor = FusedExecutor()
+    with open(requests_file, encoding="utf-8") as requests, open(results_file, "w", encoding="utf-8") as results:
+        for line in requests:
+            request = json.loads(line)
+            content = executor.complete(request["body"]["messages"], tag="fused")
+            results.write(json.dumps({"custom_id": request["custom_id"], "error": None, "response": {
+                "status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}}) + "\n")
+    assert executor.batches == [[0, 1], [3, 4]]
+    assert all(read_batch_results(str(results_file)).values())
+
+    assert import_fused_batch(DATA, str(results_file)) == expected_outputs()
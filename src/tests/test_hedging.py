@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import itertools
+import time
+
+import pytest
+
+from llm.hedging import Hedger, add_hedging_arguments, hedger_from_args, quantile
+
+
+def attempts(*delays, result="ok"):
+    """Request whose n-th attempt sleeps delays[n] seconds (an exception instance is raised instead)"""
+    counter = itertools.count()
+
+    def request():
+        delay = delays[min(next(counter), len(delays) - 1)]
+        if isinstance(delay, Exception):
+            raise delay
+        time.sleep(delay)
+        return result
+
+    return request
+
+
+def async_attempts(*delays, result="ok"):
+    counter = itertools.count()
+
+    async def request():
+        await asyncio.sleep(delays[min(next(counter), len(delays) - 1)])
+        return result
+
+    return request
+
+
+def warm_up(hedger, calls=3):
+    for _ in range(calls):
+        hedger.run(attempts(0))
+
+
+def test_quantile():
+    assert quantile([], 0.5) == 0.0
+    assert quantile([1, 2, 3, 4], 0.5) == 3
+    assert quantile([1, 2, 3, 4], 0.99) == 4
+    assert quantile([1, 2, 3, 4], 0.0) == 1
+
+
+def test_no_threshold_until_enough_samples():
+    hedger = Hedger(min_samples=3)
+    warm_up(hedger, 2)
+    assert hedger.threshold() is None
+    warm_up(hedger, 1)
+    assert hedger.threshold() is not None
+    hedger.close()
+
+
+def test_slow_call_is_hedged_and_duplicate_wins():
+    hedger = Hedger(percentile=50, budget=0.5, min_samples=3)
+    warm_up(hedger)
+
+    started = time.monotonic()
+    assert hedger.run(attempts(0.3, 0)) == "ok"
+    assert time.monotonic() - started < 0.2
+    assert (hedger.hedges, hedger.hedge_wins) == (1, 1)
+
+    # The losing first attempt still runs; once it ends its latency is what the call would have taken
+    time.sleep(0.4)
+    report = hedger.report()
+    assert report["calls"] == 4
+    assert report["max_seconds"] < 0.2 and report["max_unhedged_seconds"] >= 0.3
+    assert report["tail_removed"] > 0.5
+    hedger.close()
+
+
+def test_budget_caps_duplicates():
+    hedger = Hedger(percentile=50, budget=0.25, min_samples=3)
+    warm_up(hedger)
+    hedger.run(attempts(0.2, 0))
+    hedger.run(attempts(0.2, 0))
+
+    # One duplicate for five calls fits a 25% budget, a second one does not
+    assert hedger.hedges == 1
+    hedger.close()
+
+
+def test_failed_attempt_falls_back_to_the_other():
+    hedger = Hedger(percentile=50, budget=1.0, min_samples=3)
+    warm_up(hedger)
+
+    assert hedger.run(attempts(0.05, RuntimeError("server error"))) == "ok"
+    assert hedger.hedge_wins == 0
+    with pytest.raises(RuntimeError):
+        hedger.run(attempts(RuntimeError("server error")))
+    hedger.close()
+
+
+def test_arun_hedges_and_cancels_losers():
+    async def main():
+        hedger = Hedger(percentile=50, budget=0.5, min_samples=3)
+        for _ in range(3):
+            await hedger.arun(async_attempts(0))
+        started = time.monotonic()
+        assert await hedger.arun(async_attempts(10, 0)) == "ok"
+        elapsed = time.monotonic() - started
+        losers = list(hedger._losers)
+        await hedger.aclose()
+        return hedger, elapsed, losers
+
+    hedger, elapsed, losers = asyncio.run(main())
+    assert elapsed < 1
+    assert (hedger.hedges, hedger.hedge_wins) == (1, 1)
+    assert len(losers) == 1 and losers[0].cancelled()
+
+
+def test_hedger_from_args():
+    parser = argparse.ArgumentParser()
+    add_hedging_arguments(parser)
+    assert hedger_from_args(parser.parse_args([]), concurrency=4) is None
+
+    hedger = hedger_from_args(parser.parse_args(["--hedge-percentile", "90", "--hedge-budget", "0.1"]), 4)
+    assert (hedger.percentile, hedger.budget) == (90, 0.1)
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from utils.json_stream import JsonArrayParser, JsonRecordWriter, iter_json_records, salvage_json_array
+
+RECORDS = [
+    {"id": 1, "ko": "첫 번째 \"문장\"", "tags": ["a", "b"]},
+    {"id": 2, "ko": "두 번째, 문장]", "score": 0.5},
+    [1, 2, {"nested": True}],
+    "plain string",
+    12345,
+    None,
+]
+
+
+def feed_in_chunks(text, size):
+    parser = JsonArrayParser()
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    items.extend(parser.close())
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 10000])
+def test_parser_chunked_matches_json_loads(size):
+    text = json.dumps(RECORDS, ensure_ascii=False, indent=2)
+    assert feed_in_chunks(text, size) == RECORDS
+
+
+def test_parser_emits_elements_as_soon_as_complete():
+    parser = JsonArrayParser()
+    assert parser.feed('[{"id": 1}, {"id"') == [{"id": 1}]
+    assert parser.feed(': 2}, 12') == [{"id": 2}]
+    # A number cut off at the end of the buffer may still grow
+    assert parser.feed('3') == []
+    assert parser.feed(']') == [123]
+    assert parser.close() == []
+
+
+def test_parser_rejects_malformed_input():
+    with pytest.raises(ValueError):
+        JsonArrayParser().feed('{"id": 1}')
+    with pytest.raises(ValueError):
+        JsonArrayParser().feed('[{"id": 1}, {"id": oops}')
+    parser = JsonArrayParser()
+    parser.feed('[{"id": 1}')
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_parser_rejects_trailing_data():
+    parser = JsonArrayParser()
+    assert parser.feed('[1, 2] extra') == [1, 2]
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+@pytest.mark.parametrize("name", ["records.json", "records.jsonl"])
+def test_writer_reader_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    with JsonRecordWriter(path) as writer:
+        for record in RECORDS:
+            writer.write(record)
+
+    assert writer.count == len(RECORDS)
+    assert list(iter_json_records(path)) == RECORDS
+
+
+def test_writer_array_layout_matches_json_dump(tmp_path):
+    path = tmp_path / "records.json"
+    with JsonRecordWriter(str(path)) as writer:
+        for record in RECORDS:
+            writer.write(record)
+    assert path.read_text(encoding="utf-8") == json.dumps(RECORDS, ensure_ascii=False, indent=2)
+
+    with JsonRecordWriter(str(path)):
+        pass
+    assert json.loads(path.read_text(encoding="utf-8")) == []
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('Here you go:\n```json\n[{"id": 0}, {"id": 1}]\n```', [{"id": 0}, {"id": 1}]),
+    ('[{"id": 0}, {"id": 1, "ko": "잘린', [{"id": 0}]),
+    ('[{"id": 0}, {"id": 1, "ko": oops}, {"id": 2}]', [{"id": 0}, {"id": 2}]),
+    ('[]', []),
+    ('no array here', []),
+])
+def test_salvage_json_array(text, expected):
+    assert salvage_json_array(text) == expected
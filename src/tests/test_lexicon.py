@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from llm.executor import LLMExecutor
+from make_code_switching_gpt import MULTI_CASE_EXAMPLES
+from make_code_switching_lexicon import (align_case2, align_case4, attach_particle, build_lexicon, fill_with_gpt,
+                                         pick_spans, split_particle, switch_pair)
+
+RECORDS = [{"original_ko": ko, "original_en": en, "code_switched_versions": cases}
+           for ko, en, cases in MULTI_CASE_EXAMPLES]
+
+
+@pytest.mark.parametrize("word, particle, expected", [
+    ("logo", "는", "logo는"),
+    ("capital", "는", "capital은"),
+    ("team", "와", "team과"),
+    ("Seoul", "으로", "Seoul로"),
+    ("car", "로", "car로"),
+    ("city", "를", "city를"),
+    ("city", "에서", "city에서"),
+])
+def test_attach_particle(word, particle, expected):
+    assert attach_particle(word, particle) == expected
+
+
+def test_split_particle():
+    assert split_particle("수도는") == ("수도", "는")
+    assert split_particle("미국") == ("미국", "")
+
+
+def test_align_examples():
+    ko, en, cases = MULTI_CASE_EXAMPLES[0]
+    assert align_case2(ko, en, cases["Case2"]) == [("수도", "capital")]
+    assert align_case4(ko, en, cases["Case4"]) == [("수도", "capital")]
+    # English that is not in the source sentence is never learned
+    assert align_case2(ko, en, "미국의 city는 어디인가?") == []
+
+
+def test_build_lexicon_counts_both_directions():
+    lexicon = build_lexicon(RECORDS)
+    assert lexicon.by_ko["수도"] == [("capital", 2)]
+    assert lexicon.by_en["city"] == [("도시", 1)]
+    assert len(build_lexicon(RECORDS, min_count=2)) == 1
+
+
+def test_pick_spans_prefers_longest_then_most_frequent():
+    candidates = [(0, 1, "a", 5), (0, 2, "ab", 1), (1, 2, "b", 9), (3, 4, "d", 2), (4, 5, "e", 3)]
+    assert pick_spans(candidates, None) == [(0, 2, "ab", 1), (3, 4, "d", 2), (4, 5, "e", 3)]
+    assert pick_spans(candidates, 2) == [(0, 2, "ab", 1), (4, 5, "e", 3)]
+
+
+def test_switch_pair_uses_lexicon_and_validates():
+    lexicon = build_lexicon(RECORDS)
+    assert switch_pair(lexicon, "프랑스의 수도는 어디인가?", "What is the capital of France?") == {
+        "Case2": "프랑스의 capital은 어디인가?",
+        "Case4": "What is the 수도 of France?",
+    }
+    assert switch_pair(lexicon, "일본 음식을 추천해 주세요.", "Recommend some Japanese food.") == {}
+
+
+def test_fill_with_gpt_asks_only_for_missing_cases():
+    class CaseExecutor(LLMExecutor):
+        def __init__(self):
+            super().__init__()
+            self.tags = []
+
+        def complete(self, messages, tag="", **kwargs):
+            self.tags.append(tag)
+            if tag == "all":
+                return json.dumps({"Case2": "gpt Case2", "Case3": "gpt Case3", "Case4": "gpt Case4"})
+            return f"gpt {tag}"
+
+    local = {"Case2": "프랑스의 capital은 어디인가?", "Case4": "What is the 수도 of France?"}
+    pending = [(0, {"ko": "프랑스의 수도는 어디인가?", "en": "What is the capital of France?"}, local),
+               (1, {"ko": "일본 음식을 추천해 주세요.", "en": "Recommend some Japanese food."}, {})]
+    executor = CaseExecutor()
+    filled = fill_with_gpt(pending, executor)
+
+    assert filled[0] == {**local, "Case3": "gpt Case3"}
+    assert filled[1] == {"Case2": "gpt Case2", "Case3": "gpt Case3", "Case4": "gpt Case4"}
+    assert sorted(executor.tags) == ["Case3", "all"]
@@ -0,0 +1,81 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from llm.chat import TruncatedResponse
+from llm.executor import LLMExecutor
+from llm.mock_server import MockChatServer, canned_response, percentile
+
+TYPO_PROMPT = "입력 텍스트:\n" + json.dumps(["안녕하세요", "반갑습니다"], ensure_ascii=False) + "\n\n위 규칙과 형식에 따라"
+
+
+@pytest.fixture
+def server(monkeypatch):
+    mock = MockChatServer(latency_ms=1, latency_dist="fixed")
+    monkeypatch.setenv("OPENAI_BASE_URL", mock.start())
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    yield mock
+    mock.stop()
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return response.status, dict(response.headers), json.loads(response.read())
+
+
+def test_canned_response_matches_script_formats():
+    refine = [{"role": "user", "content": "입력 데이터:\n" + json.dumps([{"id": 0, "en": "a", "ko": "가"}])
+               + "\n\nJSON 배열로"}]
+    assert json.loads(canned_response(refine)) == [{"id": 0, "en": "a", "ko": "가"}]
+
+    typos = json.loads(canned_response([{"role": "user", "content": TYPO_PROMPT}]))
+    assert [record["original"] for record in typos] == ["안녕하세요", "반갑습니다"]
+
+    assert canned_response([{"role": "user", "content": "hello"}]) == "OK"
+
+
+def test_percentile():
+    assert percentile([], 50) == 0.0
+    assert percentile([5, 1, 3], 50) == 3
+    assert percentile(list(range(101)), 99) == 99
+
+
+def test_completion_headers_and_stats(server):
+    status, headers, body = post(server.base_url + "/chat/completions",
+                                 {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hello"}]})
+    assert status == 200
+    assert body["choices"][0]["message"]["content"] == "OK"
+    assert headers["x-ratelimit-limit-requests"] == str(server.rpm)
+
+    stats = server.stats()
+    assert (stats["requests"], stats["completed"], stats["rate_limited"]) == (1, 1, 0)
+
+
+def test_injected_rate_limit(server):
+    server.rate_limit_rate = 1.0
+    with pytest.raises(urllib.error.HTTPError) as error:
+        post(server.base_url + "/chat/completions", {"messages": []})
+    assert error.value.code == 429
+    assert error.value.headers["retry-after-ms"] == "500"
+    assert server.stats()["rate_limited"] == 1
+
+
+def test_executor_against_mock(server):
+    executor = LLMExecutor(concurrency=2, max_retries=0)
+    messages = [{"role": "user", "content": TYPO_PROMPT}]
+    try:
+        assert [record["original"] for record in json.loads(executor.complete(messages, max_tokens=2000))] == \
+            ["안녕하세요", "반갑습니다"]
+
+        streamed = []
+        executor.stream_items(messages, streamed.append, max_tokens=2000)
+        assert [record["original"] for record in streamed] == ["안녕하세요", "반갑습니다"]
+
+        with pytest.raises(TruncatedResponse):
+            executor.complete(messages, max_tokens=20, allow_truncated=False)
+    finally:
+        executor.close()
@@ -0,0 +1,86 @@
+import pytest
+
+from llm.near_dup import (MinHashIndex, differing_span, entity_replacements, jaccard, pair_text, shingles,
+                          strip_particle, substitute)
+from make_code_switching_gpt import CaseReuse
+
+COLDPLAY = ("콜드플레이의 리드 보컬은 누구인가요", "who is the lead singer of the band coldplay")
+RADIOHEAD = ("라디오헤드의 리드 보컬은 누구인가요", "who is the lead singer of the band radiohead")
+SEOUL = ("서울은 어디에 있나요", "where is seoul")
+COLDPLAY_CASES = {
+    "Case2": "콜드플레이의 lead singer는 누구인가요",
+    "Case3": "Who is 콜드플레이의 리드 보컬?",
+    "Case4": "Who is the 리드 보컬 of the band coldplay?",
+}
+
+
+def test_shingles_and_jaccard():
+    assert shingles("abcd") == {"abc", "bcd"}
+    assert shingles("ab") == {"ab"}
+    assert jaccard(frozenset("ab"), frozenset("bc")) == pytest.approx(1 / 3)
+    assert jaccard(frozenset(), frozenset()) == 1.0
+
+
+def test_nearest_finds_template_neighbour_above_threshold():
+    index = MinHashIndex(threshold=0.5)
+    index.add(pair_text(*COLDPLAY), "coldplay")
+    index.add(pair_text(*SEOUL), "seoul")
+
+    similarity, payload = index.nearest(pair_text(*RADIOHEAD))
+    assert payload == "coldplay" and similarity >= 0.5
+    assert index.nearest(pair_text("햄릿은 누가 썼나요", "who wrote hamlet")) is None
+    assert index.nearest(pair_text(*SEOUL)) == (1.0, "seoul")
+
+
+def test_index_rejects_uneven_bands():
+    with pytest.raises(ValueError):
+        MinHashIndex(num_perm=10, bands=4)
+
+
+def test_differing_span():
+    assert differing_span("who sings thriller", "who sings bad romance") == ("thriller", "bad romance")
+    assert differing_span("스릴러를 부른 가수", "배드 로맨스를 부른 가수", word_suffix=False) == ("스릴러", "배드 로맨스")
+    assert differing_span("where is seoul", "where is seoul") is None
+
+
+def test_strip_particle():
+    assert strip_particle("스릴러를") == "스릴러"
+    assert strip_particle("서울에서") == "서울"
+    assert strip_particle("를") == "를"
+
+
+def test_entity_replacements():
+    assert entity_replacements(*COLDPLAY, *RADIOHEAD)[:2] == [("coldplay", "radiohead"), ("콜드플레이", "라디오헤드")]
+    assert entity_replacements(*COLDPLAY, COLDPLAY[0] + "?", COLDPLAY[1].upper()) == []
+    # A different question, or a change in the template words, is not an entity swap
+    assert entity_replacements(*SEOUL, "햄릿은 누가 썼나요", "who wrote hamlet") is None
+    assert entity_replacements(*SEOUL, "서울은 언제 있나요", "when is seoul") is None
+
+
+def test_substitute_keeps_case_and_prefers_longer_spans():
+    replacements = [("thriller", "bad romance"), ("스릴러", "배드 로맨스"), ("스릴", "X")]
+    assert substitute("Who sings Thriller? 스릴러를 부른 가수", replacements) == "Who sings Bad romance? 배드 로맨스를 부른 가수"
+    assert substitute("nothing to replace", replacements) is None
+    assert substitute("unchanged", []) == "unchanged"
+
+
+def test_case_reuse_swaps_entity_or_offers_example():
+    reuse = CaseReuse(0.5, entity_swap=True)
+    reuse.add(*COLDPLAY, COLDPLAY_CASES)
+    # Answers that fail validation are never indexed
+    reuse.add(*SEOUL, {"Case2": "", "Case3": "", "Case4": ""})
+    assert len(reuse.index) == 1
+
+    swapped, example = reuse.lookup(*RADIOHEAD)
+    assert example is None
+    assert swapped == {
+        "Case2": "라디오헤드의 lead singer는 누구인가요",
+        "Case3": "Who is 라디오헤드의 리드 보컬?",
+        "Case4": "Who is the 리드 보컬 of the band radiohead?",
+    }
+    assert reuse.lookup(*SEOUL) == (None, None)
+    assert (reuse.lookups, reuse.near, reuse.swapped) == (2, 1, 1)
+
+    without_swap = CaseReuse(0.5)
+    without_swap.add(*COLDPLAY, COLDPLAY_CASES)
+    assert without_swap.lookup(*RADIOHEAD) == (None, (*COLDPLAY, COLDPLAY_CASES))
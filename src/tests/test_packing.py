@@ -0,0 +1,52 @@
+import argparse
+
+from llm.packing import add_packing_arguments, batch_spans, fixed_spans, halves, pack_spans
+
+
+def length(text):
+    return len(text)
+
+
+def test_fixed_spans():
+    assert fixed_spans(7, 3) == [(0, 3), (3, 6), (6, 7)]
+    assert fixed_spans(0, 3) == []
+
+
+def test_pack_spans_fills_budget_in_order():
+    items = ["aaaa", "bbb", "cc", "dddddd", "e", "f"]
+    assert pack_spans(items, length, budget=7, max_items=50) == [(0, 2), (2, 3), (3, 5), (5, 6)]
+
+
+def test_pack_spans_oversized_item_gets_own_batch():
+    items = ["a", "bbbbbbbbbb", "c"]
+    assert pack_spans(items, length, budget=5, max_items=50) == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_pack_spans_caps_items_per_batch():
+    assert pack_spans(["x"] * 7, length, budget=100, max_items=3) == [(0, 3), (3, 6), (6, 7)]
+
+
+def test_spans_cover_every_item_once():
+    items = ["x" * (i % 5 + 1) for i in range(37)]
+    for spans in (pack_spans(items, length, 9, 4), batch_spans(items, 5, length, 0)):
+        assert [idx for start, end in spans for idx in range(start, end)] == list(range(len(items)))
+
+
+def test_batch_spans_without_budget_uses_batch_size():
+    items = ["x" * 50] * 5
+    assert batch_spans(items, 2, length, budget=0) == fixed_spans(5, 2)
+    assert batch_spans(items, 2, length, budget=120) == [(0, 2), (2, 4), (4, 5)]
+    assert batch_spans(items, 2, length, budget=1000, max_items=3) == [(0, 3), (3, 5)]
+
+
+def test_halves():
+    assert halves([1, 2, 3, 4, 5]) == ([1, 2, 3], [4, 5])
+    assert halves([1]) == ([1], [])
+
+
+def test_token_budget_is_opt_in():
+    parser = argparse.ArgumentParser()
+    add_packing_arguments(parser, max_tokens=4000)
+    assert parser.parse_args([]).token_budget == 0
+    assert parser.parse_args(["--token-budget"]).token_budget == 3200
+    assert parser.parse_args(["--token-budget", "100"]).token_budget == 100
@@ -0,0 +1,42 @@
+import pytest
+
+from llm.prescreen import PairScreen, ScreenReport, looks_truncated
+
+
+@pytest.mark.parametrize("ko, truncated", [
+    ("서울은 어디에 있나요?", False),
+    ("이 문장의 뜻을 설명해 줘", False),
+    ("알아야 할 모든 것", False),
+    ("한국의 수도를", True),
+    ("미국 대통령은 누구", False),
+    ("미국 대통령은 누구 ㄴ", True),
+    ("대통령은 누 구", True),
+    ("", False),
+])
+def test_looks_truncated(ko, truncated):
+    assert looks_truncated(ko) == truncated
+
+
+@pytest.mark.parametrize("en, ko, reasons", [
+    ("Where is Seoul?", "서울은 어디에 있나요?", []),
+    ("Where is Seoul?", "  ", ["empty"]),
+    ("When was Apple founded?", "Apple 회사는 언제 설립되었나요?", ["latin"]),
+    ("What is the capital of Korea?", "한국의 수도를", ["truncated"]),
+    ("What is 42?", "42는?", ["low_hangul"]),
+    ("Can you tell me where the capital city of the Republic of Korea is located?", "수도는?", ["length_ratio"]),
+])
+def test_pair_screen_reasons(en, ko, reasons):
+    assert PairScreen().reasons({"en": en, "ko": ko}) == reasons
+
+
+def test_screen_report():
+    report = ScreenReport()
+    for reasons in ([], ["latin"], ["latin", "truncated"], []):
+        report.add(reasons)
+    report.calls_before, report.calls_after = 4, 1
+
+    assert (report.total, report.flagged, report.passed) == (4, 2, 2)
+    assert report.to_dict()["reasons"] == {"empty": 0, "latin": 2, "truncated": 1, "low_hangul": 0,
+                                           "length_ratio": 0}
+    assert "latin 2, truncated 1" in report.summary()
+    assert report.to_dict()["calls_avoided"] == 3
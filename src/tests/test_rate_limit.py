@@ -0,0 +1,76 @@
+import pytest
+
+from llm.rate_limit import (RateLimiter, estimate_text_tokens, estimate_tokens, parse_duration,
+                            retry_after_from_headers)
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("1s", 1.0),
+    ("6m0s", 360.0),
+    ("20ms", 0.02),
+    ("1h2m3.5s", 3723.5),
+    ("2.5", 2.5),
+    ("", None),
+    (None, None),
+    ("soon", None),
+])
+def test_parse_duration(value, seconds):
+    if seconds is None:
+        assert parse_duration(value) is None
+    else:
+        assert parse_duration(value) == pytest.approx(seconds)
+
+
+def test_estimate_tokens():
+    assert estimate_text_tokens("abcdefgh") == 2
+    assert estimate_text_tokens("안녕하세요") == 5
+    assert estimate_tokens([{"role": "user", "content": "abcd"}, {"role": "system", "content": None}], 100) == 109
+
+
+def test_retry_after_from_headers():
+    assert retry_after_from_headers({"retry-after-ms": "1500"}) == 1.5
+    assert retry_after_from_headers({"retry-after": "2s"}) == 2.0
+    assert retry_after_from_headers({"retry-after": "10m"}) == 60.0
+    assert retry_after_from_headers({}) is None
+    assert retry_after_from_headers(None) is None
+
+
+def test_burst_then_wait():
+    # 60 RPM with a 10 s burst: ten requests go out at once, the eleventh waits about a second
+    limiter = RateLimiter(rpm=60, tpm=1_000_000)
+    waits = [limiter.reserve(10) for _ in range(11)]
+    assert waits[:10] == [0.0] * 10
+    assert waits[10] == pytest.approx(1.0, abs=0.05)
+
+
+def test_headers_respect_explicit_ceiling():
+    limiter = RateLimiter(rpm=100)
+    limiter.update_from_headers({"x-ratelimit-limit-requests": "5000", "x-ratelimit-limit-tokens": "400000"})
+    assert limiter.rpm == 100
+    assert limiter.tpm == 400000
+
+
+def test_rate_limited_halves_throughput_once_per_burst():
+    limiter = RateLimiter(rpm=600)
+    limiter.on_rate_limited(retry_after=0)
+    limiter.on_rate_limited(retry_after=0)
+    assert limiter.factor == 0.5
+    assert limiter.throttled == 2
+    assert limiter.reserve(1) > 0
+
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.factor == pytest.approx(0.6)
+
+
+def test_usage_refund_never_returns_more_than_was_taken():
+    # A 10 s burst at 600 TPM holds 100 tokens; a 1000-token estimate can only take those 100
+    limiter = RateLimiter(rpm=600, tpm=600)
+    reserved = limiter.acquire(1000)
+    assert reserved == 100
+    limiter.record_usage(reserved, 40)
+    assert limiter._tokens == pytest.approx(60, abs=1)
+
+    # The refund is capped at the bucket size
+    limiter.record_usage(100, 0)
+    assert limiter._tokens <= 100
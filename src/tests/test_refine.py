@@ -0,0 +1,166 @@
+import json
+
+import pytest
+
+from llm.batch_jobs import read_batch_results
+from llm.chat import TruncatedResponse
+from llm.executor import LLMExecutor
+from llm.prescreen import PairScreen
+from refine_korean_with_gpt import (export_refine_batch, import_refine_batch, parse_refine_response,
+                                    refine_korean_translations, refine_with_bisection)
+
+ENTRIES = [{"en": f"Question {i}?", "ko": f"질문 {i}"} for i in range(6)]
+
+
+def batch_ids(messages):
+    """Ids of the items in a refine request"""
+    prompt = messages[-1]["content"]
+    batch = prompt.split("입력 데이터:\n", 1)[1].rsplit("\n\nJSON", 1)[0]
+    return [item["id"] for item in json.loads(batch)]
+
+
+def answer(ids):
+    return json.dumps([{"id": idx, "ko": f"개선된 질문 {idx}"} for idx in ids], ensure_ascii=False)
+
+
+class FakeExecutor:
+    """Answers refine requests; batches larger than max_items are cut off after their first item"""
+
+    def __init__(self, max_items=2, fail=False):
+        self.max_items = max_items
+        self.fail = fail
+        self.batches = []
+
+    def complete(self, messages, **kwargs):
+        ids = batch_ids(messages)
+        self.batches.append(ids)
+        if self.fail:
+            raise RuntimeError("server error")
+        if len(ids) > self.max_items:
+            raise TruncatedResponse(answer(ids[:1])[:-1] + ', {"id": ' + str(ids[1]) + ', "ko": "개선')
+        return answer(ids)
+
+
+def test_parse_refine_response_keeps_only_wanted_well_formed_items():
+    text = json.dumps([{"id": 0, "ko": "가"}, {"id": 1, "ko": None}, {"id": 2, "ko": 3}, {"id": 9, "ko": "나"},
+                       {"ko": "다"}], ensure_ascii=False)
+    assert parse_refine_response(text, [0, 1, 2, 3]) == {0: "가", 1: None}
+
+
+def test_bisection_retries_only_missing_ids():
+    executor = FakeExecutor(max_items=2)
+    refined = refine_with_bisection(executor, list(enumerate(ENTRIES)))
+
+    assert refined == {idx: f"개선된 질문 {idx}" for idx in range(6)}
+    # The first item of each truncated answer is kept and only the rest is split again
+    assert executor.batches == [[0, 1, 2, 3, 4, 5], [1, 2, 3], [2], [3], [4, 5]]
+
+
+def test_api_error_is_not_split():
+    executor = FakeExecutor(fail=True)
+    assert refine_with_bisection(executor, list(enumerate(ENTRIES))) == {}
+    assert executor.batches == [[0, 1, 2, 3, 4, 5]]
+
+
+# Flagged by the pre-screen: 0, 2, 3, 5 and 7; 3 repeats 0 and 6 repeats 1; GPT discards the DNA question
+PAIRS = [
+    {"en": "When was Apple founded?", "ko": "Apple 회사는 언제 설립되었나요?"},
+    {"en": "Where is Seoul?", "ko": "서울은 어디에 있나요?"},
+    {"en": "What is the capital of Korea?", "ko": "한국의 수도를"},
+    {"en": "When was Apple founded?", "ko": "Apple 회사는 언제 설립되었나요?"},
+    {"en": "Is Hong Kong a city?", "ko": "홍콩은 도시인가요?"},
+    {"en": "What is DNA?", "ko": "DNA는 무엇인가요?"},
+    {"en": "Where is Seoul", "ko": "서울은 어디에 있나요"},
+    {"en": "Who is the president of the United States?", "ko": "미국 대통령은 누구를"},
+]
+
+
+def refine_answer(messages):
+    """GPT stand-in: marks each refined sentence, or null for the DNA question"""
+    prompt = messages[-1]["content"]
+    batch = json.loads(prompt.split("입력 데이터:\n", 1)[1].rsplit("\n\nJSON", 1)[0])
+    return json.dumps([{"id": item["id"], "ko": None if "DNA" in item["ko"] else item["ko"] + " (개선)"}
+                       for item in batch], ensure_ascii=False)
+
+
+class RefineExecutor(LLMExecutor):
+    def complete(self, messages, **kwargs):
+        return refine_answer(messages)
+
+
+# Input position of the first pair of each pair's duplicate group
+REPRESENTATIVES = [0, 1, 2, 0, 4, 5, 1, 7]
+
+
+def expected_output(screen):
+    """Every pair but the discarded one, in input order; screened pairs get their group's refined sentence"""
+    output = []
+    for pair, rep in zip(PAIRS, REPRESENTATIVES):
+        if "DNA" in pair["ko"]:
+            continue
+        sent = screen is None or screen.reasons(PAIRS[rep])
+        output.append({"en": pair["en"], "ko": PAIRS[rep]["ko"] + " (개선)" if sent else pair["ko"]})
+    return output
+
+
+def read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def input_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    path = tmp_path / "pairs.json"
+    path.write_text(json.dumps(PAIRS, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("screen", [PairScreen(), None])
+@pytest.mark.parametrize("batch_size", [1, 2, 10])
+def test_online_refine_keeps_input_order(tmp_path, input_file, screen, batch_size):
+    output_file = str(tmp_path / "refined.json")
+    refine_korean_translations(input_file, output_file, batch_size=batch_size,
+                               executor=RefineExecutor(concurrency=4), screen=screen)
+
+    assert read_json(output_file) == expected_output(screen)
+    assert read_json(output_file.replace(".json", "_discarded.json")) == [PAIRS[5]]
+
+
+@pytest.mark.parametrize("screen", [PairScreen(), None])
+def test_batch_export_import_round_trip_keeps_input_order(tmp_path, input_file, screen):
+    requests_file = tmp_path / "requests.jsonl"
+    results_file = tmp_path / "results.jsonl"
+    output_file = str(tmp_path / "refined.json")
+    export_refine_batch(input_file, str(requests_file), batch_size=2, screen=screen)
+
+    with open(requests_file, encoding="utf-8") as requests, open(results_file, "w", encoding="utf-8") as results:
+        for line in requests:
+            request = json.loads(line)
+            content = refine_answer(request["body"]["messages"])
+            results.write(json.dumps({"custom_id": request["custom_id"], "error": None, "response": {
+                "status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}}) + "\n")
+    assert all(read_batch_results(str(results_file)).values())
+
+    import_refine_batch(input_file, str(results_file), output_file, screen=screen)
+
+    assert read_json(output_file) == expected_output(screen)
+    assert read_json(output_file.replace(".json", "_discarded.json")) == [PAIRS[5]]
+
+
+def test_import_uses_answers_for_entries_the_screen_passes(tmp_path, input_file):
+    """Results exported without the pre-screen are merged in full even when importing with it"""
+    requests_file = tmp_path / "requests.jsonl"
+    results_file = tmp_path / "results.jsonl"
+    output_file = str(tmp_path / "refined.json")
+    export_refine_batch(input_file, str(requests_file), batch_size=3, screen=None)
+    with open(requests_file, encoding="utf-8") as requests, open(results_file, "w", encoding="utf-8") as results:
+        for line in requests:
+            request = json.loads(line)
+            results.write(json.dumps({"custom_id": request["custom_id"], "error": None, "response": {
+                "status_code": 200,
+                "body": {"choices": [{"message": {"content": refine_answer(request["body"]["messages"])}}]}}}) + "\n")
+
+    import_refine_batch(input_file, str(results_file), output_file, screen=PairScreen())
+
+    assert read_json(output_file) == expected_output(None)
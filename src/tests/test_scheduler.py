@@ -0,0 +1,79 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from llm.scheduler import ReorderBuffer, aiter_ordered, iter_ordered, window_for
+from make_code_switching_gpt import iter_work_units
+
+
+def test_reorder_buffer_releases_in_sequence():
+    buffer = ReorderBuffer()
+    assert buffer.add(2, "c") == []
+    assert buffer.add(1, "b") == []
+    assert len(buffer) == 2
+    assert buffer.add(0, "a") == ["a", "b", "c"]
+    assert buffer.add(4, "e") == []
+    assert buffer.add(3, "d") == ["d", "e"]
+    assert len(buffer) == 0
+    assert buffer.next_seq == 5
+
+
+def test_window_for():
+    assert window_for(4) == 16
+    assert window_for(4, max_pending=10) == 10
+    assert window_for(4, max_pending=2) == 4
+
+
+def slow_square(n):
+    time.sleep(random.uniform(0, 0.005))
+    if n == 7:
+        raise ValueError("seven")
+    return n * n
+
+
+def test_iter_ordered_keeps_input_order_and_errors():
+    released = [(unit, future) for unit, future in iter_ordered(slow_square, range(30), max_workers=8)]
+
+    assert [unit for unit, _ in released] == list(range(30))
+    assert [future.result() for unit, future in released if unit != 7] == [n * n for n in range(30) if n != 7]
+    with pytest.raises(ValueError):
+        released[7][1].result()
+
+
+def test_iter_ordered_reads_input_lazily():
+    pulled = []
+
+    def units():
+        for n in range(100):
+            pulled.append(n)
+            yield n
+
+    # Unit 0 is slow, so nothing is released until it finishes and the window stops reading ahead
+    def worker(n):
+        time.sleep(0.05 if n == 0 else 0)
+        return n
+
+    ordered = iter_ordered(worker, units(), max_workers=2, max_pending=6)
+    unit, _ = next(ordered)
+    assert unit == 0
+    assert len(pulled) == 6
+    assert [unit for unit, _ in ordered] == list(range(1, 100))
+
+
+def test_aiter_ordered_keeps_input_order():
+    async def worker(n):
+        await asyncio.sleep(random.uniform(0, 0.005))
+        return n * n
+
+    async def collect():
+        return [(unit, task.result()) async for unit, task in aiter_ordered(worker, range(30), concurrency=8)]
+
+    assert asyncio.run(collect()) == [(n, n * n) for n in range(30)]
+
+
+def test_iter_work_units():
+    data = [{"ko": str(i), "en": str(i)} for i in range(7)]
+    units = list(iter_work_units(data, items_per_request=3, skip_ids={1, 5}))
+    assert [[idx for idx, _ in unit] for unit in units] == [[0, 2, 3], [4, 6]]
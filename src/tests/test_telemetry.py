@@ -0,0 +1,64 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from llm.telemetry import Telemetry, estimate_cost
+
+
+def usage(prompt_tokens, completion_tokens, cached_tokens=0):
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens))
+
+
+def test_estimate_cost():
+    assert estimate_cost("gpt-4o-mini", 1_000_000, 0, 1_000_000) == pytest.approx(0.75)
+    assert estimate_cost("gpt-4o-mini", 1_000_000, 1_000_000, 0) == pytest.approx(0.075)
+    assert estimate_cost("unknown-model", 1_000_000, 0, 1_000_000) == 0.0
+
+
+def test_snapshot_totals_and_series():
+    telemetry = Telemetry("test")
+    for tag, latency in (("batch", 1.0), ("batch", 3.0), ("single", 2.0)):
+        telemetry.request_started()
+        telemetry.request_finished("gpt-4o-mini", tag, latency, retries=1, usage=usage(100, 50, cached_tokens=20))
+    telemetry.request_started()
+    telemetry.request_finished("gpt-4o-mini", "batch", 0.0, cache_hit=True)
+    telemetry.request_started()
+
+    snapshot = telemetry.snapshot()
+    totals = snapshot["totals"]
+    assert (totals["requests"], totals["cache_hits"], totals["retries"]) == (4, 1, 3)
+    assert (totals["prompt_tokens"], totals["cached_tokens"], totals["completion_tokens"]) == (300, 60, 150)
+    assert snapshot["in_flight"] == 1
+    assert [(row["tag"], row["requests"]) for row in snapshot["series"]] == [("batch", 3), ("single", 1)]
+    # Cache hits are left out of the latency quantiles
+    assert snapshot["latency_p50_seconds"] == 2.0
+    assert snapshot["estimated_cost_usd"] == pytest.approx(estimate_cost("gpt-4o-mini", 300, 60, 150))
+
+
+def test_prometheus_output():
+    telemetry = Telemetry("refine")
+    telemetry.request_started()
+    telemetry.request_finished("gpt-4o-mini", "batch", 1.5, usage=usage(10, 5))
+
+    text = telemetry.to_prometheus()
+    assert '# TYPE llm_requests_total counter' in text
+    assert 'llm_requests_total{script="refine",model="gpt-4o-mini",tag="batch"} 1' in text
+    assert 'llm_request_latency_seconds{script="refine",quantile="0.99"} 1.5' in text
+
+
+@pytest.mark.parametrize("name", ["metrics.json", "metrics.prom"])
+def test_close_writes_metrics_file(tmp_path, name):
+    path = tmp_path / name
+    telemetry = Telemetry("typo", metrics_file=str(path), interval=60)
+    telemetry.request_started()
+    telemetry.request_finished("gpt-4o-mini", "batch", 1.0, usage=usage(10, 5))
+    telemetry.close()
+
+    text = path.read_text(encoding="utf-8")
+    if name.endswith(".prom"):
+        assert text.startswith("# HELP llm_requests_total")
+    else:
+        assert json.loads(text)["totals"]["requests"] == 1
+    assert not (tmp_path / (name + ".tmp")).exists()
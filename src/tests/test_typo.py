@@ -0,0 +1,250 @@
+import json
+
+import pytest
+
+from generate_typos_with_gpt_improved import (ERROR_TYPES, VARIANT_ERRORS, generate_typos_batch, generate_typos_local,
+                                              is_typo_record, match_typo_records, parse_score_response,
+                                              process_dataset_hybrid, rate_stats, score_typo_batch,
+                                              summarize_typo_quality)
+from llm.chat import TruncatedResponse
+from llm.executor import LLMExecutor
+
+SENTENCES = ["서울은 어디에 있나요?", "햄릿은 누가 썼나요?", "홍콩은 도시인가요?", "DNA는 무엇인가요?",
+             "미국 대통령은 누구인가요?", "프랑스의 수도는 어디인가?"]
+
+
+def score_ids(messages):
+    """Ids of the records in a scoring request"""
+    prompt = messages[-1]["content"]
+    batch = prompt.split("채점할 오타:\n", 1)[1].rsplit("\n\nJSON", 1)[0]
+    return [item["id"] for item in json.loads(batch)]
+
+
+def score_answer(ids, natural=4):
+    variant = {"natural": natural, "exact": True}
+    return json.dumps([{"id": idx, **{error_type: {key: variant for key in VARIANT_ERRORS}
+                                      for error_type in ERROR_TYPES}} for idx in ids])
+
+
+class ScoreExecutor(LLMExecutor):
+    """Scores every variant; batches larger than max_items are cut off after their first record"""
+
+    def __init__(self, max_items=100, **kwargs):
+        super().__init__(**kwargs)
+        self.max_items = max_items
+        self.batches = []
+
+    def complete(self, messages, **kwargs):
+        assert kwargs["tag"] == "score"
+        ids = score_ids(messages)
+        self.batches.append(ids)
+        if len(ids) > self.max_items:
+            raise TruncatedResponse(score_answer(ids[:1])[:-1] + ', {"id": ' + str(ids[1]))
+        return score_answer(ids)
+
+
+def full_scores(natural, exact=True):
+    return {error_type: {key: {"natural": natural, "exact": exact} for key in VARIANT_ERRORS}
+            for error_type in ERROR_TYPES}
+
+
+def typo_record(text):
+    return {"original": text, **{error_type: {key: f"{text} ({error_type} {key})" for key in VARIANT_ERRORS}
+                                 for error_type in ERROR_TYPES}}
+
+
+def typo_texts(messages):
+    """Sentences of a typo generation request"""
+    prompt = messages[-1]["content"]
+    return json.loads(prompt.split("입력 텍스트:\n", 1)[1].rsplit("\n\n위 규칙", 1)[0])
+
+
+class StreamExecutor:
+    """Streams typo records, answering each batch with answer(texts) -> (elements, error raised after them)"""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.batches = []
+
+    def stream_items(self, messages, on_item, **kwargs):
+        texts = typo_texts(messages)
+        self.batches.append(texts)
+        elements, error = self.answer(texts)
+        for element in elements:
+            on_item(element)
+        if error is not None:
+            raise error
+        return json.dumps(elements, ensure_ascii=False)
+
+
+class CompleteExecutor(StreamExecutor):
+    """The same answers as a plain completion, cut-off answers raising TruncatedResponse with their text"""
+
+    def complete(self, messages, **kwargs):
+        texts = typo_texts(messages)
+        self.batches.append(texts)
+        elements, error = self.answer(texts)
+        content = json.dumps(elements, ensure_ascii=False)
+        if isinstance(error, TruncatedResponse):
+            raise TruncatedResponse(content[:-1])
+        if error is not None:
+            raise error
+        return content
+
+
+def test_match_typo_records_aligns_by_original():
+    entries = [{"ko": text} for text in SENTENCES[:3]]
+    records = [typo_record(SENTENCES[2]), "junk", typo_record(" 서울은  어디에 있나요 ")]
+    assert match_typo_records(entries, records) == [records[2], None, records[0]]
+
+
+def test_stream_reordered_records_come_back_in_input_order():
+    executor = StreamExecutor(lambda texts: ([typo_record(text) for text in reversed(texts)], None))
+    results = generate_typos_batch(executor, [{"ko": text} for text in SENTENCES], stream=True)
+
+    assert [result["original"] for result in results] == SENTENCES
+    assert executor.batches == [SENTENCES]
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_retries_only_dropped_sentences(stream):
+    answer = lambda texts: ([typo_record(text) for text in texts if "DNA" not in text], None)
+    executor = StreamExecutor(answer) if stream else CompleteExecutor(answer)
+    results = generate_typos_batch(executor, [{"ko": text} for text in SENTENCES], stream=stream)
+
+    assert [result and result["original"] for result in results] == SENTENCES[:3] + [None] + SENTENCES[4:]
+    assert executor.batches == [SENTENCES, [SENTENCES[3]]]
+
+
+@pytest.mark.parametrize("error", [TruncatedResponse("cut"), ValueError("bad record")])
+def test_stream_keeps_records_before_a_cut_and_retries_the_rest(error):
+    def answer(texts):
+        if len(texts) > 2:
+            return [typo_record(texts[0]), typo_record(texts[1])], error
+        return [typo_record(text) for text in texts], None
+
+    executor = StreamExecutor(answer)
+    results = generate_typos_batch(executor, [{"ko": text} for text in SENTENCES], stream=True)
+
+    assert [result["original"] for result in results] == SENTENCES
+    assert executor.batches == [SENTENCES, SENTENCES[2:], SENTENCES[4:]]
+
+
+def test_stream_malformed_record_cancels_the_request():
+    def answer(texts):
+        if len(texts) == 3:
+            return [typo_record(texts[0]), {"original": texts[1]}, typo_record(texts[2])], None
+        return [typo_record(text) for text in texts], None
+
+    executor = StreamExecutor(answer)
+    results = generate_typos_batch(executor, [{"ko": text} for text in SENTENCES[:3]], stream=True)
+
+    assert [result["original"] for result in results] == SENTENCES[:3]
+    # The record after the malformed one is never read; both remaining sentences are asked again
+    assert executor.batches == [SENTENCES[:3], SENTENCES[1:3]]
+
+
+def test_stream_truncated_before_any_record_splits_the_batch():
+    def answer(texts):
+        if len(texts) > 2:
+            return [], TruncatedResponse("")
+        return [typo_record(text) for text in texts], None
+
+    executor = StreamExecutor(answer)
+    results = generate_typos_batch(executor, [{"ko": text} for text in SENTENCES], stream=True)
+
+    assert [result["original"] for result in results] == SENTENCES
+    assert executor.batches == [SENTENCES, SENTENCES[:3], SENTENCES[:2], SENTENCES[2:3],
+                                SENTENCES[3:], SENTENCES[3:5], SENTENCES[5:]]
+
+
+def test_complete_drops_malformed_records_and_retries_them():
+    def answer(texts):
+        if len(texts) == 3:
+            return [typo_record(texts[0]), {"original": texts[1]}, typo_record(texts[2])], None
+        return [typo_record(text) for text in texts], None
+
+    executor = CompleteExecutor(answer)
+    results = generate_typos_batch(executor, [{"ko": text} for text in SENTENCES[:3]])
+
+    assert [result["original"] for result in results] == SENTENCES[:3]
+    assert executor.batches == [SENTENCES[:3], SENTENCES[1:2]]
+
+
+def test_stream_api_error_is_not_retried():
+    executor = StreamExecutor(lambda texts: ([], RuntimeError("server error")))
+    assert generate_typos_batch(executor, [{"ko": text} for text in SENTENCES], stream=True) == [None] * 6
+    assert executor.batches == [SENTENCES]
+
+
+def test_generate_typos_local_matches_gpt_record_format():
+    record, exact = generate_typos_local(SENTENCES[0])
+    assert is_typo_record(record)
+    assert record["original"] == SENTENCES[0]
+    assert set(exact) == set(ERROR_TYPES)
+    assert all(set(flags) == set(VARIANT_ERRORS) for flags in exact.values())
+
+
+def test_parse_score_response_clamps_and_skips_malformed_items():
+    text = json.dumps([
+        {"id": 0, "substitution": {"1_error": {"natural": 9, "exact": True}, "2_errors": {"natural": 0}}},
+        {"id": 1, "deletion": {"1_error": {"natural": "high"}}},
+        {"id": 2, "spacing": "good"},
+        {"id": 7, "substitution": {"1_error": {"natural": 3, "exact": True}}},
+    ])
+    assert parse_score_response(text, [0, 1, 2]) == {
+        0: {"substitution": {"1_error": {"natural": 5, "exact": True}, "2_errors": {"natural": 1, "exact": False}}}
+    }
+
+
+def test_score_typo_batch_splits_truncated_batches():
+    executor = ScoreExecutor(max_items=2)
+    items = [(idx, {"original": text}) for idx, text in enumerate(SENTENCES[:4])]
+
+    assert score_typo_batch(executor, items) == {idx: full_scores(4) for idx in range(4)}
+    assert executor.batches == [[0, 1, 2, 3], [0, 1], [2, 3]]
+
+
+def test_rate_stats():
+    assert rate_stats([]) == {"count": 0, "mean": None, "ci95": None}
+    assert rate_stats([4]) == {"count": 1, "mean": 4.0, "ci95": 0.0}
+    assert rate_stats([1, 2, 3]) == {"count": 3, "mean": 2.0, "ci95": 1.132}
+
+
+def test_summarize_typo_quality():
+    exact_flags = [{error_type: {"1_error": True, "2_errors": error_type != "spacing"} for error_type in ERROR_TYPES}
+                   for _ in range(2)]
+    quality = summarize_typo_quality(exact_flags, {0: full_scores(2, exact=False), 1: full_scores(4)})
+
+    assert (quality["sentences"], quality["variants"]) == (2, 20)
+    assert quality["local_exact_rate"] == 0.9
+    assert quality["by_type"]["spacing"]["local_exact_rate"] == 0.5
+    assert (quality["scored_sentences"], quality["scored_variants"]) == (2, 20)
+    assert quality["natural"]["mean"] == 3.0
+    assert quality["gpt_exact"]["mean"] == 0.5
+    assert quality["low_natural_rate"] == 0.5
+
+
+def test_hybrid_generates_locally_and_scores_only_the_sample(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    input_file = tmp_path / "sentences.json"
+    input_file.write_text(json.dumps(SENTENCES, ensure_ascii=False), encoding="utf-8")
+    output_file = str(tmp_path / "typos.json")
+    executor = ScoreExecutor()
+
+    assert process_dataset_hybrid(str(input_file), output_file, batch_size=2, executor=executor,
+                                  verify_sample=3, seed=1) == len(SENTENCES)
+
+    with open(output_file, encoding="utf-8") as f:
+        records = json.load(f)
+    assert [record["original"] for record in records] == SENTENCES
+    assert all(is_typo_record(record) for record in records)
+    scored = sorted(idx for batch in executor.batches for idx in batch)
+    assert len(scored) == 3 and len(executor.batches) == 2
+
+    with open(output_file.replace(".json", "_quality.json"), encoding="utf-8") as f:
+        quality = json.load(f)
+    assert (quality["sentences"], quality["scored_sentences"]) == (len(SENTENCES), 3)
+    assert quality["natural"]["mean"] == 4.0
+    # All scores tie, so the ten lowest are the variants of the first sampled sentence
+    assert [item["original"] for item in quality["lowest_natural"]] == [SENTENCES[scored[0]]] * 10
@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+from llm.executor import LLMExecutor
+from llm.work_queue import WorkQueue, job_fingerprint
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "queue.sqlite")
+
+
+def test_job_fingerprint_ignores_key_order():
+    assert job_fingerprint({"a": 1, "b": [1, 2]}) == job_fingerprint({"b": [1, 2], "a": 1})
+    assert job_fingerprint({"a": 1}) != job_fingerprint({"a": 2})
+
+
+def test_prepare_refuses_a_different_job(db_path):
+    queue = WorkQueue(db_path, worker_id="a")
+    queue.prepare(3, "job-1")
+    queue.prepare(3, "job-1")
+    assert queue.counts() == {"pending": 3, "leased": 0, "done": 0, "failed": 0}
+    with pytest.raises(ValueError):
+        WorkQueue(db_path, worker_id="b").prepare(3, "job-2")
+    queue.close()
+
+
+def test_claim_complete_and_records_in_unit_order(db_path):
+    queue = WorkQueue(db_path, worker_id="a")
+    queue.prepare(3, "job")
+
+    assert [queue.claim() for _ in range(4)] == [0, 1, 2, None]
+    for key in (2, 0, 1):
+        queue.complete(key, [{"unit": key, "part": 0}, {"unit": key, "part": 1}])
+
+    assert queue.finished()
+    assert [(record["unit"], record["part"]) for record in queue.records()] == [
+        (0, 0), (0, 1), (1, 0), (1, 1), (2, 0), (2, 1)]
+    assert queue.completed == 3
+    queue.close()
+    # Counts survive closing for the final summary
+    assert queue.counts()["done"] == 3
+
+
+def test_fail_returns_unit_until_attempts_are_used_up(db_path):
+    queue = WorkQueue(db_path, worker_id="a", max_attempts=2)
+    queue.prepare(1, "job")
+
+    assert queue.claim() == 0
+    queue.fail(0, "server error")
+    assert queue.counts()["pending"] == 1
+    assert queue.claim() == 0
+    queue.fail(0, "server error")
+    assert queue.counts()["failed"] == 1
+    assert queue.claim() is None and queue.finished()
+    queue.close()
+
+
+def test_expired_lease_is_taken_over(db_path):
+    dead = WorkQueue(db_path, worker_id="dead", lease_seconds=0.1)
+    dead.prepare(2, "job")
+    assert dead.claim() == 0
+    # Closing stops the heartbeat, as if the worker had died holding the lease
+    dead.close()
+
+    alive = WorkQueue(db_path, worker_id="alive", lease_seconds=0.1)
+    assert alive.claim() == 1
+    assert alive.claim() is None
+    time.sleep(0.15)
+    assert alive.claim() == 0
+    assert alive.reclaimed == 1
+
+    alive.complete(0, [{"by": "alive"}])
+    # A late answer from the previous owner does not overwrite the finished unit
+    late = WorkQueue(db_path, worker_id="dead")
+    late.complete(0, [{"by": "dead"}])
+    assert late.completed == 0
+    late.close()
+    alive.close()
+
+
+def test_heartbeat_keeps_leases_alive(db_path):
+    worker = WorkQueue(db_path, worker_id="a", lease_seconds=0.1)
+    worker.prepare(1, "job")
+    assert worker.claim() == 0
+    time.sleep(0.3)
+
+    other = WorkQueue(db_path, worker_id="b", lease_seconds=0.1)
+    assert other.claim() is None
+    other.close()
+    worker.close()
+
+
+def test_lease_expiring_too_often_fails_the_unit(db_path):
+    for attempt in range(2):
+        worker = WorkQueue(db_path, worker_id=f"w{attempt}", lease_seconds=0.05, max_attempts=2)
+        worker.prepare(1, "job")
+        assert worker.claim() == 0
+        worker.close()
+        time.sleep(0.1)
+
+    last = WorkQueue(db_path, worker_id="last", lease_seconds=0.05, max_attempts=2)
+    assert last.claim() is None
+    assert last.counts()["failed"] == 1
+    last.close()
+
+
+def test_workers_sharing_a_queue_split_the_units(db_path):
+    units = list(range(20))
+    processed = {}
+
+    def start_worker(name):
+        executor = LLMExecutor(concurrency=2, queue=WorkQueue(db_path, worker_id=name, lease_seconds=0.4))
+
+        def worker(unit):
+            time.sleep(0.005)
+            processed.setdefault(name, []).append(unit)
+            return [{"unit": unit}]
+
+        thread = threading.Thread(target=executor.run_queued, args=(worker, units, {"units": units}))
+        thread.start()
+        return executor, thread
+
+    workers = [start_worker(name) for name in ("a", "b")]
+    for _, thread in workers:
+        thread.join()
+
+    assert sorted(unit for done in processed.values() for unit in done) == units
+    assert [record["unit"] for record in workers[0][0].queue.records()] == units
+    for executor, _ in workers:
+        executor.close()
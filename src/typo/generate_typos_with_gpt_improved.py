@@ -2,29 +2,55 @@
 """
 GPT-4o-mini를 사용해서 한국어 문장에 오타를 생성하는 스크립트 (개선 버전)
 """
+import copy
 import json
+import math
 import os
-from openai import OpenAI
-from typing import List, Dict
+import random
+import sys
+from typing import List, Dict, Optional, Tuple
 import time
-from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
 from queue import Queue
 
-def initialize_client():
-    """Initialize OpenAI client with API key from environment variable"""
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm.checkpoint import add_checkpoint_arguments, checkpoint_path_for
+from llm.batch_jobs import (add_batch_arguments, build_batch_request, parse_range_id,
+                            read_batch_results, write_batch_requests)
+from llm.dedup import (add_dedup_arguments, batched_calls_saved, dedup_summary, group_duplicates,
+                       in_input_order, match_records, normalize_text)
+from llm.chat import TruncatedResponse
+from llm.executor import LLMExecutor, add_executor_arguments, executor_from_args, parse_json_response
+from llm.packing import DEFAULT_MAX_BATCH_ITEMS, add_packing_arguments, batch_spans, halves
+from llm.rate_limit import estimate_text_tokens
+from llm.work_queue import add_queue_arguments
+from utils.json_stream import salvage_json_array
+from make_typos_fin import generate_typos_for_sentence
+
+def check_api_key():
+    """OPENAI_API_KEY가 없으면 안내 후 종료"""
+    if not os.getenv("OPENAI_API_KEY"):
         print("⚠️  Please set OPENAI_API_KEY environment variable")
         print("   export OPENAI_API_KEY='your-api-key-here'")
         exit(1)
 
-    client = OpenAI(api_key=api_key)
-    return client
+TYPO_MAX_TOKENS = 4000
+
+# 문장 하나당 원문 + 5개 유형 x 2개 변형
+TYPO_COPIES_PER_ENTRY = 11
+
+ERROR_TYPES = ['substitution', 'deletion', 'insertion', 'transposition', 'spacing']
+# 변형 키별 오류 개수
+VARIANT_ERRORS = {"1_error": 1, "2_errors": 2}
 
-def generate_typos_batch(client, entries: List[Dict], batch_size: int = 5) -> List[Dict]:
-    """GPT를 사용해서 오타 생성"""
+# 하이브리드 모드 채점 응답: 문장 하나당 변형 10개의 점수 + JSON 키
+SCORE_TOKENS_PER_ENTRY = 160
+
+TYPO_SYSTEM_PROMPT = "당신은 한국어 오타를 생성하는 전문가입니다. 제공된 예시와 같은 패턴과 형식으로 오타를 생성해주세요. JSON 형식만 출력하고 다른 설명은 하지 마세요."
+
+def build_typo_messages(entries: List[Dict]) -> List[Dict[str, str]]:
+    """배치 하나에 대한 오타 생성 메시지 구성"""
 
     # 배치 데이터 준비
     # batch_text = json.dumps(entries, ensure_ascii=False, indent=2)
@@ -129,42 +155,119 @@ def generate_typos_batch(client, entries: List[Dict], batch_size: int = 5) -> Li
 위 규칙과 형식에 따라 JSON 배열로만 응답하세요.
 """
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "당신은 한국어 오타를 생성하는 전문가입니다. 제공된 예시와 같은 패턴과 형식으로 오타를 생성해주세요. JSON 형식만 출력하고 다른 설명은 하지 마세요."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=4000
-        )
-
-        # 응답 파싱
-        result_text = response.choices[0].message.content.strip()
-
-        # JSON 추출
-        if result_text.startswith("```json"):
-            result_text = result_text[7:]
-        if result_text.startswith("```"):
-            result_text = result_text[3:]
-        if result_text.endswith("```"):
-            result_text = result_text[:-3]
-
-        result = json.loads(result_text)
-        return result
+    return [
+        {"role": "system", "content": TYPO_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
 
+def parse_typo_response(result_text: str) -> List[Dict]:
+    """GPT 응답에서 JSON 배열 추출 (실패 시 빈 리스트)"""
+    try:
+        return parse_json_response(result_text)
     except json.JSONDecodeError as e:
         print(f"❌ JSON parsing error: {e}")
-        print(f"Response: {result_text[:200]}...")
+        print(f"Response: {result_text.strip()[:200]}...")
         return []
+
+def typo_output_tokens(entry: Dict) -> int:
+    """문장 하나의 예상 응답 토큰 수 (원문과 변형 10개 + JSON 키)"""
+    return estimate_text_tokens(entry["ko"]) * TYPO_COPIES_PER_ENTRY + 60
+
+def is_typo_record(record) -> bool:
+    """원문과 5개 유형의 1_error/2_errors 문자열을 모두 가진 레코드인지 확인"""
+    return (isinstance(record, dict) and isinstance(record.get("original"), str)
+            and all(isinstance(record.get(error_type), dict)
+                    and all(isinstance(record[error_type].get(key), str) for key in VARIANT_ERRORS)
+                    for error_type in ERROR_TYPES))
+
+def match_typo_records(entries: List[Dict], records: List) -> List[Optional[Dict]]:
+    """응답 레코드를 입력 문장에 정렬 (original로 매칭, 원문을 바꿔 쓴 레코드는 같은 위치의 문장에 배정)"""
+    records = [record for record in records if isinstance(record, dict)]
+    return match_records(entries, records, lambda entry: normalize_text(entry["ko"]),
+                         lambda record: normalize_text(record.get("original") or ""))
+
+def stream_typos_batch(executor: LLMExecutor, entries: List[Dict]) -> List[Optional[Dict]]:
+    """스트리밍으로 오타 생성: 레코드가 도착하는 즉시 검증하고, 형식이 틀린 레코드가 나오면 요청 취소 (입력 문장마다 레코드 하나 또는 None)"""
+    records = []
+    truncated = False
+
+    def on_item(record):
+        if not is_typo_record(record):
+            raise ValueError(f"unexpected record {json.dumps(record, ensure_ascii=False)[:80]}")
+        records.append(record)
+
+    try:
+        executor.stream_items(
+            build_typo_messages(entries),
+            on_item,
+            temperature=0.7,
+            max_tokens=TYPO_MAX_TOKENS,
+            tag="batch" if len(entries) > 1 else "single",
+            allow_truncated=False
+        )
+    except TruncatedResponse:
+        truncated = True
+        print(f"✂️  Response truncated at max_tokens after {len(records)} of {len(entries)} sentences")
+    except ValueError as e:
+        print(f"⚠️  Cancelled streaming response after {len(records)} of {len(entries)} sentences: {e}")
     except Exception as e:
         print(f"❌ API error: {e}")
-        return []
-
-def process_dataset(input_file: str, output_file: str, batch_size: int = 5, max_workers: int = 5):
-    """데이터셋 처리 및 오타 생성 (멀티스레딩 지원)"""
+        return [None] * len(entries)
+
+    results = match_typo_records(entries, records)
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+
+    if len(missing) < len(entries):
+        # 받은 레코드는 유지하고 대응하는 레코드가 없는 문장만 다시 요청
+        retried = stream_typos_batch(executor, [entries[i] for i in missing])
+        for i, result in zip(missing, retried):
+            results[i] = result
+    elif truncated and len(entries) > 1:
+        print(f"✂️  Splitting a batch of {len(entries)} sentences")
+        first, second = halves(entries)
+        return stream_typos_batch(executor, first) + stream_typos_batch(executor, second)
+    return results
+
+def generate_typos_batch(executor: LLMExecutor, entries: List[Dict], stream: bool = False) -> List[Optional[Dict]]:
+    """GPT를 사용해서 오타 생성, 입력 문장마다 레코드 하나 또는 None
+    (응답이 max_tokens에서 잘리면 배치를 반으로 나눠 다시 요청, 빠진 문장은 그 문장만 다시 요청)"""
+    if stream:
+        return stream_typos_batch(executor, entries)
 
+    try:
+        result_text = executor.complete(
+            build_typo_messages(entries),
+            temperature=0.7,
+            max_tokens=TYPO_MAX_TOKENS,
+            tag="batch" if len(entries) > 1 else "single",
+            allow_truncated=False
+        )
+    except TruncatedResponse as e:
+        if len(entries) == 1:
+            print("✂️  Response truncated at max_tokens for a single sentence")
+            return [None]
+        print(f"✂️  Response truncated at max_tokens; splitting a batch of {len(entries)} sentences")
+        first, second = halves(entries)
+        return generate_typos_batch(executor, first) + generate_typos_batch(executor, second)
+    except Exception as e:
+        print(f"❌ API error: {e}")
+        return [None] * len(entries)
+
+    # 스트리밍과 같이 형식이 틀린 레코드는 받지 않은 것으로 처리
+    records = [record for record in parse_typo_response(result_text) if is_typo_record(record)]
+    results = match_typo_records(entries, records)
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing and len(missing) < len(entries):
+        # 받은 레코드는 유지하고 대응하는 레코드가 없는 문장만 다시 요청
+        retried = generate_typos_batch(executor, [entries[i] for i in missing])
+        for i, result in zip(missing, retried):
+            results[i] = result
+    return results
+
+def load_typo_data(input_file: str) -> List[Dict]:
+    """입력 파일을 {"ko"} 또는 {"en", "ko"} 리스트로 로드"""
     print(f"📚 Loading {input_file}...")
     with open(input_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
@@ -193,59 +296,123 @@ def process_dataset(input_file: str, output_file: str, batch_size: int = 5, max_
             elif isinstance(entry, str):
                 simple_data.append({"ko": entry})
 
+    return simple_data
+
+def dedup_typo_data(simple_data: List[Dict], dedup: bool = True):
+    """정규화한 한국어 문장이 같은 항목은 첫 항목만 남김 (남은 항목 리스트, 항목별 그룹의 입력 위치 리스트)"""
+    if not dedup:
+        return simple_data, [[idx] for idx in range(len(simple_data))]
+
+    groups = group_duplicates(simple_data, key=lambda entry: normalize_text(entry["ko"]))
+    unique = [simple_data[rep] for rep in groups]
+    return unique, list(groups.values())
+
+def fan_out_typos(records: List[Optional[Dict]], members: List[List[int]]) -> List[list]:
+    """대표 문장의 오타 레코드를 그룹의 모든 입력 위치에 복사 ([입력 위치, 레코드] 리스트, 결과가 없는 문장은 제외)"""
+    fanned = []
+    for record, positions in zip(records, members):
+        if record is None:
+            continue
+        fanned.append([positions[0], record])
+        fanned.extend([pos, copy.deepcopy(record)] for pos in positions[1:])
+    return fanned
+
+def export_typo_batch(input_file: str, batch_file: str, batch_size: int = 5, dedup: bool = True,
+                      token_budget: int = 0, max_batch_items: int = DEFAULT_MAX_BATCH_ITEMS) -> int:
+    """API 호출 대신 배치 요청 JSONL 파일 작성"""
+    simple_data, _ = dedup_typo_data(load_typo_data(input_file), dedup)
+
+    requests = (
+        build_batch_request(f"typo-{start}-{end - 1}",
+                            build_typo_messages(simple_data[start:end]),
+                            model="gpt-4o-mini", temperature=0.7, max_tokens=TYPO_MAX_TOKENS)
+        for start, end in batch_spans(simple_data, batch_size, typo_output_tokens, token_budget, max_batch_items)
+    )
+    count = write_batch_requests(batch_file, requests)
+    print(f"📤 Wrote {count} batch requests for {len(simple_data)} entries to {batch_file}")
+    return count
+
+def import_typo_batch(input_file: str, batch_file: str, output_file: str, dedup: bool = True) -> int:
+    """배치 결과 JSONL 파일을 일반 출력 형식으로 병합"""
+    simple_data, members = dedup_typo_data(load_typo_data(input_file), dedup)
+    batch_results = read_batch_results(batch_file)
+    spans = sorted(filter(None, (parse_range_id(custom_id, "typo") for custom_id in batch_results)))
+
+    positioned = []
+    missing = 0
+    for start, end in spans:
+        content = batch_results[f"typo-{start}-{end}"]
+        if content is None:
+            # 실패한 요청은 온라인 처리의 API 오류와 동일하게 결과 없음
+            missing += 1
+            continue
+        records = match_typo_records(simple_data[start:end + 1], parse_typo_response(content))
+        positioned.extend(fan_out_typos(records, members[start:end + 1]))
+    all_results = in_input_order(positioned)
+
+    print(f"📥 Imported {len(spans)} batches ({missing} failed requests)")
+    print(f"💾 Saving to {output_file}...")
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(all_results, f, ensure_ascii=False, indent=2)
+    return len(all_results)
+
+def process_dataset(input_file: str, output_file: str, batch_size: int = 5,
+                    executor: Optional[LLMExecutor] = None,
+                    checkpoint_file: Optional[str] = None,
+                    resume: bool = False,
+                    dedup: bool = True,
+                    token_budget: int = 0,
+                    max_batch_items: int = DEFAULT_MAX_BATCH_ITEMS,
+                    stream: bool = False):
+    """데이터셋 처리 및 오타 생성 (멀티스레딩 지원)"""
+    executor = executor or LLMExecutor()
+
+    simple_data = load_typo_data(input_file)
+
     print(f"📊 Total entries to process: {len(simple_data)}")
 
-    # OpenAI 클라이언트 초기화
-    client = initialize_client()
+    # 거의 같은 문장은 한 번만 요청하고 결과를 중복 항목에 복사
+    total_entries = len(simple_data)
+    simple_data, members = dedup_typo_data(simple_data, dedup)
+    if dedup:
+        calls_saved = batched_calls_saved(total_entries, len(simple_data), batch_size)
+        print(f"🧹 {dedup_summary(total_entries, len(simple_data), calls_saved)}")
 
-    # 배치 처리를 위한 준비
-    all_results = []
-    results_lock = threading.Lock()  # Thread-safe 결과 저장을 위한 lock
-    error_types = ['substitution', 'deletion', 'insertion', 'transposition', 'spacing']
+    check_api_key()
 
-    print(f"🔄 Processing in batches of {batch_size} with {max_workers} workers...")
+    # 고정 개수 대신 예상 응답 토큰 수 기준으로 배치 구성
+    spans = batch_spans(simple_data, batch_size, typo_output_tokens, token_budget, max_batch_items)
+    if token_budget > 0:
+        print(f"🔄 Packing {len(simple_data)} entries into {len(spans)} batches of ~{token_budget} output tokens "
+              f"with {executor.concurrency} workers...")
+    else:
+        print(f"🔄 Processing in batches of {batch_size} with {executor.concurrency} workers...")
 
     # 배치 작업을 위한 함수
-    def process_batch_worker(batch_data, batch_index):
+    def process_batch_worker(batch_data, start):
         """개별 배치를 처리하는 워커 함수"""
         try:
             # GPT로 오타 생성
-            batch_results = generate_typos_batch(client, batch_data, batch_size)
-
-            # 결과를 그대로 유지 (플랫 변환 없음)
-            batch_flat_results = batch_results
+            batch_results = generate_typos_batch(executor, batch_data, stream=stream)
 
-            return batch_index, batch_flat_results
+            # 결과를 그대로 유지 (플랫 변환 없음), 중복 입력에는 복사하고 입력 위치를 함께 기록
+            return {"results": fan_out_typos(batch_results, members[start:start + len(batch_data)])}
         except Exception as e:
-            print(f"❌ Error processing batch {batch_index}: {e}")
-            return batch_index, []
-
-    # ThreadPoolExecutor를 사용한 병렬 처리
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {}
-
-        # 배치 작업 제출
-        for i in range(0, len(simple_data), batch_size):
-            batch = simple_data[i:i+batch_size]
-            batch_index = i // batch_size
-            future = executor.submit(process_batch_worker, batch, batch_index)
-            futures[future] = batch_index
-
-        # 결과 수집 (순서 보장을 위한 딕셔너리 사용)
-        results_dict = {}
-
-        # Progress bar와 함께 결과 수집
-        with tqdm(total=len(futures), desc="Processing batches") as pbar:
-            for future in as_completed(futures):
-                batch_index, batch_results = future.result()
-                results_dict[batch_index] = batch_results
-                pbar.update(1)
-
-        # 순서대로 결과 병합
-        for i in sorted(results_dict.keys()):
-            all_results.extend(results_dict[i])
+            print(f"❌ Error processing batch at entry {start}: {e}")
+            return {"results": []}
+
+    # 완료된 배치는 체크포인트 로그에 추가 (--resume 시 건너뜀), 결과는 입력 순서대로 병합
+    # (positioned: 결과에 입력 위치가 없던 이전 형식의 체크포인트는 재사용하지 않음)
+    records = executor.run_batches(simple_data, spans, process_batch_worker,
+                                   checkpoint_file or checkpoint_path_for(output_file), resume=resume,
+                                   meta={"batch_size": batch_size, "dedup": dedup, "token_budget": token_budget,
+                                         "max_batch_items": max_batch_items, "positioned": True})
+    all_results = in_input_order(result for record in records for result in record["results"])
 
     print(f"\n✅ Generated {len(all_results)} entries")
+    executor.close()
+    for line in executor.summaries():
+        print(line)
 
     # 결과 저장
     print(f"💾 Saving to {output_file}...")
@@ -254,7 +421,7 @@ def process_dataset(input_file: str, output_file: str, batch_size: int = 5, max_
 
     # 통계 출력
     print("\n📊 Statistics:")
-    print(f"  Original entries: {len(simple_data)}")
+    print(f"  Original entries: {total_entries}")
     print(f"  Generated entries: {len(all_results)}")
 
     # 샘플 출력
@@ -262,7 +429,7 @@ def process_dataset(input_file: str, output_file: str, batch_size: int = 5, max_
         print("\n📝 Sample output:")
         sample = all_results[0]
         print(f"Original: {sample.get('original', '')}")
-        for error_type in error_types:
+        for error_type in ERROR_TYPES:
             if error_type in sample:
                 print(f"\n{error_type.upper()}:")
                 if '1_error' in sample[error_type]:
@@ -272,6 +439,196 @@ def process_dataset(input_file: str, output_file: str, batch_size: int = 5, max_
 
     return len(all_results)
 
+def generate_typos_local(text: str) -> Tuple[Dict, Dict[str, Dict[str, bool]]]:
+    """make_typos_fin 엔진으로 GPT 출력과 같은 형식의 오타 생성 (변형별 오류 개수 일치 여부 포함)"""
+    generated = generate_typos_for_sentence(text)
+    record = {"original": text}
+    exact = {}
+    for error_type in ERROR_TYPES:
+        record[error_type] = {key: generated[error_type][key]["text"] for key in VARIANT_ERRORS}
+        exact[error_type] = {key: len(generated[error_type][key]["errors"]) == num_errors
+                             for key, num_errors in VARIANT_ERRORS.items()}
+    return record, exact
+
+SCORE_SYSTEM_PROMPT = "당신은 한국어 오타 데이터의 품질을 평가하는 전문가입니다. JSON 형식만 출력하고 다른 설명은 하지 마세요."
+
+def build_score_messages(items: List[Tuple[int, Dict]]) -> List[Dict[str, str]]:
+    """표본 오타 레코드의 자연스러움 채점 메시지 구성"""
+    batch_text = json.dumps([{"id": idx, **record} for idx, record in items], ensure_ascii=False, indent=2)
+
+    prompt = f"""다음은 원문과 자동으로 생성한 오타 문장입니다. 각 오타 문장을 평가해주세요.
+
+## 평가 항목
+- "natural": 실제로 타이핑하다 낼 법한 자연스러운 오타인지 1~5점 (5점이 가장 자연스러움)
+- "exact": 해당 유형의 오타가 정확히 지정된 개수만 적용되었는지 ("1_error"는 1개, "2_errors"는 2개) true/false
+
+## 입력 형식
+[{{"id": 0, "original": "원본 문장", "substitution": {{"1_error": "...", "2_errors": "..."}}, "deletion": {{...}}, ...}}]
+
+## 출력 형식 (모든 id를 포함한 JSON 배열)
+[{{"id": 0, "substitution": {{"1_error": {{"natural": 4, "exact": true}}, "2_errors": {{"natural": 3, "exact": true}}}}, ...}}]
+
+채점할 오타:
+{batch_text}
+
+JSON 배열 형식으로만 응답하세요."""
+
+    return [
+        {"role": "system", "content": SCORE_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def parse_score_response(result_text: str, ids: List[int]) -> Dict[int, Dict]:
+    """id별 {유형: {변형 키: {"natural", "exact"}}} 점수 (형식이 맞지 않는 항목은 제외)"""
+    wanted = set(ids)
+    scores = {}
+    for item in salvage_json_array(result_text):
+        if not isinstance(item, dict) or item.get("id") not in wanted:
+            continue
+        item_scores = {}
+        for error_type in ERROR_TYPES:
+            type_scores = item.get(error_type)
+            for key in VARIANT_ERRORS:
+                score = type_scores.get(key) if isinstance(type_scores, dict) else None
+                if isinstance(score, dict) and isinstance(score.get("natural"), (int, float)):
+                    item_scores.setdefault(error_type, {})[key] = {
+                        "natural": min(5, max(1, score["natural"])),
+                        "exact": score.get("exact") is True
+                    }
+        if item_scores:
+            scores[item["id"]] = item_scores
+    return scores
+
+def score_typo_batch(executor: LLMExecutor, items: List[Tuple[int, Dict]]) -> Dict[int, Dict]:
+    """GPT로 표본 오타 채점 (응답이 잘리면 배치를 반으로 나눠 다시 요청)"""
+    try:
+        result_text = executor.complete(
+            build_score_messages(items),
+            temperature=0.0,
+            max_tokens=TYPO_MAX_TOKENS,
+            tag="score",
+            allow_truncated=False
+        )
+    except TruncatedResponse as e:
+        if len(items) == 1:
+            return parse_score_response(e.content, [items[0][0]])
+        first, second = halves(items)
+        return {**score_typo_batch(executor, first), **score_typo_batch(executor, second)}
+    except Exception as e:
+        print(f"❌ API error: {e}")
+        return {}
+
+    return parse_score_response(result_text, [idx for idx, _ in items])
+
+def rate_stats(values: List[float]) -> Dict:
+    """평균과 95% 신뢰구간 반폭"""
+    if not values:
+        return {"count": 0, "mean": None, "ci95": None}
+    mean = sum(values) / len(values)
+    variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1) if len(values) > 1 else 0.0
+    return {"count": len(values), "mean": round(mean, 3), "ci95": round(1.96 * math.sqrt(variance / len(values)), 3)}
+
+def summarize_typo_quality(exact_flags: List[Dict[str, Dict[str, bool]]], scores: Dict[int, Dict]) -> Dict:
+    """로컬 오류 개수 일치율과 GPT 채점 결과를 유형별로 집계"""
+    by_type = {}
+    for error_type in ERROR_TYPES:
+        local = [flags[error_type][key] for flags in exact_flags for key in VARIANT_ERRORS]
+        graded = [item[error_type][key] for item in scores.values()
+                  for key in VARIANT_ERRORS if key in item.get(error_type, {})]
+        by_type[error_type] = {
+            "local_exact_rate": round(sum(local) / len(local), 3) if local else None,
+            "natural": rate_stats([g["natural"] for g in graded]),
+            "gpt_exact": rate_stats([float(g["exact"]) for g in graded]),
+        }
+
+    graded = [variant for item in scores.values() for variant_scores in item.values()
+              for variant in variant_scores.values()]
+    local = [flag for flags in exact_flags for type_flags in flags.values() for flag in type_flags.values()]
+    return {
+        "sentences": len(exact_flags),
+        "variants": len(local),
+        "local_exact_rate": round(sum(local) / len(local), 3) if local else None,
+        "scored_sentences": len(scores),
+        "scored_variants": len(graded),
+        "natural": rate_stats([g["natural"] for g in graded]),
+        "gpt_exact": rate_stats([float(g["exact"]) for g in graded]),
+        "low_natural_rate": round(sum(g["natural"] <= 2 for g in graded) / len(graded), 3) if graded else None,
+        "by_type": by_type,
+    }
+
+def process_dataset_hybrid(input_file: str, output_file: str, batch_size: int = 5,
+                           executor: Optional[LLMExecutor] = None,
+                           verify_sample: int = 100,
+                           seed: Optional[int] = None,
+                           token_budget: int = 0,
+                           max_batch_items: int = DEFAULT_MAX_BATCH_ITEMS):
+    """모든 변형은 로컬 엔진으로 생성하고, 표본 문장만 GPT로 채점해 품질 통계를 남김"""
+    executor = executor or LLMExecutor()
+    if seed is not None:
+        random.seed(seed)
+
+    simple_data = load_typo_data(input_file)
+    print(f"📊 Total entries to process: {len(simple_data)}")
+
+    # 로컬 생성은 API를 쓰지 않으므로 중복 제거 없이 모든 문장에 대해 생성
+    all_results = []
+    exact_flags = []
+    for entry in simple_data:
+        record, exact = generate_typos_local(entry["ko"])
+        all_results.append(record)
+        exact_flags.append(exact)
+    print(f"⚡ Generated {len(all_results)} entries locally")
+
+    print(f"💾 Saving to {output_file}...")
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(all_results, f, ensure_ascii=False, indent=2)
+
+    # 표본만 GPT로 채점
+    sample_ids = sorted(random.Random(seed).sample(range(len(all_results)), min(verify_sample, len(all_results))))
+    items = [(idx, all_results[idx]) for idx in sample_ids]
+    scores = {}
+    if items:
+        check_api_key()
+        spans = batch_spans(items, batch_size, lambda item: SCORE_TOKENS_PER_ENTRY, token_budget, max_batch_items)
+        print(f"🔍 Scoring {len(items)} sampled entries in {len(spans)} batches with {executor.concurrency} workers...")
+        batches = (items[start:end] for start, end in spans)
+        for _, future in tqdm(executor.map(lambda batch: score_typo_batch(executor, batch), batches),
+                              total=len(spans), desc="Scoring batches"):
+            try:
+                scores.update(future.result())
+            except Exception as e:
+                print(f"❌ Error scoring batch: {e}")
+    executor.close()
+    for line in executor.summaries():
+        print(line)
+
+    quality = summarize_typo_quality(exact_flags, scores)
+    # 가장 부자연스러운 변형은 검토용으로 함께 저장
+    worst = sorted(((variant["natural"], idx, error_type, key)
+                    for idx, item in scores.items() for error_type, variant_scores in item.items()
+                    for key, variant in variant_scores.items()))[:10]
+    quality["lowest_natural"] = [{"original": all_results[idx]["original"], "error_type": error_type, "variant": key,
+                                  "text": all_results[idx][error_type][key], "natural": natural}
+                                 for natural, idx, error_type, key in worst]
+
+    quality_file = output_file.replace(".json", "_quality.json")
+    with open(quality_file, 'w', encoding='utf-8') as f:
+        json.dump(quality, f, ensure_ascii=False, indent=2)
+
+    print("\n📊 Quality:")
+    if quality["variants"]:
+        print(f"  Local exact error count: {quality['local_exact_rate']:.1%} of {quality['variants']} variants")
+    if quality["scored_variants"]:
+        print(f"  GPT naturalness: {quality['natural']['mean']} ± {quality['natural']['ci95']} (1-5, "
+              f"{quality['scored_variants']} variants from {quality['scored_sentences']} sentences)")
+        print(f"  GPT exact error count: {quality['gpt_exact']['mean']:.1%} ± {quality['gpt_exact']['ci95']:.1%}")
+        for error_type in ERROR_TYPES:
+            natural = quality["by_type"][error_type]["natural"]
+            print(f"    {error_type}: naturalness {natural['mean']} ± {natural['ci95']}")
+    print(f"💾 Quality report saved to {quality_file}")
+
+    return len(all_results)
+
 def create_test_sample(input_file: str, sample_file: str, sample_size: int = 5):
     """테스트용 샘플 파일 생성"""
     print(f"📝 Creating sample file with {sample_size} entries...")
@@ -297,10 +654,49 @@ if __name__ == "__main__":
     parser.add_argument("--max-workers", type=int, default=5, help="Maximum number of parallel workers")
     parser.add_argument("--test", action="store_true", help="Test with small sample first")
     parser.add_argument("--sample-size", type=int, default=5, help="Sample size for testing")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream responses and validate each record as it arrives, cancelling on malformed output")
+    add_checkpoint_arguments(parser)
+    add_queue_arguments(parser)
+    add_batch_arguments(parser)
+    add_dedup_arguments(parser)
+    parser.add_argument("--hybrid", action="store_true",
+                        help="Generate every variant locally with make_typos_fin and only score a sample with GPT")
+    parser.add_argument("--verify-sample", type=int, default=100,
+                        help="Sentences scored by GPT in hybrid mode")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for hybrid generation and sampling")
+    add_packing_arguments(parser, TYPO_MAX_TOKENS)
+    add_executor_arguments(parser)
 
     args = parser.parse_args()
 
-    if args.test:
+    # 오프라인 배치 모드는 API를 호출하지 않음
+    if args.export_batch:
+        export_typo_batch(args.input, args.export_batch, batch_size=args.batch_size, dedup=not args.no_dedup,
+                          token_budget=args.token_budget, max_batch_items=args.max_batch_items)
+        sys.exit(0)
+    if args.import_batch:
+        count = import_typo_batch(args.input, args.import_batch, args.output, dedup=not args.no_dedup)
+        print(f"\n✅ Complete! Generated {count} entries")
+        sys.exit(0)
+
+    executor = executor_from_args(args, "typo-gpt", concurrency=2 if args.test else args.max_workers)
+
+    if args.hybrid:
+        # 하이브리드 모드: 로컬 생성 + 표본 GPT 채점
+        count = process_dataset_hybrid(
+            args.input,
+            args.output,
+            batch_size=args.batch_size,
+            executor=executor,
+            verify_sample=args.verify_sample,
+            seed=args.seed,
+            token_budget=args.token_budget,
+            max_batch_items=args.max_batch_items
+        )
+        print(f"\n✅ Complete! Generated {count} entries")
+        print(f"Output saved to: {args.output}")
+    elif args.test:
         # 테스트 모드
         sample_file = "mkqa_typo_sample.json"
         create_test_sample(args.input, sample_file, args.sample_size)
@@ -310,7 +706,12 @@ if __name__ == "__main__":
             sample_file,
             "mkqa_typo_sample_output.json",
             batch_size=2,
-            max_workers=2
+            executor=executor,
+            resume=args.resume,
+            dedup=not args.no_dedup,
+            token_budget=args.token_budget,
+            max_batch_items=args.max_batch_items,
+            stream=args.stream
         )
         print(f"\n✅ Test complete! Generated {count} entries")
         print("Check 'mkqa_typo_sample_output.json' for results")
@@ -320,7 +721,13 @@ if __name__ == "__main__":
             args.input,
             args.output,
             batch_size=args.batch_size,
-            max_workers=args.max_workers
+            executor=executor,
+            checkpoint_file=args.checkpoint,
+            resume=args.resume,
+            dedup=not args.no_dedup,
+            token_budget=args.token_budget,
+            max_batch_items=args.max_batch_items,
+            stream=args.stream
         )
         print(f"\n✅ Complete! Generated {count} entries")
-        print(f"Output saved to: {args.output}")
\ No newline at end of file
+        print(f"Output saved to: {args.output}")
@@ -1,10 +1,15 @@
 import json
+import os
+import sys
 import random
 import argparse
-from typing import List, Dict, Tuple, Set, Optional
+from typing import Any, Callable, List, Dict, Tuple, Set, Optional
 import re
 import copy
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.json_stream import iter_json_records, JsonRecordWriter
+
 # 한글 유니코드 상수
 CHOSUNG_BASE = 0x1100
 JUNGSUNG_BASE = 0x1161
@@ -743,12 +748,110 @@ def generate_typos_for_sentence(sentence: str, sentence_id: int = None) -> Dict:
     
     return result
 
+# 필드 경로 기반 오타 주입
+ERROR_FUNCTIONS = {
+    "substitution": apply_substitution,
+    "deletion": apply_deletion,
+    "insertion": apply_insertion,
+    "transposition": apply_transposition,
+    "spacing": apply_spacing_error,
+}
+
+def parse_field_paths(spec: str) -> List[List[str]]:
+    """'queries.ko,answers.ko[].text' 형식의 선택자를 경로 리스트로 변환"""
+    paths = []
+    for raw_path in spec.split(','):
+        raw_path = raw_path.strip()
+        if not raw_path:
+            continue
+        path = []
+        for part in raw_path.split('.'):
+            if part.endswith('[]'):
+                path.append(part[:-2])
+                path.append('[]')
+            else:
+                path.append(part)
+        paths.append([p for p in path if p])
+    return paths
+
+def perturb_field(node: Any, path: List[str], perturb: Callable[[str], str]) -> int:
+    """경로가 가리키는 문자열 필드를 제자리에서 변경하고 변경된 개수를 반환"""
+    if not path:
+        return 0
+    key, rest = path[0], path[1:]
+
+    if key == '[]':
+        if not isinstance(node, list):
+            return 0
+        count = 0
+        for i, child in enumerate(node):
+            if not rest:
+                if isinstance(child, str):
+                    node[i] = perturb(child)
+                    count += 1
+            else:
+                count += perturb_field(child, rest, perturb)
+        return count
+
+    if not isinstance(node, dict) or key not in node:
+        return 0
+    if not rest:
+        if isinstance(node[key], str):
+            node[key] = perturb(node[key])
+            return 1
+        return 0
+    return perturb_field(node[key], rest, perturb)
+
+def perturb_text(text: str, error_type: str = "random", num_errors: int = 1) -> str:
+    """지정한 유형의 오타를 num_errors개 적용"""
+    if error_type == "random":
+        error_type = random.choice(list(ERROR_FUNCTIONS))
+    perturbed, _, _ = ERROR_FUNCTIONS[error_type](text, num_errors)
+    return perturbed
+
+def perturb_records(input_file: str, output_file: str, fields: str,
+                    error_type: str = "random", num_errors: int = 1) -> Tuple[int, int]:
+    """구조화된 레코드를 스트리밍으로 읽어 선택한 필드에만 오타를 주입"""
+    paths = parse_field_paths(fields)
+    if not paths:
+        raise ValueError("No field paths given")
+
+    perturb = lambda text: perturb_text(text, error_type, num_errors)
+
+    num_fields = 0
+    with JsonRecordWriter(output_file) as writer:
+        for record in iter_json_records(input_file):
+            for path in paths:
+                num_fields += perturb_field(record, path, perturb)
+            writer.write(record)
+
+    return writer.count, num_fields
+
 def main():
     parser = argparse.ArgumentParser(description='Generate Korean typos from input JSON file')
     parser.add_argument('--input', required=True, help='Input JSON file path')
     parser.add_argument('--output', required=True, help='Output JSON file path')
+    parser.add_argument('--fields', default=None,
+                        help="Comma-separated field paths to perturb in structured records "
+                             "(e.g. 'queries.ko,answers.ko[].text'). Without it the input must be a list of strings")
+    parser.add_argument('--error-type', default='random', choices=['random'] + list(ERROR_FUNCTIONS),
+                        help='Typo type applied to selected fields')
+    parser.add_argument('--num-errors', type=int, default=1, choices=[1, 2],
+                        help='Number of typos applied to each selected field')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
     
     args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    if args.fields:
+        num_records, num_fields = perturb_records(
+            args.input, args.output, args.fields,
+            error_type=args.error_type, num_errors=args.num_errors
+        )
+        print(f"Perturbed {num_fields} fields in {num_records} records. Results saved to {args.output}")
+        return
     
     # 입력 파일 읽기
     with open(args.input, 'r', encoding='utf-8') as f:
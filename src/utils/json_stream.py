@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Stream JSON records in and out without loading the whole file
+"""
+import json
+from typing import Any, Iterator, List, Optional, TextIO
+
+CHUNK_SIZE = 1 << 16
+
+
+def _may_be_incomplete(error: json.JSONDecodeError, buf: str) -> bool:
+    """Whether more text could still turn the element that failed to decode into valid JSON"""
+    if error.msg.startswith("Unterminated string"):
+        return True
+    # Past the failure point only a number or literal cut off at the end of the buffer can still grow
+    return not any(c in buf[error.pos:] for c in ' \t\r\n,:]}"')
+
+
+class JsonArrayParser:
+    """Incrementally parse a JSON array, emitting each element once it is complete"""
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+        self._finished = False
+
+    def feed(self, text: str) -> List[Any]:
+        """Add more text and return the elements completed by it; raises ValueError once an element is malformed"""
+        self._buffer += text
+        return self._drain(final=False)
+
+    def close(self) -> List[Any]:
+        """Flush the remaining buffer; raises ValueError if the array is malformed"""
+        items = self._drain(final=True)
+        if not self._finished:
+            raise ValueError("Unterminated JSON array")
+        if self._buffer.strip():
+            raise ValueError(f"Unexpected trailing data: {self._buffer[:50]!r}")
+        return items
+
+    def _drain(self, final: bool) -> List[Any]:
+        items = []
+        buf = self._buffer
+        pos = 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf) or self._finished:
+                break
+
+            if not self._started:
+                if buf[pos] != "[":
+                    raise ValueError(f"Expected '[' but found {buf[pos]!r}")
+                self._started = True
+                pos += 1
+                continue
+
+            if buf[pos] == "]":
+                self._finished = True
+                pos += 1
+                break
+
+            try:
+                item, end = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if final or not _may_be_incomplete(e, buf):
+                    raise ValueError(f"Malformed array element at offset {pos}")
+                break  # Element not complete yet
+
+            # A bare number at the very end of the buffer may still be growing
+            if end == len(buf) and not final and not isinstance(item, (dict, list, str)):
+                break
+
+            items.append(item)
+            pos = end
+
+        self._buffer = buf[pos:]
+        return items
+
+
+def salvage_json_array(text: str) -> List[Any]:
+    """Parse every complete element of a JSON array that may be wrapped in prose, truncated or partly malformed
+
+    A malformed element is skipped by resuming at the next object, so the elements after it are kept.
+    """
+    decoder = json.JSONDecoder()
+    items = []
+    pos = text.find("[")
+    if pos < 0:
+        return items
+    pos += 1
+
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            break
+        try:
+            item, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            pos = text.find("{", pos + 1)
+            if pos < 0:
+                break
+            continue
+        items.append(item)
+
+    return items
+
+
+def iter_json_records(file_path: str) -> Iterator[Any]:
+    """Yield records from a JSON array file or a JSONL file one at a time"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        head = f.read(CHUNK_SIZE)
+        if head.lstrip().startswith("["):
+            parser = JsonArrayParser()
+            chunk = head
+            while chunk:
+                yield from parser.feed(chunk)
+                chunk = f.read(CHUNK_SIZE)
+            yield from parser.close()
+        else:
+            f.seek(0)
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+class JsonRecordWriter:
+    """Write records one at a time as a JSON array (indent=2) or as JSONL"""
+
+    def __init__(self, file_path: str, jsonl: Optional[bool] = None):
+        self.file_path = file_path
+        self.jsonl = file_path.endswith(".jsonl") if jsonl is None else jsonl
+        self.count = 0
+        self._file: Optional[TextIO] = None
+
+    def __enter__(self):
+        self._file = open(self.file_path, 'w', encoding='utf-8')
+        if not self.jsonl:
+            self._file.write("[")
+        return self
+
+    def write(self, record: Any):
+        if self.jsonl:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        else:
+            # Same layout json.dump(records, f, indent=2) would produce
+            text = json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            self._file.write(("," if self.count else "") + "\n  " + text)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.jsonl:
+            self._file.write("\n]" if self.count else "]")
+        self._file.close()
+        return False